@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from datetime import datetime
 
 class AssistantCreate(BaseModel):
@@ -7,6 +7,8 @@ class AssistantCreate(BaseModel):
     description: Optional[str] = None
     systemprompt: Optional[str] = None
     knowledge_base_id: int
+    # Additional knowledge bases searched together with `knowledge_base_id`
+    knowledge_base_ids: List[int] = []
     configuration: Dict[str, str]
 
 class AssistantResponse(BaseModel):
@@ -15,7 +17,9 @@ class AssistantResponse(BaseModel):
     name: str
     description: Optional[str]
     systemprompt: Optional[str]
-    knowledge_base_id: int
+    # None once the knowledge bases of the assistant were deleted
+    knowledge_base_id: Optional[int]
+    knowledge_base_ids: List[int] = []
     configuration: Dict[str, str]
     created_at: datetime
     updated_at: datetime
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Literal, Optional
 from datetime import datetime
 from typing import List
 
@@ -8,6 +8,7 @@ class DocumentInKnowledgeBase(BaseModel):
     file_name: str
     file_type: str
     file_path: str
+    content_hash: Optional[str] = None
     created_at: datetime
     status: str
 
@@ -16,6 +17,12 @@ class DocumentInKnowledgeBase(BaseModel):
 class KnowledgeBaseCreate(BaseModel):
     name: str
     description: Optional[str] = None
+    # Vector settings, fixed once the collection exists
+    embedding_dimensions: Optional[int] = Field(default=None, gt=0)
+    quantization: Optional[Literal["scalar", "binary"]] = None
+    on_disk_vectors: bool = False
+    hnsw_m: Optional[int] = Field(default=None, gt=0)
+    hnsw_ef_construct: Optional[int] = Field(default=None, gt=0)
 
 class KnowledgeBaseUpdate(BaseModel):
     name: Optional[str] = None
@@ -25,6 +32,11 @@ class KnowledgeBaseResponse(BaseModel):
     id: int
     name: str
     description: Optional[str]
+    embedding_dimensions: Optional[int] = None
+    quantization: Optional[str] = None
+    on_disk_vectors: Optional[bool] = None
+    hnsw_m: Optional[int] = None
+    hnsw_ef_construct: Optional[int] = None
     user_id: int
     created_at: datetime
     updated_at: datetime
@@ -1,20 +1,34 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
-from src.tasks.document_parser_tasks import process_document
+from fastapi import APIRouter, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from src.tasks.document_parser_tasks import process_document, reingest_document
+from src.tasks.progress import progress_channel
+from src.tasks.vector_cleanup_tasks import delete_document_vectors
+from celery import group
 from celery.result import AsyncResult
 from fastapi import Depends
+from starlette.concurrency import iterate_in_threadpool
 import os
+import uuid
+import asyncio
+import zipfile
+import tarfile
+import hashlib
 import logging
+import aiofiles
+import aiofiles.os
+import redis.asyncio as aioredis
 from src.dependencies import get_db_manager
 from src.database.manager import DatabaseManager
 from src.database.models import DocumentStatus
 from api.models.knowledge_base import KnowledgeBaseCreate, KnowledgeBaseResponse, KnowledgeBaseUpdate
 from api.services.knowledge_base import KnowledgeBaseService
-from typing import List
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, Iterator, List, Optional, Tuple
 from src.constants import GlobalConfig
 
 kb_router = APIRouter()
 UPLOAD_DIR = "uploads"
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+PROGRESS_KEEPALIVE_SECONDS = 15
 
 # --- API Endpoints ---
 def get_current_user_id(db_manager: DatabaseManager = Depends(get_db_manager)):
@@ -29,45 +43,139 @@ def get_knowledge_base_id(
     return kb.id
 
 
+def check_file_extension(file_name: str) -> str:
+    # Check if the file extension is allowed
+    file_extension = os.path.splitext(file_name)[1].lower()
+    if file_extension not in GlobalConfig.ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"File type not allowed. Allowed types are: {', '.join(GlobalConfig.ALLOWED_EXTENSIONS)}"
+        )
+    return file_extension
+
+async def save_stream(read: Callable[[int], Awaitable[bytes]], file_extension: str, declared_size: Optional[int] = None):
+    """
+    Stream a file to disk in fixed-size chunks, hashing it on the way, and store it
+    under its SHA-256 so identical uploads share one copy on disk.
+
+    The file is written to a temporary name and atomically renamed once complete, so a
+    half-written file is never registered.
+
+    MAX_UPLOAD_SIZE bounds what is copied into `uploads/`, not what the server receives:
+    Starlette spools the whole multipart body to a temporary file before the handler runs,
+    so only a limit in front of the app (e.g. the proxy's body size limit) stops a large
+    body from being received.
+
+    Args:
+        read: Coroutine function returning the next chunk of at most the given size,
+            or an empty bytes object at the end of the file.
+        file_extension: Extension of the stored file.
+        declared_size: Size of the part as reported by the client, if any. Parts declared
+            too large are rejected without being copied.
+
+    Returns:
+        Tuple[str, str]: The file path and the content hash.
+    """
+    max_size = GlobalConfig.MAX_UPLOAD_SIZE
+    if declared_size is not None and declared_size > max_size:
+        raise HTTPException(status_code=413, detail=f"File is larger than the {max_size} bytes limit")
+
+    sha256 = hashlib.sha256()
+    written = 0
+    tmp_path = os.path.join(UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+    try:
+        async with aiofiles.open(tmp_path, "wb") as buffer:
+            while chunk := await read(GlobalConfig.UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > max_size:
+                    raise HTTPException(status_code=413, detail=f"File is larger than the {max_size} bytes limit")
+                sha256.update(chunk)
+                await buffer.write(chunk)
+
+        content_hash = sha256.hexdigest()
+        file_path = os.path.join(UPLOAD_DIR, f"{content_hash}{file_extension}")
+        if not await aiofiles.os.path.exists(file_path):
+            await aiofiles.os.replace(tmp_path, file_path)
+        return file_path, content_hash
+    finally:
+        if await aiofiles.os.path.exists(tmp_path):
+            await aiofiles.os.remove(tmp_path)
+
+async def save_upload(file: UploadFile, file_extension: str):
+    return await save_stream(file.read, file_extension, file.size)
+
+def is_archive(file_name: str) -> bool:
+    return file_name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def iter_archive_members(file: UploadFile) -> Iterator[Tuple[str, BinaryIO]]:
+    """
+    Yield the name and a readable stream of every regular file in a zip or tar archive.
+    Members are decompressed as they are read, never extracted as a whole.
+    """
+    try:
+        if file.filename.lower().endswith(".zip"):
+            with zipfile.ZipFile(file.file) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        with archive.open(info) as member:
+                            yield info.filename, member
+        else:
+            with tarfile.open(fileobj=file.file, mode="r:*") as archive:
+                for info in archive:
+                    if info.isfile():
+                        yield info.name, archive.extractfile(info)
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid archive '{file.filename}': {str(e)}")
+
+async def iter_progress_events(knowledge_base_id: int) -> AsyncIterator[Optional[str]]:
+    """
+    Yield the ingestion progress events of a knowledge base as JSON strings, and None
+    after every PROGRESS_KEEPALIVE_SECONDS without events so idle streams can be kept alive.
+    """
+    client = aioredis.from_url(GlobalConfig.REDIS_URL)
+    pubsub = client.pubsub()
+    await pubsub.subscribe(progress_channel(knowledge_base_id))
+    try:
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=PROGRESS_KEEPALIVE_SECONDS)
+            yield message["data"].decode("utf-8") if message else None
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
+
+def remove_unshared_file(file_path: str, db_manager: DatabaseManager):
+    # Delete the file from the filesystem once no document references it anymore
+    if os.path.exists(file_path) and db_manager.count_documents_with_path(file_path) == 0:
+        os.remove(file_path)
+
+
 @kb_router.post("/upload_document")
 async def upload_document(
     file: UploadFile = File(...),
     knowledge_base_id: int = Depends(get_knowledge_base_id),
     db_manager: DatabaseManager = Depends(get_db_manager)
 ):
-    # Define allowed file extensions
-    ALLOWED_EXTENSIONS = GlobalConfig.ALLOWED_EXTENSIONS
-
     try:
-        # Check if the file extension is allowed
-        file_extension = os.path.splitext(file.filename)[1].lower()
-        if file_extension not in ALLOWED_EXTENSIONS:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"File type not allowed. Allowed types are: {', '.join(ALLOWED_EXTENSIONS)}"
-            )
+        file_extension = check_file_extension(file.filename)
+        file_path, content_hash = await save_upload(file, file_extension)
 
-        # Check if a file with the same name already exists in the database
-        existing_document = db_manager.get_document_by_name(knowledge_base_id, file.filename)
+        # Check if a file with the same content already exists in the knowledge base
+        existing_document = db_manager.get_document_by_hash(knowledge_base_id, content_hash)
         if existing_document:
-            raise HTTPException(status_code=400, detail="A file with this name already exists in the knowledge base")
-
-        # Create a unique filename
-        unique_filename = file.filename
-        
-        # Save the file
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+            raise HTTPException(
+                status_code=400,
+                detail=f"This file already exists in the knowledge base as '{existing_document.file_name}'"
+            )
         
         # Add document to database
         document_id, document_type, documented_created = db_manager.add_document(
             knowledge_base_id=knowledge_base_id,
-            file_name=unique_filename,
+            file_name=file.filename,
             file_type=file_extension,
             file_path=file_path,
-            status=DocumentStatus.UPLOADED
+            status=DocumentStatus.UPLOADED,
+            content_hash=content_hash
         )
         
         # Process the document asynchronously
@@ -76,11 +184,12 @@ async def upload_document(
         return JSONResponse(
             content={
                 "message": "File uploaded successfully",
-                "file_name": unique_filename,
+                "file_name": file.filename,
                 "file_path": file_path,
                 "document_id": document_id,
                 "created_at": documented_created.isoformat(),
-                "file_type": document_type
+                "file_type": document_type,
+                "content_hash": content_hash
                 # "task_id": task.id
             },
             status_code=202
@@ -92,6 +201,163 @@ async def upload_document(
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
         
 
+@kb_router.post("/bulk_upload")
+async def bulk_upload_documents(
+    files: List[UploadFile] = File(...),
+    knowledge_base_id: int = Depends(get_knowledge_base_id),
+    db_manager: DatabaseManager = Depends(get_db_manager)
+):
+    """
+    Upload many files at once, or zip/tar archives whose members are ingested as
+    individual documents, and start processing all of them.
+
+    Unsupported or duplicate files are skipped and reported instead of failing the
+    whole batch. Progress can be polled with `/batch_status/{batch_id}`.
+    """
+    documents = []
+    try:
+        skipped = []
+        seen_hashes = set()
+
+        async def add_file(file_name: str, read: Callable[[int], Awaitable[bytes]], size: Optional[int] = None):
+            try:
+                file_extension = check_file_extension(file_name)
+            except HTTPException as he:
+                skipped.append({"file_name": file_name, "reason": he.detail})
+                return
+            file_path, content_hash = await save_stream(read, file_extension, size)
+
+            existing_document = db_manager.get_document_by_hash(knowledge_base_id, content_hash)
+            if existing_document or content_hash in seen_hashes:
+                name = existing_document.file_name if existing_document else "another file of this upload"
+                skipped.append({"file_name": file_name, "reason": f"Duplicate of '{name}'"})
+                if all(document["file_path"] != file_path for document in documents):
+                    remove_unshared_file(file_path, db_manager)
+                return
+            seen_hashes.add(content_hash)
+            documents.append({
+                "file_name": file_name,
+                "file_type": file_extension,
+                "file_path": file_path,
+                "content_hash": content_hash
+            })
+
+        for file in files:
+            if not is_archive(file.filename):
+                await add_file(file.filename, file.read, file.size)
+                continue
+            # Archive headers and members are read from a thread, off the event loop
+            async for member_name, member in iterate_in_threadpool(iter_archive_members(file)):
+                file_name = os.path.basename(member_name)
+                # Skip metadata that archivers add next to the actual files
+                if file_name.startswith(".") or member_name.startswith("__MACOSX/"):
+                    continue
+                await add_file(file_name, lambda size, member=member: asyncio.to_thread(member.read, size))
+
+        if not documents:
+            raise HTTPException(status_code=400, detail={"message": "No new files to process", "skipped": skipped})
+
+        batch_id = str(uuid.uuid4())
+        document_ids = db_manager.add_documents(
+            knowledge_base_id, documents, status=DocumentStatus.PROCESSING, batch_id=batch_id
+        )
+
+        # Submit the whole batch in one round-trip to the broker
+        result = group(
+            process_document.s(document["file_path"], document_id)
+            for document, document_id in zip(documents, document_ids)
+        ).apply_async()
+        db_manager.set_document_task_ids(
+            {document_id: task.id for document_id, task in zip(document_ids, result.results)}
+        )
+
+        return JSONResponse(
+            content={
+                "message": f"{len(document_ids)} files uploaded and queued for processing",
+                "batch_id": batch_id,
+                "documents": [
+                    {"document_id": document_id, "file_name": document["file_name"], "file_type": document["file_type"]}
+                    for document, document_id in zip(documents, document_ids)
+                ],
+                "skipped": skipped
+            },
+            status_code=202
+        )
+    except Exception as e:
+        # A file rejected mid-batch fails the whole batch, so drop the files already saved for it
+        # (those registered as documents, here or elsewhere, are kept)
+        for document in documents:
+            remove_unshared_file(document["file_path"], db_manager)
+        if isinstance(e, HTTPException):
+            raise e
+        logging.error(e)
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
+@kb_router.get("/batch_status/{batch_id}")
+async def get_batch_status(
+    batch_id: str,
+    current_user_id: int = Depends(get_current_user_id),
+    db_manager: DatabaseManager = Depends(get_db_manager)
+):
+    documents = db_manager.get_batch_documents(batch_id, current_user_id)
+    if not documents:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    counts = {status.value: 0 for status in DocumentStatus}
+    for document in documents:
+        counts[document.status.value] += 1
+    finished = counts[DocumentStatus.PROCESSED.value] + counts[DocumentStatus.FAILED.value]
+
+    return JSONResponse(content={
+        "batch_id": batch_id,
+        "knowledge_base_id": documents[0].knowledge_base_id,
+        "total": len(documents),
+        "finished": finished,
+        "done": finished == len(documents),
+        "counts": counts,
+        "documents": [
+            {"document_id": document.id, "file_name": document.file_name, "status": document.status.value}
+            for document in documents
+        ]
+    })
+
+
+@kb_router.get("/{knowledge_base_id}/progress")
+async def stream_progress(
+    knowledge_base_id: int = Depends(get_knowledge_base_id)
+) -> StreamingResponse:
+    """Server-sent events with the progress of every document being ingested into the knowledge base."""
+    async def event_generator():
+        async for event in iter_progress_events(knowledge_base_id):
+            yield f"data: {event}\n\n" if event else ": keep-alive\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+@kb_router.websocket("/{knowledge_base_id}/progress/ws")
+async def progress_websocket(
+    websocket: WebSocket,
+    knowledge_base_id: int,
+    current_user_id: int = Depends(get_current_user_id),
+    db_manager: DatabaseManager = Depends(get_db_manager)
+):
+    """WebSocket counterpart of `/{knowledge_base_id}/progress`."""
+    # get_knowledge_base_id raises an HTTPException, which a WebSocket cannot answer with
+    try:
+        db_manager.get_knowledge_base(knowledge_base_id, current_user_id)
+    except HTTPException as he:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(he.detail))
+        return
+    await websocket.accept()
+    try:
+        async for event in iter_progress_events(knowledge_base_id):
+            # Keep-alives also reveal clients that went away without closing the socket
+            await websocket.send_text(event if event else '{"type": "keepalive"}')
+    except WebSocketDisconnect:
+        logging.info(f"Progress WebSocket disconnected for knowledge base {knowledge_base_id}")
+
+
 @kb_router.get("/document_status/{document_id}")
 async def get_document_status(
     document_id: int,
@@ -114,6 +380,16 @@ async def get_document_status(
         task_id = db_manager.get_document_task_id(document_id)
         if task_id:
             task_result = AsyncResult(task_id)
+            # Large documents hand off to a chord of sub-tasks; follow it to its finalizer
+            if task_result.successful() and isinstance(task_result.result, dict) and task_result.result.get("fanout_task_id"):
+                task_result = AsyncResult(task_result.result["fanout_task_id"])
+                if not task_result.ready():
+                    response["progress"] = {
+                        "current": db_manager.count_document_chunks(document_id),
+                        "total": document.total_chunks,
+                        "stage": "storing"
+                    }
+            
             if task_result.state == 'PROGRESS':
                 response["progress"] = task_result.info
             elif task_result.ready():
@@ -137,8 +413,9 @@ async def process_uploaded_document(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    if document.status != DocumentStatus.UPLOADED:
-        raise HTTPException(status_code=400, detail="Document is not in 'uploaded' status")
+    # Failed documents can be re-queued; processing resumes from their checkpoint
+    if document.status not in (DocumentStatus.UPLOADED, DocumentStatus.FAILED):
+        raise HTTPException(status_code=400, detail="Document is not in 'uploaded' or 'failed' status")
     
     db_manager.update_document_status(document_id, DocumentStatus.PROCESSING)
     
@@ -157,6 +434,55 @@ async def process_uploaded_document(
         status_code=202
     )
     
+@kb_router.put("/replace_document/{document_id}")
+async def replace_document(
+    document_id: int,
+    file: UploadFile = File(...),
+    db_manager: DatabaseManager = Depends(get_db_manager)
+):
+    document = db_manager.get_document(document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    if document.status == DocumentStatus.PROCESSING:
+        raise HTTPException(status_code=400, detail="Document is currently being processed")
+    
+    file_extension = check_file_extension(file.filename)
+    file_path, content_hash = await save_upload(file, file_extension)
+    
+    if content_hash == document.content_hash:
+        return JSONResponse(
+            content={"message": "Document is unchanged", "document_id": document_id},
+            status_code=200
+        )
+    
+    existing_document = db_manager.get_document_by_hash(document.knowledge_base_id, content_hash)
+    if existing_document:
+        raise HTTPException(
+            status_code=400,
+            detail=f"This file already exists in the knowledge base as '{existing_document.file_name}'"
+        )
+    
+    old_file_path = document.file_path
+    db_manager.update_document_file(document_id, file.filename, file_extension, file_path, content_hash)
+    remove_unshared_file(old_file_path, db_manager)
+    
+    db_manager.update_document_status(document_id, DocumentStatus.PROCESSING)
+    
+    # Only chunks whose content changed are embedded again
+    task = reingest_document.delay(file_path, document_id)
+    db_manager.set_document_task_id(document_id, task.id)
+    
+    return JSONResponse(
+        content={
+            "message": "Document re-processing started",
+            "document_id": document_id,
+            "task_id": task.id,
+            "content_hash": content_hash
+        },
+        status_code=202
+    )
+    
 @kb_router.get("/download_document/{document_id}")
 async def download_document(
     document_id: int,
@@ -181,12 +507,13 @@ async def delete_document(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Delete the file from the filesystem
-    if os.path.exists(document.file_path):
-        os.remove(document.file_path)
+    # Rows go now, so the document stops being listed and searched; vectors are removed in the background
+    removed = db_manager.remove_document_rows(document_id)
+    if removed is not None:
+        knowledge_base_id, vector_ids = removed
+        delete_document_vectors.delay(knowledge_base_id, document_id, vector_ids)
     
-    # Delete the document from the database
-    db_manager.delete_document(document_id)
+    remove_unshared_file(document.file_path, db_manager)
     
     return JSONResponse(content={"message": "Document deleted successfully"}, status_code=200)
 
@@ -235,9 +562,12 @@ async def update_knowledge_base(
 async def delete_knowledge_base(
     kb_id: int,
     current_user_id: int = Depends(get_current_user_id),
-    kb_service: KnowledgeBaseService = Depends()
+    kb_service: KnowledgeBaseService = Depends(),
+    db_manager: DatabaseManager = Depends(get_db_manager)
 ):
-    success = kb_service.delete_knowledge_base(kb_id, current_user_id)
-    if not success:
+    file_paths = kb_service.delete_knowledge_base(kb_id, current_user_id)
+    if file_paths is None:
         raise HTTPException(status_code=404, detail="Knowledge base not found")
+    for file_path in set(file_paths):
+        remove_unshared_file(file_path, db_manager)
     return {"message": "Knowledge base deleted successfully"}
\ No newline at end of file
@@ -2,8 +2,9 @@ import os
 from fastapi import Depends, HTTPException
 from sqlalchemy.orm import Session
 from src.database.manager import DatabaseManager
-from src.database.models import Assistant, Conversation, Message
+from src.database.models import Assistant, Conversation, Message, KnowledgeBase
 from src.dependencies import get_db_manager
+from src.constants import GlobalConfig
 from src.agents.base import ChatAssistant
 from api.models.assistant import (
     AssistantCreate, 
@@ -21,16 +22,27 @@ class AssistantService:
         self.db_manager = db_manager
 
     def create_assistant(self, user_id: int, assistant_data: AssistantCreate) -> AssistantResponse:
+        retrieval_mode = assistant_data.configuration.get("retrieval_mode")
+        if retrieval_mode is not None and retrieval_mode not in GlobalConfig.RETRIEVAL_MODES:
+            raise HTTPException(status_code=400, detail=f"Invalid retrieval_mode: {retrieval_mode}. Available modes: {', '.join(GlobalConfig.RETRIEVAL_MODES)}")
 
         with self.db_manager.Session() as session:
-            print(assistant_data.systemprompt)
+            knowledge_base_ids = set(assistant_data.knowledge_base_ids) | {assistant_data.knowledge_base_id}
+            knowledge_bases = session.query(KnowledgeBase).filter(
+                KnowledgeBase.id.in_(knowledge_base_ids), KnowledgeBase.user_id == user_id
+            ).all()
+            missing = knowledge_base_ids - {kb.id for kb in knowledge_bases}
+            if missing:
+                raise HTTPException(status_code=404, detail=f"Knowledge bases not found: {sorted(missing)}")
+            
             new_assistant = Assistant(
                 user_id=user_id, 
                 name=assistant_data.name, 
                 description=assistant_data.description,
                 systemprompt=assistant_data.systemprompt,
                 knowledge_base_id=assistant_data.knowledge_base_id, 
-                configuration=assistant_data.configuration
+                configuration=assistant_data.configuration,
+                extra_knowledge_bases=[kb for kb in knowledge_bases if kb.id != assistant_data.knowledge_base_id]
             )
             
             session.add(new_assistant)
@@ -39,6 +51,29 @@ class AssistantService:
 
             return AssistantResponse.model_validate(new_assistant)
 
+    @staticmethod
+    def _assistant_config(assistant: Assistant, conversation_id: int) -> Dict:
+        configuration = assistant.configuration
+        # None once every knowledge base of the assistant was deleted
+        primary = next(iter(assistant.knowledge_bases), None)
+        return {
+            "model": configuration["model"],
+            "service": configuration["service"],
+            "temperature": configuration["temperature"],
+            "embedding_service": GlobalConfig.MODEL.EMBEDDING_SERVICE, #TODO: Let user choose embedding model,
+            "embedding_model_name": GlobalConfig.MODEL.EMBEDDING_MODEL_NAME,
+            "collection_name": f"kb_{primary.id}" if primary else None,
+            "embedding_dimensions": primary.embedding_dimensions if primary else None,
+            "knowledge_base_id": primary.id if primary else None,
+            # Every knowledge base the search tool fans out to, the primary one first
+            "knowledge_bases": [
+                {"id": kb.id, "collection_name": f"kb_{kb.id}", "embedding_dimensions": kb.embedding_dimensions}
+                for kb in assistant.knowledge_bases
+            ],
+            "retrieval_mode": configuration.get("retrieval_mode", GlobalConfig.RETRIEVAL_MODE),
+            "conversation_id": conversation_id
+        }
+
     def delete_assistant(self, assistant_id: int, user_id: int) -> bool:
         return self.db_manager.delete_assistant(assistant_id, user_id)
 
@@ -115,17 +150,7 @@ class AssistantService:
                 # In a real implementation, you might need to instantiate the assistant with its configuration
                 assistant = conversation.assistant
                 
-                configuration = assistant.configuration
-                                
-                assistant_config = {
-                    "model": configuration["model"],
-                    "service": configuration["service"],
-                    "temperature": configuration["temperature"],
-                    "embedding_service": "openai", #TODO: Let user choose embedding model,
-                    "embedding_model_name": "text-embedding-3-small",
-                    "collection_name": f"kb_{assistant.knowledge_base_id}",
-                    "conversation_id": conversation_id
-                }
+                assistant_config = self._assistant_config(assistant, conversation_id)
                 
                 assistant_instance = ChatAssistant(assistant_config)
                 response = assistant_instance.on_message(message.content, message_history)
@@ -163,17 +188,7 @@ class AssistantService:
             session.flush()
 
             assistant = conversation.assistant
-            configuration = assistant.configuration
-            
-            assistant_config = {
-                "model": configuration["model"],
-                "service": configuration["service"],
-                "temperature": configuration["temperature"],
-                "embedding_service": "openai",
-                "embedding_model_name": "text-embedding-3-small",
-                "collection_name": f"kb_{assistant.knowledge_base_id}",
-                "conversation_id": conversation_id
-            }
+            assistant_config = self._assistant_config(assistant, conversation_id)
             
             assistant_instance = ChatAssistant(assistant_config)
             
@@ -207,17 +222,7 @@ class AssistantService:
             session.flush()
 
             assistant = conversation.assistant
-            configuration = assistant.configuration
-            
-            assistant_config = {
-                "model": configuration["model"],
-                "service": configuration["service"],
-                "temperature": configuration["temperature"],
-                "embedding_service": "openai",
-                "embedding_model_name": "text-embedding-3-small",
-                "collection_name": f"kb_{assistant.knowledge_base_id}",
-                "conversation_id": conversation_id
-            }
+            assistant_config = self._assistant_config(assistant, conversation_id)
             
             assistant_instance = ChatAssistant(assistant_config)
             
@@ -4,14 +4,27 @@ from src.database.manager import DatabaseManager
 from api.models.knowledge_base import KnowledgeBaseCreate, KnowledgeBaseUpdate, KnowledgeBaseResponse
 from src.database.models import KnowledgeBase
 from src.dependencies import get_db_manager
+from src.document_parser.embedding import get_embedding_model
+from src.tasks.vector_cleanup_tasks import drop_knowledge_base_vectors
+from typing import List, Optional
 
 class KnowledgeBaseService:
     def __init__(self, db_manager: DatabaseManager = Depends(get_db_manager)):
         self.db_manager = db_manager
 
     def create_knowledge_base(self, user_id: int, kb: KnowledgeBaseCreate) -> KnowledgeBaseResponse:
+        if kb.embedding_dimensions is not None:
+            try:
+                get_embedding_model(dimensions=kb.embedding_dimensions)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
         with self.db_manager.Session() as session:
-            new_kb = KnowledgeBase(user_id=user_id, name=kb.name, description=kb.description)
+            new_kb = KnowledgeBase(
+                user_id=user_id, name=kb.name, description=kb.description,
+                embedding_dimensions=kb.embedding_dimensions, quantization=kb.quantization,
+                on_disk_vectors=kb.on_disk_vectors, hnsw_m=kb.hnsw_m, hnsw_ef_construct=kb.hnsw_ef_construct
+            )
             session.add(new_kb)
             session.commit()
             session.refresh(new_kb)
@@ -42,11 +55,12 @@ class KnowledgeBaseService:
             session.refresh(kb)
             return KnowledgeBaseResponse.model_validate(kb)
 
-    def delete_knowledge_base(self, kb_id: int, user_id: int) -> bool:
-        with self.db_manager.Session() as session:
-            kb = session.query(KnowledgeBase).filter_by(id=kb_id, user_id=user_id).first()
-            if not kb:
-                return False
-            session.delete(kb)
-            session.commit()
-            return True
\ No newline at end of file
+    def delete_knowledge_base(self, kb_id: int, user_id: int) -> Optional[List[str]]:
+        """
+        Delete the knowledge base and its documents, and drop its vectors in the background.
+        Returns the file paths of the deleted documents, or None if it was not found.
+        """
+        file_paths = self.db_manager.remove_knowledge_base_rows(kb_id, user_id)
+        if file_paths is not None:
+            drop_knowledge_base_vectors.delay(kb_id)
+        return file_paths
\ No newline at end of file
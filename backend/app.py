@@ -6,6 +6,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from celery.result import AsyncResult
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi import FastAPI, HTTPException
+from src.document_parser.embedding_cache import get_embedding_cache
+from src.tools.retrieval_cache import get_retrieval_cache
 import os
 from pathlib import Path
 
@@ -48,6 +50,22 @@ async def get_task_status(task_id: str):
         )
         
 
+@app.get("/api/embedding_cache/stats")
+async def get_embedding_cache_stats():
+    cache = get_embedding_cache()
+    if cache is None:
+        return JSONResponse(content={"enabled": False})
+    return JSONResponse(content={"enabled": True, **cache.stats()})
+
+
+@app.get("/api/retrieval_cache/stats")
+async def get_retrieval_cache_stats():
+    cache = get_retrieval_cache()
+    if cache is None:
+        return JSONResponse(content={"enabled": False})
+    return JSONResponse(content={"enabled": True, **cache.stats()})
+
+
 @app.get("/getfile/{file_path:path}")
 async def get_file(file_path: str):
     # Define the base directory where your video files are stored
@@ -7,6 +7,8 @@ from src.constants import GlobalConfig
 from llama_index.core.base.llms.types import ChatMessage as LLamaIndexChatMessage
 from llama_index.llms.openai import OpenAI
 from llama_index.agent.openai import OpenAIAgent
+from src.utils.rate_limiter import get_rate_limiter
+from .llm import RateLimitedOpenAI
 from .prompts import ASSISTANT_SYSTEM_PROMPT
 import logging
 
@@ -48,10 +50,14 @@ class ChatAssistant:
 
         if service == "openai":
             logging.info(f"Loading OpenAI Model: {model_id}")
-            return OpenAI(
+            llm_kwargs = dict(
                 model=model_id, 
                 temperature=self.configuration["temperature"], 
                 api_key=GlobalConfig.MODEL.OPENAI_API_KEY)
+            rate_limiter = get_rate_limiter("llm", service, model_id)
+            if rate_limiter is not None:
+                return RateLimitedOpenAI(rate_limiter, **llm_kwargs)
+            return OpenAI(**llm_kwargs)
         else:
             raise NotImplementedError("The implementation for other types of LLMs are not ready yet!")
         
@@ -0,0 +1,62 @@
+from typing import Any, Sequence
+from llama_index.core.base.llms.types import ChatMessage
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.llms.openai import OpenAI
+from src.utils.rate_limiter import RateLimiter, count_tokens
+
+
+class RateLimitedOpenAI(OpenAI):
+    """
+    OpenAI LLM that waits on the cluster-wide `RateLimiter` before each request.
+
+    A request is charged its prompt tokens plus `max_tokens`, which is how the provider
+    counts it against the tokens-per-minute quota.
+    """
+
+    _rate_limiter: RateLimiter = PrivateAttr()
+
+    def __init__(self, rate_limiter: RateLimiter, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._rate_limiter = rate_limiter
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "rate_limited_openai_llm"
+
+    def _request_tokens(self, texts: Sequence[str]) -> int:
+        return count_tokens(texts) + (self.max_tokens or 0)
+
+    def _message_tokens(self, messages: Sequence[ChatMessage]) -> int:
+        return self._request_tokens([str(message.content or "") for message in messages])
+
+    def _chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        self._rate_limiter.acquire(self._message_tokens(messages))
+        return super()._chat(messages, **kwargs)
+
+    def _stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        self._rate_limiter.acquire(self._message_tokens(messages))
+        return super()._stream_chat(messages, **kwargs)
+
+    def _complete(self, prompt: str, **kwargs: Any):
+        self._rate_limiter.acquire(self._request_tokens([prompt]))
+        return super()._complete(prompt, **kwargs)
+
+    def _stream_complete(self, prompt: str, **kwargs: Any):
+        self._rate_limiter.acquire(self._request_tokens([prompt]))
+        return super()._stream_complete(prompt, **kwargs)
+
+    async def _achat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        await self._rate_limiter.aacquire(self._message_tokens(messages))
+        return await super()._achat(messages, **kwargs)
+
+    async def _astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        await self._rate_limiter.aacquire(self._message_tokens(messages))
+        return await super()._astream_chat(messages, **kwargs)
+
+    async def _acomplete(self, prompt: str, **kwargs: Any):
+        await self._rate_limiter.aacquire(self._request_tokens([prompt]))
+        return await super()._acomplete(prompt, **kwargs)
+
+    async def _astream_complete(self, prompt: str, **kwargs: Any):
+        await self._rate_limiter.aacquire(self._request_tokens([prompt]))
+        return await super()._astream_complete(prompt, **kwargs)
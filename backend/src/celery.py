@@ -1,17 +1,19 @@
 from celery import Celery
+from src.constants import GlobalConfig
 
 celery = Celery('document_parser', 
-                broker='redis://localhost:6379/0',
+                broker=GlobalConfig.REDIS_URL,
                 include=[
                     "src.tasks.document_parser_tasks",
+                    "src.tasks.vector_cleanup_tasks",
                 ])
 
 # Optional: Configure Celery
 celery.conf.update(
-    result_backend='redis://localhost:6379/0',
+    result_backend=GlobalConfig.REDIS_URL,
     task_serializer='json',
     result_serializer='json',
     accept_content=['json'],
     timezone='UTC',
     enable_utc=True,
-)
\ No newline at end of file
+)
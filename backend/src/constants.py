@@ -26,15 +26,87 @@ class ModelConfig:
     EMBEDDING_MODEL_NAME = EMBEDDING_MODEL_NAME
     OTHER_KWARGS = cfg
     
+    QDRANT_URL = os.getenv('QDRANT_URL', "http://localhost:6333")
+    # Directory of the embedded "numpy" vector store
+    NUMPY_VECTOR_PATH = os.getenv('NUMPY_VECTOR_PATH', "./DB/vectors")
+    # Directory of the embedded "chroma" vector store
+    CHROMA_PATH = os.getenv('CHROMA_PATH', "./DB/chroma")
+    
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', "http://localhost:11434")
     
 class GlobalConfig:
     MODEL = ModelConfig
     DATABASE_PATH = "./DB/knowledge_base.db"
     ALLOWED_EXTENSIONS = {'.docx', '.hwp','.pdf','.epub','.txt','.html','.htm','.ipynb','.md', '.mbox', '.pptx', '.csv', '.xml', '.rtf', '.mp4'}
     MAX_CONCURRENT_REQUESTS = 5
-    
+
+    # Embedding
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+    EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", 4))
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./DB/embedding_cache.db")
+    EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+    # Vector size of the offline "local" embedding service
+    LOCAL_EMBEDDING_DIMENSION = int(os.getenv("LOCAL_EMBEDDING_DIMENSION", 384))
+
+    # Provider rate limits, shared by every process through Redis. Defaults match the
+    # OpenAI tier 1 quotas of text-embedding-3-small and gpt-4o-mini
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", 3000))
+    EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", 1_000_000))
+    LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", 500))
+    LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", 200_000))
+
+    # Ingestion
+    # Number of chunks embedded and stored together; bounds ingestion memory
+    INGESTION_BATCH_SIZE = int(os.getenv("INGESTION_BATCH_SIZE", 256))
+    # Points per vector store upsert request, and upsert requests in flight at once
+    VECTOR_UPSERT_BATCH_SIZE = int(os.getenv("VECTOR_UPSERT_BATCH_SIZE", 64))
+    VECTOR_UPSERT_PARALLEL = int(os.getenv("VECTOR_UPSERT_PARALLEL", 4))
+    # Store only ids and short metadata fields in vector payloads, reading chunk texts from SQLite
+    SLIM_VECTOR_PAYLOADS = os.getenv("SLIM_VECTOR_PAYLOADS", "false").lower() == "true"
+    # Characters of text held by the streaming splitter before it emits chunks
+    SPLITTER_WINDOW_SIZE = int(os.getenv("SPLITTER_WINDOW_SIZE", 100_000))
+    # PDF text extraction; fewer than 2 workers extracts serially
+    PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", 0))
+    PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 32))
+    # Parsed chunks kept on disk so retried ingestions don't parse again
+    PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", "./DB/parse_cache")
+    INGESTION_MAX_RETRIES = int(os.getenv("INGESTION_MAX_RETRIES", 3))
+    # Files at least this large are parsed up front and, when they have more chunks than
+    # FANOUT_CHUNKS_PER_TASK, embedded by sub-tasks spread across workers
+    FANOUT_MIN_FILE_SIZE = int(os.getenv("FANOUT_MIN_FILE_SIZE", 5 * 1024 ** 2))
+    FANOUT_CHUNKS_PER_TASK = int(os.getenv("FANOUT_CHUNKS_PER_TASK", 500))
+    # Seconds the progress and completed ranges of a fanned-out document are kept in Redis
+    FANOUT_STATE_TTL = int(os.getenv("FANOUT_STATE_TTL", 7 * 24 * 3600))
+    # Minimum seconds between two Celery state updates of an ingestion task; progress
+    # events are still published on every step
+    PROGRESS_UPDATE_INTERVAL = float(os.getenv("PROGRESS_UPDATE_INTERVAL", 1.0))
+
+    # Retrieval: "dense" (vectors), "lexical" (BM25 over SQLite FTS5) or "hybrid" (both,
+    # fused by reciprocal rank). Assistants can override it with `retrieval_mode`
+    RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+    RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 5))
+    # Candidates fetched from each retriever per returned hit in hybrid mode
+    HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", 3))
+    RRF_K = int(os.getenv("RRF_K", 60))
+    # Seconds a search across several knowledge bases waits for all of them; late ones are left out
+    FEDERATED_SEARCH_TIMEOUT = float(os.getenv("FEDERATED_SEARCH_TIMEOUT", 3.0))
+    # Results of repeated searches, tagged with the ingestion version of their knowledge bases.
+    # Kept in process memory, and in Redis too when RETRIEVAL_CACHE_REDIS is set, so every
+    # API process shares them
+    RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+    RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", 10_000))
+    RETRIEVAL_CACHE_TTL = int(os.getenv("RETRIEVAL_CACHE_TTL", 3600))
+    RETRIEVAL_CACHE_REDIS = os.getenv("RETRIEVAL_CACHE_REDIS", "false").lower() == "true"
+
     UPLOAD_FOLDER = "./uploads"
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 ** 2))
+    # Largest file copied into UPLOAD_FOLDER. The request body is already received by then,
+    # so cap it in the reverse proxy as well
+    MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 4 * 1024 ** 3))
     END_TOKEN = "<END>"
     
     # logging configuration variable
@@ -44,4 +116,5 @@ class GlobalConfig:
     LOG_LEVEL = "INFO"
     
     # Celery
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     CELERY_QUEUE_NAME = os.environ.get("QUEUE_NAME", "default")
\ No newline at end of file
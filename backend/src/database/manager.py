@@ -1,19 +1,80 @@
 from fastapi import HTTPException
-from sqlalchemy import create_engine, or_
+from sqlalchemy import create_engine, func, inspect, or_, text
 from sqlalchemy.orm import sessionmaker
-from .models import Base, User, KnowledgeBase, Document, DocumentChunk, Assistant, Conversation, Message, DocumentStatus
-from .vector_store import VectorDB, QdrantVectorDB
-from datetime import datetime
+from .models import Base, User, KnowledgeBase, Document, DocumentChunk, Assistant, Conversation, Message, DocumentStatus, assistant_knowledge_bases
+from .vector_store import VectorDB, QdrantVectorDB, CollectionConfig, SearchFilter, DEFAULT_BATCH_SIZE, DEFAULT_PARALLEL
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from src.utils.misc import hash_text, time_to_seconds, with_file_name
 import uuid 
+import json
+import logging
+import re
+
+# Longest string metadata value kept in slim vector payloads; longer values (summaries,
+# transcripts, ...) are only stored in SQLite
+MAX_PAYLOAD_FIELD_LENGTH = 256
+# Query terms sent to the full-text index; words and identifiers such as "AB-1234" or "v2.1"
+FULLTEXT_TERM_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+MAX_FULLTEXT_TERMS = 32
+# How SQLAlchemy stores DateTime columns in SQLite
+SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
 
 # Database manager class
 class DatabaseManager:
-    def __init__(self, db_path, vector_db: VectorDB):
+    def __init__(self, db_path, vector_db: VectorDB, slim_payloads: bool = False):
+        # With slim payloads, vector points only carry ids and filterable metadata and
+        # search results are hydrated from the document_chunks table
+        self.slim_payloads = slim_payloads
         self.engine = create_engine(f'sqlite:///{db_path}', connect_args={"check_same_thread": False})
         Base.metadata.create_all(self.engine)
+        self._upgrade_schema()
+        self._create_fulltext_index()
         self.Session = sessionmaker(bind=self.engine)
         self.vector_db = vector_db
 
+    def _upgrade_schema(self):
+        # create_all only creates missing tables, so add columns (and their indexes)
+        # that were introduced after an existing database was created
+        inspector = inspect(self.engine)
+        with self.engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name not in existing_columns:
+                        column_type = column.type.compile(dialect=self.engine.dialect)
+                        connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                for index in table.indexes:
+                    index.create(bind=connection, checkfirst=True)
+
+    def _create_fulltext_index(self):
+        # FTS5 index over the chunk contents, kept in sync by triggers so that every way of
+        # adding or deleting chunks maintains it
+        with self.engine.begin() as connection:
+            exists = connection.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'document_chunks_fts'"
+            )).first()
+            connection.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS document_chunks_fts USING fts5("
+                "content, content='document_chunks', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+            ))
+            connection.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS document_chunks_fts_insert AFTER INSERT ON document_chunks BEGIN "
+                "INSERT INTO document_chunks_fts(rowid, content) VALUES (new.id, new.content); END"
+            ))
+            connection.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS document_chunks_fts_delete AFTER DELETE ON document_chunks BEGIN "
+                "INSERT INTO document_chunks_fts(document_chunks_fts, rowid, content) VALUES ('delete', old.id, old.content); END"
+            ))
+            connection.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS document_chunks_fts_update AFTER UPDATE OF content ON document_chunks BEGIN "
+                "INSERT INTO document_chunks_fts(document_chunks_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+                "INSERT INTO document_chunks_fts(rowid, content) VALUES (new.id, new.content); END"
+            ))
+            if not exists:
+                # Index the chunks stored before the index existed
+                connection.execute(text("INSERT INTO document_chunks_fts(document_chunks_fts) VALUES ('rebuild')"))
+
     ## User methods
     def create_user(self, username, email, password_hash):
         with self.Session() as session:
@@ -33,14 +94,26 @@ class DatabaseManager:
         return 1  # Placeholder implementation
 
     ## Knowledge Base methods
-    def create_knowledge_base(self, user_id, name, description):
+    def create_knowledge_base(self, user_id, name, description, embedding_dimensions=None, quantization=None, on_disk_vectors=False,
+                              hnsw_m=None, hnsw_ef_construct=None):
         with self.Session() as session:
-            kb = KnowledgeBase(user_id=user_id, name=name, description=description)
+            kb = KnowledgeBase(user_id=user_id, name=name, description=description,
+                               embedding_dimensions=embedding_dimensions, quantization=quantization,
+                               on_disk_vectors=on_disk_vectors, hnsw_m=hnsw_m, hnsw_ef_construct=hnsw_ef_construct)
             session.add(kb)
             session.commit()
-            self.vector_db.create_collection(f"kb_{kb.id}")
+            self.vector_db.create_collection(f"kb_{kb.id}", self.collection_config(kb))
             return kb.id
 
+    @staticmethod
+    def collection_config(knowledge_base: KnowledgeBase) -> CollectionConfig:
+        return CollectionConfig(
+            quantization=knowledge_base.quantization,
+            on_disk=bool(knowledge_base.on_disk_vectors),
+            hnsw_m=knowledge_base.hnsw_m,
+            hnsw_ef_construct=knowledge_base.hnsw_ef_construct
+        )
+
     def get_knowledge_base(self, knowledge_base_id: int, user_id: int):
         with self.Session() as session:
             kb = session.query(KnowledgeBase).filter_by(id=knowledge_base_id, user_id=user_id).first()
@@ -48,6 +121,10 @@ class DatabaseManager:
                 raise HTTPException(status_code=404, detail="Knowledge base not found or access denied")
             return kb
 
+    def get_knowledge_base_ids(self) -> List[int]:
+        with self.Session() as session:
+            return [knowledge_base_id for (knowledge_base_id,) in session.query(KnowledgeBase.id).order_by(KnowledgeBase.id)]
+
     def find_knowledge_base(self, knowledge_base_name: str, user_id: int):
         with self.Session() as session:
             kb = session.query(KnowledgeBase).filter_by(name=knowledge_base_name, user_id=user_id).first()
@@ -55,14 +132,63 @@ class DatabaseManager:
 
 
     ## Document and DocumentChunk methods
-    def add_document(self, knowledge_base_id, file_name, file_type, file_path, status=DocumentStatus.UPLOADED):
+    def add_document(self, knowledge_base_id, file_name, file_type, file_path, status=DocumentStatus.UPLOADED, content_hash=None):
         with self.Session() as session:
             doc = Document(knowledge_base_id=knowledge_base_id, file_name=file_name,
-                           file_type=file_type, file_path=file_path, status=status)
+                           file_type=file_type, file_path=file_path, status=status,
+                           content_hash=content_hash)
             session.add(doc)
             session.commit()
             return doc.id, doc.file_type, doc.created_at
 
+    def add_documents(self, knowledge_base_id: int, documents: List[Dict[str, Any]], status=DocumentStatus.UPLOADED, batch_id: str = None):
+        """
+        Register several documents in a single transaction. Each item holds the
+        `file_name`, `file_type`, `file_path` and `content_hash` of one document.
+
+        Returns:
+            List[int]: The ids of the new documents, in the order given.
+        """
+        with self.Session() as session:
+            docs = [
+                Document(knowledge_base_id=knowledge_base_id, status=status, batch_id=batch_id, **document)
+                for document in documents
+            ]
+            session.add_all(docs)
+            session.flush()
+            document_ids = [doc.id for doc in docs]
+            session.commit()
+            return document_ids
+
+    @staticmethod
+    def _document_fields(document: Document) -> Dict[str, Any]:
+        """Payload fields shared by every chunk of a document, filterable through `SearchFilter`."""
+        created_at = document.created_at or datetime.utcnow()
+        return {
+            "document_id": document.id,
+            "file_type": document.file_type,
+            # Stored naive in UTC
+            "created_at": created_at.replace(tzinfo=timezone.utc).timestamp()
+        }
+
+    @staticmethod
+    def _chunk_times(metadata: Optional[Dict[str, Any]]) -> Dict[str, Optional[float]]:
+        """Start and end of a video section in seconds, None for other chunks."""
+        metadata = metadata or {}
+        return {"start_time": time_to_seconds(metadata.get("start_time")), "end_time": time_to_seconds(metadata.get("end_time"))}
+
+    def _chunk_payload(self, chunk_id: int, document_fields: Dict[str, Any], content: str, metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        payload = {"document_chunk_id": chunk_id, **document_fields}
+        payload.update((key, value) for key, value in self._chunk_times(metadata).items() if value is not None)
+        if not self.slim_payloads:
+            return {**payload, "text": content, "metadata": metadata}
+
+        filterable = {
+            key: value for key, value in (metadata or {}).items()
+            if isinstance(value, (bool, int, float)) or (isinstance(value, str) and len(value) <= MAX_PAYLOAD_FIELD_LENGTH)
+        }
+        return {**payload, "metadata": filterable}
+
     def add_document_chunk(self, document_id, chunk_index, content, vector, metadata = None):
         vector_id = str(uuid.uuid4())
         with self.Session() as session:
@@ -71,12 +197,16 @@ class DatabaseManager:
                 raise ValueError("Document not found")
             
             knowledge_base_id = document.knowledge_base_id
+            self.vector_db.create_collection(f"kb_{knowledge_base_id}", self.collection_config(document.knowledge_base))
             
             chunk = DocumentChunk(
                 document_id=document_id,
                 chunk_index=chunk_index,
                 content=content, 
-                vector_id=vector_id
+                content_hash=hash_text(content),
+                vector_id=vector_id,
+                chunk_metadata=metadata,
+                **self._chunk_times(metadata)
             )
             session.add(chunk)
             session.commit()
@@ -85,14 +215,207 @@ class DatabaseManager:
                 collection_name=f"kb_{knowledge_base_id}",
                 vector_id=vector_id,
                 vector=vector,
-                payload={
-                    "document_chunk_id": chunk.id,
-                    "text": content,
-                    "metadata": metadata
-                }
+                payload=self._chunk_payload(chunk.id, self._document_fields(document), content, metadata)
             )
             return chunk.id
 
+    def add_document_chunks(self, document_id, chunks: List[Dict[str, Any]], batch_size: int = DEFAULT_BATCH_SIZE,
+                            parallel: int = DEFAULT_PARALLEL, wait: bool = True):
+        """
+        Bulk version of `add_document_chunk`.
+
+        Args:
+            document_id (int): The parent document.
+            chunks (List[Dict]): Items with `chunk_index`, `content`, `vector` and optional `metadata`.
+            batch_size (int): Number of points written to the vector store per request.
+            parallel (int): Number of vector store requests in flight at once.
+            wait (bool): Wait until the vectors are searchable. Otherwise call `flush_vectors`
+                once all chunks of the document are added.
+
+        Returns:
+            List[int]: The ids of the created chunks, in input order.
+        """
+        if not chunks:
+            return []
+
+        with self.Session() as session:
+            document = session.query(Document).filter_by(id=document_id).first()
+            if not document:
+                raise ValueError("Document not found")
+
+            knowledge_base_id = document.knowledge_base_id
+            self.vector_db.create_collection(f"kb_{knowledge_base_id}", self.collection_config(document.knowledge_base))
+
+            rows = [
+                DocumentChunk(
+                    document_id=document_id,
+                    chunk_index=chunk["chunk_index"],
+                    content=chunk["content"],
+                    content_hash=hash_text(chunk["content"]),
+                    vector_id=str(uuid.uuid4()),
+                    chunk_metadata=chunk.get("metadata"),
+                    **self._chunk_times(chunk.get("metadata"))
+                )
+                for chunk in chunks
+            ]
+            session.add_all(rows)
+            session.flush()
+            # Read ids before commit expires the rows, otherwise each access reloads one row
+            chunk_ids = [row.id for row in rows]
+            vector_ids = [row.vector_id for row in rows]
+            document_fields = self._document_fields(document)
+            session.commit()
+
+            self.vector_db.add_vectors(
+                collection_name=f"kb_{knowledge_base_id}",
+                vector_ids=vector_ids,
+                vectors=[chunk["vector"] for chunk in chunks],
+                payloads=[
+                    self._chunk_payload(chunk_id, document_fields, chunk["content"], chunk.get("metadata"))
+                    for chunk_id, chunk in zip(chunk_ids, chunks)
+                ],
+                batch_size=batch_size,
+                parallel=parallel,
+                wait=wait
+            )
+            return chunk_ids
+
+    def flush_vectors(self, document_id: int):
+        """Wait until every vector added so far for the knowledge base of the document is searchable."""
+        knowledge_base = self.get_document_knowledge_base(document_id)
+        if knowledge_base:
+            self.vector_db.flush(f"kb_{knowledge_base.id}")
+
+    def get_document_chunk_hashes(self, document_id: int) -> Dict[str, List[int]]:
+        """Map the content hash of every chunk of a document to the ids of the chunks with that content."""
+        with self.Session() as session:
+            rows = session.query(DocumentChunk.id, DocumentChunk.content_hash, DocumentChunk.content) \
+                .filter_by(document_id=document_id) \
+                .order_by(DocumentChunk.chunk_index) \
+                .all()
+
+        chunk_hashes: Dict[str, List[int]] = {}
+        for chunk_id, content_hash, content in rows:
+            # Chunks stored before hashes were recorded are hashed on the fly
+            chunk_hashes.setdefault(content_hash or hash_text(content), []).append(chunk_id)
+        return chunk_hashes
+
+    def update_chunk_indexes(self, chunk_indexes: Dict[int, int]):
+        if not chunk_indexes:
+            return
+        with self.Session() as session:
+            session.bulk_update_mappings(
+                DocumentChunk,
+                [{"id": chunk_id, "chunk_index": chunk_index} for chunk_id, chunk_index in chunk_indexes.items()]
+            )
+            session.commit()
+
+    def update_chunk_metadata(self, document_id: int, chunk_metadata: Dict[int, Optional[Dict[str, Any]]],
+                              batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Replace the metadata of kept chunks of a document, in SQLite and in their vector payloads.
+        Only chunks whose metadata changed are written, their vectors are reused as they are.
+        """
+        if not chunk_metadata:
+            return
+        with self.Session() as session:
+            document = session.query(Document).filter_by(id=document_id).first()
+            if not document:
+                raise ValueError("Document not found")
+            collection_name = f"kb_{document.knowledge_base_id}"
+            document_fields = self._document_fields(document)
+            chunks = session.query(DocumentChunk).filter(DocumentChunk.id.in_(list(chunk_metadata))).all()
+            changed = [chunk for chunk in chunks if chunk.chunk_metadata != chunk_metadata[chunk.id]]
+            for chunk in changed:
+                chunk.chunk_metadata = chunk_metadata[chunk.id]
+                for key, value in self._chunk_times(chunk.chunk_metadata).items():
+                    setattr(chunk, key, value)
+            updates = [(chunk.vector_id, chunk.id, chunk.content, chunk.chunk_metadata) for chunk in changed]
+            session.commit()
+
+        for start in range(0, len(updates), batch_size):
+            batch = updates[start:start + batch_size]
+            vectors = {vector_id: vector for vector_id, vector, _ in self.vector_db.get_vectors(collection_name, [update[0] for update in batch])}
+            batch = [update for update in batch if update[0] in vectors]
+            # Points are upserted whole, with the vector they already have
+            self.vector_db.add_vectors(
+                collection_name,
+                [vector_id for vector_id, _, _, _ in batch],
+                [vectors[vector_id] for vector_id, _, _, _ in batch],
+                [self._chunk_payload(chunk_id, document_fields, content, metadata) for _, chunk_id, content, metadata in batch],
+                batch_size=batch_size
+            )
+
+    def delete_document_chunks(self, document_id: int, chunk_ids: List[int], batch_size: int = DEFAULT_BATCH_SIZE):
+        """Delete chunks of a document from SQLite and their points from the vector store."""
+        if not chunk_ids:
+            return
+        with self.Session() as session:
+            document = session.query(Document).filter_by(id=document_id).first()
+            if not document:
+                raise ValueError("Document not found")
+            knowledge_base_id = document.knowledge_base_id
+
+            vector_ids = []
+            for start in range(0, len(chunk_ids), 500):
+                query = session.query(DocumentChunk).filter(
+                    DocumentChunk.document_id == document_id,
+                    DocumentChunk.id.in_(chunk_ids[start:start + 500])
+                )
+                vector_ids.extend(vector_id for (vector_id,) in query.with_entities(DocumentChunk.vector_id))
+                query.delete(synchronize_session=False)
+            self._bump_ingestion_version(session, knowledge_base_id)
+            session.commit()
+
+        self.vector_db.delete_vectors(f"kb_{knowledge_base_id}", vector_ids, batch_size=batch_size)
+
+    def delete_document_chunks_from(self, document_id: int, chunk_index: int, end_index: int = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        """Delete the chunks of a document in [chunk_index, end_index), e.g. leftovers of an interrupted batch."""
+        with self.Session() as session:
+            query = session.query(DocumentChunk.id).filter(
+                DocumentChunk.document_id == document_id,
+                DocumentChunk.chunk_index >= chunk_index
+            )
+            if end_index is not None:
+                query = query.filter(DocumentChunk.chunk_index < end_index)
+            chunk_ids = [chunk_id for (chunk_id,) in query]
+        self.delete_document_chunks(document_id, chunk_ids, batch_size=batch_size)
+        return len(chunk_ids)
+
+    def count_document_chunks(self, document_id: int):
+        with self.Session() as session:
+            return session.query(DocumentChunk).filter_by(document_id=document_id).count()
+
+    def set_document_total_chunks(self, document_id: int, total_chunks: int):
+        with self.Session() as session:
+            session.query(Document).filter_by(id=document_id).update({"total_chunks": total_chunks})
+            session.commit()
+
+    def get_document_checkpoint(self, document_id: int):
+        with self.Session() as session:
+            document = session.query(Document).filter_by(id=document_id).first()
+            return document.checkpoint_chunk_index if document else None
+
+    def set_document_checkpoint(self, document_id: int, chunk_index):
+        with self.Session() as session:
+            session.query(Document).filter_by(id=document_id).update({"checkpoint_chunk_index": chunk_index})
+            session.commit()
+
+    def update_document_file(self, document_id: int, file_name: str, file_type: str, file_path: str, content_hash: str):
+        with self.Session() as session:
+            document = session.query(Document).filter_by(id=document_id).first()
+            if not document:
+                raise ValueError("Document not found")
+            document.file_name = file_name
+            document.file_type = file_type
+            document.file_path = file_path
+            document.content_hash = content_hash
+            # The checkpoint indexes chunks of the previous file, resuming from it would skip new content
+            document.checkpoint_chunk_index = None
+            document.total_chunks = None
+            document.updated_at = datetime.utcnow()
+            session.commit()
+
     def update_document_status(self, document_id: int, status: DocumentStatus):
         with self.Session() as session:
             document = session.query(Document).filter_by(id=document_id).first()
@@ -100,6 +423,9 @@ class DatabaseManager:
                 raise ValueError("Document not found")
             document.status = status
             document.updated_at = datetime.utcnow()
+            if status in (DocumentStatus.PROCESSED, DocumentStatus.FAILED):
+                # Every chunk the ingestion stored is searchable by now
+                self._bump_ingestion_version(session, document.knowledge_base_id)
             session.commit()
 
     def get_document(self, document_id: int):
@@ -115,25 +441,344 @@ class DatabaseManager:
             ).first()
             return document
         
+    def get_document_by_hash(self, knowledge_base_id: int, content_hash: str):
+        with self.Session() as session:
+            document = session.query(Document).filter_by(
+                knowledge_base_id=knowledge_base_id,
+                content_hash=content_hash
+            ).first()
+            return document
+
+    def find_processed_document_by_hash(self, content_hash: str, exclude_document_id: int = None, embedding_dimensions: int = None):
+        """
+        Find a document with the same bytes that has already been processed, in any knowledge
+        base whose vectors have `embedding_dimensions`, so they can be reused as they are.
+        """
+        if embedding_dimensions is None:
+            same_dimensions = KnowledgeBase.embedding_dimensions.is_(None)
+        else:
+            same_dimensions = KnowledgeBase.embedding_dimensions == embedding_dimensions
+        with self.Session() as session:
+            query = session.query(Document).join(KnowledgeBase).filter(
+                Document.content_hash == content_hash,
+                Document.status == DocumentStatus.PROCESSED,
+                same_dimensions
+            )
+            if exclude_document_id is not None:
+                query = query.filter(Document.id != exclude_document_id)
+            return query.first()
+
+    def get_document_knowledge_base(self, document_id: int):
+        with self.Session() as session:
+            return session.query(KnowledgeBase).join(Document).filter(Document.id == document_id).first()
+
+    def count_documents_with_path(self, file_path: str):
+        with self.Session() as session:
+            return session.query(Document).filter_by(file_path=file_path).count()
+
+    def copy_document_chunks(self, source_document_id: int, target_document_id: int, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Reuse the chunks and vectors of an already processed document for another document,
+        instead of parsing and embedding the same bytes again.
+
+        Returns:
+            int: The number of chunks copied.
+        """
+        with self.Session() as session:
+            source = session.query(Document).filter_by(id=source_document_id).first()
+            target = session.query(Document).filter_by(id=target_document_id).first()
+            if not source or not target:
+                raise ValueError("Document not found")
+            source_collection = f"kb_{source.knowledge_base_id}"
+            target_knowledge_base_id = target.knowledge_base_id
+            target_file_name = target.file_name
+
+            source_chunks = session.query(DocumentChunk.chunk_index, DocumentChunk.content, DocumentChunk.vector_id,
+                                          DocumentChunk.chunk_metadata) \
+                .filter_by(document_id=source_document_id) \
+                .order_by(DocumentChunk.chunk_index) \
+                .all()
+
+        copied = 0
+        for start in range(0, len(source_chunks), batch_size):
+            batch = source_chunks[start:start + batch_size]
+            points = {
+                vector_id: (vector, payload)
+                for vector_id, vector, payload in self.vector_db.get_vectors(source_collection, [chunk.vector_id for chunk in batch])
+            }
+            chunks = [
+                {
+                    "chunk_index": chunk.chunk_index,
+                    "content": chunk.content,
+                    "vector": points[chunk.vector_id][0],
+                    # Chunks stored before metadata was kept in SQLite only have it in their payload
+                    "metadata": with_file_name(
+                        chunk.chunk_metadata if chunk.chunk_metadata is not None
+                        else (points[chunk.vector_id][1] or {}).get("metadata"),
+                        target_file_name
+                    )
+                }
+                for chunk in batch
+                if chunk.vector_id in points
+            ]
+            self.add_document_chunks(document_id=target_document_id, chunks=chunks, batch_size=batch_size, wait=False)
+            copied += len(chunks)
+        self.flush_vectors(target_document_id)
+        return copied
+
     def delete_document(self, document_id: int):
+        """Delete a document, its chunks and their vectors."""
+        removed = self.remove_document_rows(document_id)
+        if removed is None:
+            return False
+        knowledge_base_id, vector_ids = removed
+        self.delete_vectors(knowledge_base_id, vector_ids, document_id)
+        return True
+
+    def remove_document_rows(self, document_id: int):
+        """
+        Delete a document and its chunks from SQLite only, leaving the vectors to `delete_vectors`.
+
+        Returns:
+            Tuple[int, List[str]]: The knowledge base id and the vector ids of the removed chunks,
+            or None if the document does not exist.
+        """
         with self.Session() as session:
             document = session.query(Document).filter_by(id=document_id).first()
             if not document:
-                return False
-            # Delete the document chunks
-            session.query(DocumentChunk).filter_by(document_id=document_id).delete()
-            # Delete the document
+                return None
+            knowledge_base_id = document.knowledge_base_id
+            chunks = session.query(DocumentChunk).filter_by(document_id=document_id)
+            vector_ids = [vector_id for (vector_id,) in chunks.with_entities(DocumentChunk.vector_id)]
+            chunks.delete(synchronize_session=False)
             session.delete(document)
+            self._bump_ingestion_version(session, knowledge_base_id)
             session.commit()
-            return True
+            return knowledge_base_id, vector_ids
+
+    def delete_vectors(self, knowledge_base_id: int, vector_ids: List[str], document_id: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Delete points by id, in batches, then every point left with the payload `document_id`
+        (written by an ingestion still in flight when the rows were removed).
+        """
+        collection_name = f"kb_{knowledge_base_id}"
+        self.vector_db.delete_vectors(collection_name, vector_ids, batch_size=batch_size)
+        if document_id is not None:
+            self.vector_db.delete_document_vectors(collection_name, document_id)
+        # Results cached since the rows were removed may still hold hits from full payloads
+        self.bump_ingestion_version(knowledge_base_id)
+
+    @staticmethod
+    def _bump_ingestion_version(session, knowledge_base_id: int):
+        session.query(KnowledgeBase).filter_by(id=knowledge_base_id).update(
+            {"ingestion_version": func.coalesce(KnowledgeBase.ingestion_version, 0) + 1}, synchronize_session=False
+        )
+
+    def bump_ingestion_version(self, knowledge_base_id: int):
+        with self.Session() as session:
+            self._bump_ingestion_version(session, knowledge_base_id)
+            session.commit()
+
+    def get_ingestion_versions(self, knowledge_base_ids: List[int]) -> Dict[int, str]:
+        """
+        Version tokens of the given knowledge bases; deleted ones are left out. The creation
+        time tells a knowledge base apart from a later one that reuses its id.
+        """
+        with self.Session() as session:
+            rows = session.query(KnowledgeBase.id, KnowledgeBase.created_at, KnowledgeBase.ingestion_version) \
+                .filter(KnowledgeBase.id.in_(knowledge_base_ids)) \
+                .all()
+        return {
+            row.id: f"{row.created_at.timestamp() if row.created_at else 0:.6f}:{row.ingestion_version or 0}"
+            for row in rows
+        }
+
+    def remove_knowledge_base_rows(self, knowledge_base_id: int, user_id: int) -> Optional[List[str]]:
+        """
+        Delete a knowledge base with its documents and chunks from SQLite, leaving its vector
+        collection to `drop_knowledge_base_vectors`.
+
+        Returns:
+            List[str]: The file paths of the removed documents, or None if the knowledge base
+            does not exist.
+        """
+        with self.Session() as session:
+            knowledge_base = session.query(KnowledgeBase).filter_by(id=knowledge_base_id, user_id=user_id).first()
+            if not knowledge_base:
+                return None
+            documents = session.query(Document.id, Document.file_path).filter_by(knowledge_base_id=knowledge_base_id).all()
+            document_ids = [document.id for document in documents]
+            for start in range(0, len(document_ids), 500):
+                session.query(DocumentChunk) \
+                    .filter(DocumentChunk.document_id.in_(document_ids[start:start + 500])) \
+                    .delete(synchronize_session=False)
+            session.query(Document).filter_by(knowledge_base_id=knowledge_base_id).delete(synchronize_session=False)
+            session.execute(assistant_knowledge_bases.delete().where(assistant_knowledge_bases.c.knowledge_base_id == knowledge_base_id))
+            # Assistants built on it fall back to their next knowledge base, or to none
+            for assistant in session.query(Assistant).filter_by(knowledge_base_id=knowledge_base_id):
+                remaining = sorted(assistant.extra_knowledge_bases, key=lambda kb: kb.id)
+                assistant.knowledge_base_id = remaining[0].id if remaining else None
+                assistant.extra_knowledge_bases = remaining[1:]
+            session.delete(knowledge_base)
+            session.commit()
+            return [document.file_path for document in documents]
+
+    def drop_knowledge_base_vectors(self, knowledge_base_id: int):
+        self.vector_db.drop_collection(f"kb_{knowledge_base_id}")
+
+    def search_similar_chunks(self, query_vector, knowledge_base_id, limit=5,
+                              search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        Nearest chunks of a knowledge base to `query_vector`, best match first, with their content
+        from SQLite. `search_filter` is applied by the vector store during the search.
+        """
+        with self.Session() as session:
+            knowledge_base = session.query(KnowledgeBase).filter_by(id=knowledge_base_id).first()
+            config = self.collection_config(knowledge_base) if knowledge_base else None
 
-    def search_similar_chunks(self, query_vector, knowledge_base_id, limit=5):
         search_result = self.vector_db.search_vectors(
             collection_name=f"kb_{knowledge_base_id}",
             query_vector=query_vector,
-            limit=limit
+            limit=limit,
+            config=config,
+            search_filter=search_filter
         )
-        return [(hit.payload["document_chunk_id"], hit.payload["content"]) for hit in search_result]
+        chunks = self.get_chunk_contents([hit.payload["document_chunk_id"] for hit in search_result])
+        # Hits whose chunk was deleted in the meantime are dropped. Chunks stored before metadata
+        # was kept in SQLite (see `upgrade_vector_payloads`) only have it in their payload
+        return [
+            {"id": hit.payload["document_chunk_id"], **chunks[hit.payload["document_chunk_id"]], "score": hit.score,
+             "metadata": chunks[hit.payload["document_chunk_id"]]["metadata"] or hit.payload.get("metadata")}
+            for hit in search_result
+            if hit.payload["document_chunk_id"] in chunks
+        ]
+
+    def upgrade_vector_payloads(self, knowledge_base_id: int, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """
+        Bring chunks stored before payloads carried their document fields up to date: rewrite
+        their vector payloads, so filtered searches find them, index the filterable fields and
+        copy their metadata into SQLite. Points already up to date are left alone, so it is
+        safe to run again.
+
+        Returns:
+            int: The number of points rewritten.
+        """
+        collection_name = f"kb_{knowledge_base_id}"
+        if not self.vector_db.collection_exists(collection_name):
+            return 0
+        self.vector_db.ensure_payload_indexes(collection_name)
+
+        with self.Session() as session:
+            documents = {
+                document.id: self._document_fields(document)
+                for document in session.query(Document).filter_by(knowledge_base_id=knowledge_base_id)
+            }
+
+        upgraded = 0
+        last_chunk_id = 0
+        while True:
+            with self.Session() as session:
+                chunks = session.query(DocumentChunk) \
+                    .filter(DocumentChunk.document_id.in_(list(documents)), DocumentChunk.id > last_chunk_id) \
+                    .order_by(DocumentChunk.id) \
+                    .limit(batch_size) \
+                    .all()
+                if not chunks:
+                    return upgraded
+                last_chunk_id = chunks[-1].id
+
+                points = {
+                    vector_id: (vector, payload or {})
+                    for vector_id, vector, payload in self.vector_db.get_vectors(collection_name, [chunk.vector_id for chunk in chunks])
+                }
+                outdated = [chunk for chunk in chunks if chunk.vector_id in points and "document_id" not in points[chunk.vector_id][1]]
+                for chunk in outdated:
+                    if chunk.chunk_metadata is None:
+                        chunk.chunk_metadata = points[chunk.vector_id][1].get("metadata")
+                        for key, value in self._chunk_times(chunk.chunk_metadata).items():
+                            setattr(chunk, key, value)
+                    chunk.content_hash = chunk.content_hash or hash_text(chunk.content)
+                update = [
+                    (chunk.vector_id, points[chunk.vector_id][0],
+                     self._chunk_payload(chunk.id, documents[chunk.document_id], chunk.content, chunk.chunk_metadata))
+                    for chunk in outdated
+                ]
+                session.commit()
+
+            if update:
+                vector_ids, vectors, payloads = map(list, zip(*update))
+                self.vector_db.add_vectors(collection_name, vector_ids, vectors, payloads, batch_size=batch_size)
+                upgraded += len(update)
+                logging.info(f"Upgraded {upgraded} vector payloads of knowledge base {knowledge_base_id} so far")
+
+    def search_chunks_lexical(self, query: str, knowledge_base_id: int, limit: int = 5,
+                              search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        BM25 search of the chunk contents of a knowledge base, best match first. Catches exact
+        identifiers (part numbers, error codes) that dense retrieval tends to miss.
+        """
+        terms = list(dict.fromkeys(FULLTEXT_TERM_PATTERN.findall(query)))[:MAX_FULLTEXT_TERMS]
+        if not terms:
+            return []
+        # Each term is quoted as a phrase, so identifiers split by the tokenizer still match as a whole
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        conditions, params = self._filter_conditions(search_filter)
+
+        with self.Session() as session:
+            rows = session.execute(text(
+                "SELECT c.id, c.document_id, c.content, c.chunk_metadata, bm25(document_chunks_fts) AS score "
+                "FROM document_chunks_fts "
+                "JOIN document_chunks c ON c.id = document_chunks_fts.rowid "
+                "JOIN documents d ON d.id = c.document_id "
+                "WHERE document_chunks_fts MATCH :match AND d.knowledge_base_id = :knowledge_base_id "
+                + "".join(f"AND {condition} " for condition in conditions) +
+                "ORDER BY score LIMIT :limit"
+            ), {"match": match, "knowledge_base_id": knowledge_base_id, "limit": limit, **params}).all()
+        return [
+            {"id": row.id, "document_id": row.document_id, "content": row.content,
+             "metadata": json.loads(row.chunk_metadata) if row.chunk_metadata else None, "score": row.score}
+            for row in rows
+        ]
+
+    @staticmethod
+    def _filter_conditions(search_filter: Optional[SearchFilter]):
+        """SQL conditions on `documents d` and `document_chunks c` equivalent to a `SearchFilter`."""
+        conditions, params = [], {}
+        if search_filter is None:
+            return conditions, params
+
+        for column, values in (("d.id", search_filter.document_ids), ("d.file_type", search_filter.file_types)):
+            if values is not None:
+                names = [f"{column[2:]}_{i}" for i in range(len(values))]
+                conditions.append(f"{column} IN ({', '.join(':' + name for name in names)})" if names else "0")
+                params.update(zip(names, values))
+        if search_filter.start_time is not None:
+            conditions.append("c.end_time >= :start_time")
+            params["start_time"] = search_filter.start_time
+        if search_filter.end_time is not None:
+            conditions.append("c.start_time <= :end_time")
+            params["end_time"] = search_filter.end_time
+        # created_at is stored as naive UTC text, which sorts chronologically
+        if search_filter.created_after is not None:
+            conditions.append("d.created_at >= :created_after")
+            params["created_after"] = datetime.fromtimestamp(search_filter.created_after, timezone.utc).strftime(SQLITE_DATETIME_FORMAT)
+        if search_filter.created_before is not None:
+            conditions.append("d.created_at <= :created_before")
+            params["created_before"] = datetime.fromtimestamp(search_filter.created_before, timezone.utc).strftime(SQLITE_DATETIME_FORMAT)
+        return conditions, params
+
+    def get_chunk_contents(self, chunk_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Content and metadata of the given chunks, with a single query, to hydrate search hits."""
+        if not chunk_ids:
+            return {}
+        with self.Session() as session:
+            rows = session.query(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.content, DocumentChunk.chunk_metadata) \
+                .filter(DocumentChunk.id.in_(chunk_ids)) \
+                .all()
+        return {
+            row.id: {"document_id": row.document_id, "content": row.content, "metadata": row.chunk_metadata}
+            for row in rows
+        }
 
     def get_document_task_id(self, document_id: int):
         with self.Session() as session:
@@ -147,6 +792,19 @@ class DatabaseManager:
                 document.task_id = task_id
                 session.commit()
 
+    def set_document_task_ids(self, task_ids: Dict[int, str]):
+        with self.Session() as session:
+            session.bulk_update_mappings(
+                Document, [{"id": document_id, "task_id": task_id} for document_id, task_id in task_ids.items()]
+            )
+            session.commit()
+
+    def get_batch_documents(self, batch_id: str, user_id: int):
+        with self.Session() as session:
+            return session.query(Document).join(KnowledgeBase).filter(
+                Document.batch_id == batch_id, KnowledgeBase.user_id == user_id
+            ).order_by(Document.id).all()
+
     ## Assistant and Conversation methods
     def create_assistant(self, user_id, name, description, systemprompt, knowledge_base_id, configuration):
         with self.Session() as session:
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, JSON, Enum
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, JSON, Enum, Boolean, Table, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -31,6 +31,14 @@ class KnowledgeBase(Base):
     description = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Vector storage settings, fixed when the collection is created
+    embedding_dimensions = Column(Integer)  # Reduced output size of text-embedding-3 models, None for the full size
+    quantization = Column(String(16))  # "scalar", "binary" or None
+    on_disk_vectors = Column(Boolean, default=False)  # Keep original vectors on disk, quantized ones in RAM
+    hnsw_m = Column(Integer)  # HNSW graph parameters, None for the vector store defaults
+    hnsw_ef_construct = Column(Integer)
+    # Bumped whenever its searchable content changes, to invalidate cached retrieval results
+    ingestion_version = Column(Integer, default=0)
     user = relationship("User", back_populates="knowledge_bases")
     documents = relationship("Document", back_populates="knowledge_base")
     
@@ -51,24 +59,40 @@ class Document(Base):
     file_name = Column(String(255), nullable=False)
     file_type = Column(String(50), nullable=False)
     file_path = Column(String(255), nullable=False)
+    content_hash = Column(String(64), index=True)  # SHA-256 of the file bytes
     status = Column(Enum(DocumentStatus), default=DocumentStatus.UPLOADED)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     knowledge_base = relationship("KnowledgeBase", back_populates="documents")
     chunks = relationship("DocumentChunk", back_populates="document")
     task_id = Column(String(255))
+    checkpoint_chunk_index = Column(Integer)  # Last chunk_index whose row and vector are both stored
+    total_chunks = Column(Integer)  # Known up front when processing is split across workers
+    batch_id = Column(String(36), index=True)  # Set when uploaded through a bulk upload
 
 
 class DocumentChunk(Base):
     __tablename__ = 'document_chunks'
     id = Column(Integer, primary_key=True)
-    document_id = Column(Integer, ForeignKey('documents.id'))
+    document_id = Column(Integer, ForeignKey('documents.id'), index=True)
     chunk_index = Column(Integer, nullable=False)
     content = Column(Text, nullable=False)
+    content_hash = Column(String(64))  # SHA-256 of the content, used to diff re-ingested documents
     vector_id = Column(String(36), nullable=False)  # UUID as string
+    chunk_metadata = Column(JSON)  # Full metadata of the chunk; vector payloads may only keep the filterable part
+    # Position of a video section in seconds, None for other chunks
+    start_time = Column(Float)
+    end_time = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
     document = relationship("Document", back_populates="chunks")
 
+# Knowledge bases searched by an assistant in addition to its primary `knowledge_base_id`
+assistant_knowledge_bases = Table(
+    'assistant_knowledge_bases', Base.metadata,
+    Column('assistant_id', Integer, ForeignKey('assistants.id'), primary_key=True),
+    Column('knowledge_base_id', Integer, ForeignKey('knowledge_bases.id'), primary_key=True)
+)
+
 class Assistant(Base):
     __tablename__ = 'assistants'
     id = Column(Integer, primary_key=True)
@@ -82,6 +106,17 @@ class Assistant(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user = relationship("User", back_populates="assistants")
     knowledge_base = relationship("KnowledgeBase")
+    extra_knowledge_bases = relationship("KnowledgeBase", secondary=assistant_knowledge_bases)
+
+    @property
+    def knowledge_bases(self):
+        """The primary knowledge base followed by the additional ones."""
+        extra = [kb for kb in self.extra_knowledge_bases if kb.id != self.knowledge_base_id]
+        return ([self.knowledge_base] if self.knowledge_base else []) + extra
+
+    @property
+    def knowledge_base_ids(self):
+        return [kb.id for kb in self.knowledge_bases]
 
 class Conversation(Base):
     __tablename__ = 'conversations'
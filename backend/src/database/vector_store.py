@@ -1,14 +1,77 @@
+import os
+import json
+import shutil
+import fcntl
+import logging
+import threading
+import numpy as np
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
+from qdrant_client.http.exceptions import UnexpectedResponse
 from chromadb import Client as ChromaClient
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 
 DEFAULT_DISTANCE = models.Distance.COSINE
+DEFAULT_BATCH_SIZE = 256
+# Upsert requests in flight at once
+DEFAULT_PARALLEL = 1
+QUANTIZATION_TYPES = ("scalar", "binary")
+# Candidates fetched with quantized vectors per requested hit, before rescoring with the originals
+QUANTIZATION_OVERSAMPLING = {"scalar": 1.5, "binary": 3.0}
+
+@dataclass
+class CollectionConfig:
+    """Storage settings of a collection, applied when it is created."""
+    quantization: Optional[str] = None  # One of QUANTIZATION_TYPES, or None to store plain float32 vectors
+    on_disk: bool = False  # Keep the original vectors on disk, only quantized vectors stay in RAM
+    hnsw_m: Optional[int] = None  # Edges per node of the HNSW graph, None for the store default
+    hnsw_ef_construct: Optional[int] = None  # Candidate list size while building the graph
+
+@dataclass
+class SearchFilter:
+    """
+    Conditions on the indexed payload fields of the points, applied by the vector store
+    during the search. Unset fields do not filter; times are in seconds.
+    """
+    document_ids: Optional[List[int]] = None
+    file_types: Optional[List[str]] = None
+    # Video sections overlapping [start_time, end_time]
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+    # Documents uploaded in this range, as Unix timestamps
+    created_after: Optional[float] = None
+    created_before: Optional[float] = None
+
+    def matches(self, payload: Dict[str, Any]) -> bool:
+        """Whether a payload satisfies the filter, for stores that filter in Python."""
+        def within(value, low=None, high=None):
+            return value is not None and (low is None or value >= low) and (high is None or value <= high)
+
+        return (
+            (self.document_ids is None or payload.get("document_id") in self.document_ids)
+            and (self.file_types is None or payload.get("file_type") in self.file_types)
+            and (self.start_time is None or within(payload.get("end_time"), low=self.start_time))
+            and (self.end_time is None or within(payload.get("start_time"), high=self.end_time))
+            and (self.created_after is None and self.created_before is None
+                 or within(payload.get("created_at"), self.created_after, self.created_before))
+        )
+
+# Payload fields searches can filter on, with their Qdrant index types
+FILTERABLE_FIELDS = {
+    "document_chunk_id": models.PayloadSchemaType.INTEGER,
+    "document_id": models.PayloadSchemaType.INTEGER,
+    "file_type": models.PayloadSchemaType.KEYWORD,
+    "created_at": models.PayloadSchemaType.FLOAT,
+    "start_time": models.PayloadSchemaType.FLOAT,
+    "end_time": models.PayloadSchemaType.FLOAT,
+}
 
 class VectorDB(ABC):
     @abstractmethod
-    def create_collection(self, collection_name: str):
+    def create_collection(self, collection_name: str, config: Optional[CollectionConfig] = None):
         pass
 
     @abstractmethod
@@ -16,40 +79,119 @@ class VectorDB(ABC):
         pass
 
     @abstractmethod
-    def search_vectors(self, collection_name: str, query_vector: List[float], limit: int):
+    def add_vectors(self, collection_name: str, vector_ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]],
+                    batch_size: int = DEFAULT_BATCH_SIZE, parallel: int = DEFAULT_PARALLEL, wait: bool = True):
+        """
+        Upsert points in requests of `batch_size`, with up to `parallel` requests in flight.
+        With `wait=False` the call returns once the store has accepted the writes, before they
+        are searchable; call `flush` before relying on them.
+        """
+        pass
+
+    @abstractmethod
+    def flush(self, collection_name: str):
+        """Block until every write accepted so far for the collection has been applied."""
+        pass
+
+    @abstractmethod
+    def get_vectors(self, collection_name: str, vector_ids: List[str]) -> List[Tuple[str, List[float], Dict[str, Any]]]:
+        pass
+
+    @abstractmethod
+    def delete_vectors(self, collection_name: str, vector_ids: List[str], batch_size: int = DEFAULT_BATCH_SIZE):
+        pass
+
+    @abstractmethod
+    def delete_document_vectors(self, collection_name: str, document_id: int):
+        """Delete every point whose payload `document_id` is `document_id`."""
+        pass
+
+    @abstractmethod
+    def drop_collection(self, collection_name: str):
+        pass
+
+    @abstractmethod
+    def search_vectors(self, collection_name: str, query_vector: List[float], limit: int, config: Optional[CollectionConfig] = None,
+                       search_filter: Optional[SearchFilter] = None):
+        pass
+
+    def ensure_payload_indexes(self, collection_name: str):
+        """Index the `FILTERABLE_FIELDS` of a collection created before they were indexed, for stores that index payloads."""
         pass
 
 class QdrantVectorDB(VectorDB):
     def __init__(self, url: str, distance: str = DEFAULT_DISTANCE):
         self.client = QdrantClient(url)
         self.distance = distance
+        # Collections known to exist on the server; the server is checked once per collection
         self.initialized_collections = set()
-        self.pending_collections = set()
+        self.pending_collections: Dict[str, CollectionConfig] = {}
+        self._collections_lock = threading.Lock()
+
+    def create_collection(self, collection_name: str, config: Optional[CollectionConfig] = None):
+        # The vector size is only known with the first vectors, so creation is deferred until then
+        if collection_name not in self.initialized_collections and collection_name not in self.pending_collections:
+            self.pending_collections[collection_name] = config or CollectionConfig()
 
-    def create_collection(self, collection_name: str):
-        if collection_name not in self.pending_collections:
-            self.pending_collections.add(collection_name)
+    def collection_exists(self, collection_name: str) -> bool:
+        if collection_name in self.initialized_collections:
+            return True
+        if self.client.collection_exists(collection_name):
+            self.initialized_collections.add(collection_name)
+            self.pending_collections.pop(collection_name, None)
+            return True
+        return False
+
+    @staticmethod
+    def _quantization_config(quantization: Optional[str]):
+        if quantization == "scalar":
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if quantization == "binary":
+            return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+        return None
 
     def _initialize_collection(self, collection_name: str, vector_size: int):
-        self.client.recreate_collection(
-            collection_name=collection_name,
-            vectors_config=models.VectorParams(size=vector_size, distance=self.distance),
-        )
-        self.client.create_payload_index(
-            collection_name=collection_name,
-            field_name="document_chunk_id",
-            field_schema=models.PayloadSchemaType.INTEGER
-        )
+        config = self.pending_collections.get(collection_name) or CollectionConfig()
+        hnsw_config = None
+        if config.hnsw_m is not None or config.hnsw_ef_construct is not None:
+            hnsw_config = models.HnswConfigDiff(m=config.hnsw_m, ef_construct=config.hnsw_ef_construct)
+        try:
+            self.client.create_collection(
+                collection_name=collection_name,
+                vectors_config=models.VectorParams(size=vector_size, distance=self.distance, on_disk=config.on_disk),
+                hnsw_config=hnsw_config,
+                quantization_config=self._quantization_config(config.quantization),
+            )
+        except (UnexpectedResponse, ValueError):
+            # Another worker created it in the meantime, keep theirs and the vectors in it
+            if not self.client.collection_exists(collection_name):
+                raise
+            logging.info(f"Collection {collection_name} was created concurrently")
+        else:
+            self.ensure_payload_indexes(collection_name)
         self.initialized_collections.add(collection_name)
-        self.pending_collections.remove(collection_name)
+        self.pending_collections.pop(collection_name, None)
+
+    def ensure_payload_indexes(self, collection_name: str):
+        # Creating an index that already exists is a no-op
+        for field_name, field_schema in FILTERABLE_FIELDS.items():
+            self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=field_schema
+            )
+
+    def _ensure_collection(self, collection_name: str, vector_size: int):
+        if collection_name in self.initialized_collections:
+            return
+        with self._collections_lock:
+            if not self.collection_exists(collection_name):
+                self._initialize_collection(collection_name, vector_size)
 
     def add_vector(self, collection_name: str, vector_id: str, vector: List[float], payload: Dict[str, Any]):
-        if collection_name not in self.initialized_collections:
-            if collection_name not in self.pending_collections:
-                self.create_collection(collection_name)
-            
-            if collection_name in self.pending_collections:
-                self._initialize_collection(collection_name, len(vector))
+        self._ensure_collection(collection_name, len(vector))
 
         self.client.upsert(
             collection_name=collection_name,
@@ -62,14 +204,119 @@ class QdrantVectorDB(VectorDB):
             ]
         )
 
-    def search_vectors(self, collection_name: str, query_vector: List[float], limit: int):
-        if collection_name not in self.initialized_collections:
+    @staticmethod
+    def _batches(vector_ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]], batch_size: int) -> List[models.Batch]:
+        return [
+            models.Batch(ids=vector_ids[start:start + batch_size], vectors=vectors[start:start + batch_size], payloads=payloads[start:start + batch_size])
+            for start in range(0, len(vectors), batch_size)
+        ]
+
+    @staticmethod
+    def _barrier_selector() -> models.FilterSelector:
+        # A filtered delete matching no point is sent to every shard and only completes
+        # with wait=True once the updates queued before it there have been applied
+        return models.FilterSelector(filter=models.Filter(must=[models.HasIdCondition(has_id=[])]))
+
+    def add_vectors(self, collection_name: str, vector_ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]],
+                    batch_size: int = DEFAULT_BATCH_SIZE, parallel: int = DEFAULT_PARALLEL, wait: bool = True):
+        if not vectors:
+            return
+        self._ensure_collection(collection_name, len(vectors[0]))
+
+        def upsert(batch: models.Batch):
+            self.client.upsert(collection_name=collection_name, points=batch, wait=wait)
+
+        batches = self._batches(vector_ids, vectors, payloads, batch_size)
+        if parallel <= 1 or len(batches) == 1:
+            for batch in batches:
+                upsert(batch)
+            return
+        with ThreadPoolExecutor(max_workers=min(parallel, len(batches))) as executor:
+            # Consuming the results re-raises the first failed upsert
+            list(executor.map(upsert, batches))
+
+    def flush(self, collection_name: str):
+        if self.collection_exists(collection_name):
+            self.client.delete(collection_name=collection_name, points_selector=self._barrier_selector(), wait=True)
+
+    def get_vectors(self, collection_name: str, vector_ids: List[str]) -> List[Tuple[str, List[float], Dict[str, Any]]]:
+        records = self.client.retrieve(
+            collection_name=collection_name,
+            ids=vector_ids,
+            with_vectors=True,
+            with_payload=True
+        )
+        return [(str(record.id), record.vector, record.payload) for record in records]
+
+    def _delete_points(self, collection_name: str, points_selector):
+        # Nothing to delete in a collection never created or already dropped, which would
+        # otherwise fail (and retry) the cleanup tasks
+        if not self.collection_exists(collection_name):
+            return
+        try:
+            self.client.delete(collection_name=collection_name, points_selector=points_selector)
+        except UnexpectedResponse as e:
+            if e.status_code != 404:
+                raise
+            # Dropped by another process since this one saw it
+            with self._collections_lock:
+                self.initialized_collections.discard(collection_name)
+
+    def delete_vectors(self, collection_name: str, vector_ids: List[str], batch_size: int = DEFAULT_BATCH_SIZE):
+        for start in range(0, len(vector_ids), batch_size):
+            self._delete_points(collection_name, models.PointIdsList(points=vector_ids[start:start + batch_size]))
+
+    @staticmethod
+    def build_filter(search_filter: Optional[SearchFilter]) -> Optional[models.Filter]:
+        if search_filter is None:
+            return None
+        conditions = []
+        if search_filter.document_ids is not None:
+            conditions.append(models.FieldCondition(key="document_id", match=models.MatchAny(any=search_filter.document_ids)))
+        if search_filter.file_types is not None:
+            conditions.append(models.FieldCondition(key="file_type", match=models.MatchAny(any=search_filter.file_types)))
+        if search_filter.start_time is not None:
+            conditions.append(models.FieldCondition(key="end_time", range=models.Range(gte=search_filter.start_time)))
+        if search_filter.end_time is not None:
+            conditions.append(models.FieldCondition(key="start_time", range=models.Range(lte=search_filter.end_time)))
+        if search_filter.created_after is not None or search_filter.created_before is not None:
+            conditions.append(models.FieldCondition(
+                key="created_at", range=models.Range(gte=search_filter.created_after, lte=search_filter.created_before)
+            ))
+        return models.Filter(must=conditions) if conditions else None
+
+    def delete_document_vectors(self, collection_name: str, document_id: int):
+        self._delete_points(collection_name, models.FilterSelector(filter=models.Filter(must=[
+            models.FieldCondition(key="document_id", match=models.MatchValue(value=document_id))
+        ])))
+
+    def drop_collection(self, collection_name: str):
+        with self._collections_lock:
+            self.client.delete_collection(collection_name)
+            self.initialized_collections.discard(collection_name)
+            self.pending_collections.pop(collection_name, None)
+
+    def search_vectors(self, collection_name: str, query_vector: List[float], limit: int, config: Optional[CollectionConfig] = None,
+                       search_filter: Optional[SearchFilter] = None):
+        if not self.collection_exists(collection_name):
             raise ValueError(f"Collection {collection_name} has not been initialized.")
         
+        search_params = None
+        if config is not None and config.quantization:
+            # Search the quantized vectors, then rescore the best candidates with the originals
+            search_params = models.SearchParams(
+                quantization=models.QuantizationSearchParams(
+                    rescore=True,
+                    oversampling=QUANTIZATION_OVERSAMPLING[config.quantization]
+                )
+            )
+        
         search_result = self.client.search(
             collection_name=collection_name,
             query_vector=query_vector,
-            limit=limit
+            query_filter=self.build_filter(search_filter),
+            limit=limit,
+            search_params=search_params
         )
         return search_result
     
@@ -79,26 +326,403 @@ class ChromaVectorDB(VectorDB):
         self.client = ChromaClient(settings)
         self.collections = {}
 
-    def create_collection(self, collection_name: str):
+    def create_collection(self, collection_name: str, config: Optional[CollectionConfig] = None):
         if collection_name not in self.collections:
-            self.collections[collection_name] = self.client.create_collection(name=collection_name)
+            # Cosine like the other stores; Chroma defaults to l2
+            metadata = {"hnsw:space": "cosine"}
+            if config is not None:
+                if config.quantization or config.on_disk:
+                    logging.warning(f"Chroma does not support quantization or on-disk vectors, using plain vectors for {collection_name}")
+                hnsw = {"hnsw:M": config.hnsw_m, "hnsw:construction_ef": config.hnsw_ef_construct}
+                metadata.update((key, value) for key, value in hnsw.items() if value is not None)
+            self.collections[collection_name] = self.client.get_or_create_collection(name=collection_name, metadata=metadata)
+
+    def _collection(self, collection_name: str):
+        # Collections created by another process, or before a restart, are looked up once
+        if collection_name not in self.collections:
+            self.collections[collection_name] = self.client.get_collection(name=collection_name)
+        return self.collections[collection_name]
+
+    @staticmethod
+    def _encode_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Chroma metadata only holds scalars: nested values are stored as JSON, None values dropped."""
+        metadata = {}
+        json_keys = []
+        for key, value in (payload or {}).items():
+            if value is None:
+                continue
+            if isinstance(value, (str, int, float, bool)):
+                metadata[key] = value
+            else:
+                metadata[key] = json.dumps(value)
+                json_keys.append(key)
+        if json_keys:
+            metadata["_json_keys"] = ",".join(json_keys)
+        return metadata
+
+    @staticmethod
+    def _decode_payload(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        payload = dict(metadata or {})
+        for key in filter(None, payload.pop("_json_keys", "").split(",")):
+            payload[key] = json.loads(payload[key])
+        return payload
 
     def add_vector(self, collection_name: str, vector_id: str, vector: List[float], payload: Dict[str, Any]):
+        self.add_vectors(collection_name, [vector_id], [vector], [payload])
+
+    def add_vectors(self, collection_name: str, vector_ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]],
+                    batch_size: int = DEFAULT_BATCH_SIZE, parallel: int = DEFAULT_PARALLEL, wait: bool = True):
+        # The embedded Chroma client writes synchronously and serializes writers, so batches
+        # are added one after the other and are applied when this returns
         if collection_name not in self.collections:
             self.create_collection(collection_name)
-        
-        self.collections[collection_name].add(
-            ids=[vector_id],
-            embeddings=[vector],
-            metadatas=[payload]
+
+        for start in range(0, len(vectors), batch_size):
+            end = start + batch_size
+            self.collections[collection_name].add(
+                ids=vector_ids[start:end],
+                embeddings=vectors[start:end],
+                metadatas=[self._encode_payload(payload) for payload in payloads[start:end]]
+            )
+
+    def flush(self, collection_name: str):
+        pass
+
+    def get_vectors(self, collection_name: str, vector_ids: List[str]) -> List[Tuple[str, List[float], Dict[str, Any]]]:
+        results = self._collection(collection_name).get(
+            ids=vector_ids,
+            include=["embeddings", "metadatas"]
         )
+        return [
+            (vector_id, list(vector), self._decode_payload(metadata))
+            for vector_id, vector, metadata in zip(results["ids"], results["embeddings"], results["metadatas"])
+        ]
 
-    def search_vectors(self, collection_name: str, query_vector: List[float], limit: int):
-        if collection_name not in self.collections:
+    def delete_vectors(self, collection_name: str, vector_ids: List[str], batch_size: int = DEFAULT_BATCH_SIZE):
+        if not vector_ids or not self.collection_exists(collection_name):
+            return
+        for start in range(0, len(vector_ids), batch_size):
+            self._collection(collection_name).delete(ids=vector_ids[start:start + batch_size])
+
+    @staticmethod
+    def _where(search_filter: Optional[SearchFilter]) -> Optional[Dict[str, Any]]:
+        if search_filter is None:
+            return None
+        conditions = []
+        if search_filter.document_ids is not None:
+            conditions.append({"document_id": {"$in": search_filter.document_ids}})
+        if search_filter.file_types is not None:
+            conditions.append({"file_type": {"$in": search_filter.file_types}})
+        if search_filter.start_time is not None:
+            conditions.append({"end_time": {"$gte": search_filter.start_time}})
+        if search_filter.end_time is not None:
+            conditions.append({"start_time": {"$lte": search_filter.end_time}})
+        if search_filter.created_after is not None:
+            conditions.append({"created_at": {"$gte": search_filter.created_after}})
+        if search_filter.created_before is not None:
+            conditions.append({"created_at": {"$lte": search_filter.created_before}})
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def collection_exists(self, collection_name: str) -> bool:
+        if collection_name in self.collections:
+            return True
+        try:
+            self._collection(collection_name)
+            return True
+        except ValueError:
+            return False
+
+    def delete_document_vectors(self, collection_name: str, document_id: int):
+        if self.collection_exists(collection_name):
+            self._collection(collection_name).delete(where={"document_id": document_id})
+
+    def drop_collection(self, collection_name: str):
+        self.collections.pop(collection_name, None)
+        try:
+            self.client.delete_collection(name=collection_name)
+        except ValueError:
+            pass  # Never created
+
+    def search_vectors(self, collection_name: str, query_vector: List[float], limit: int, config: Optional[CollectionConfig] = None,
+                       search_filter: Optional[SearchFilter] = None):
+        if not self.collection_exists(collection_name):
             raise ValueError(f"Collection {collection_name} has not been initialized.")
         
-        results = self.collections[collection_name].query(
+        results = self._collection(collection_name).query(
             query_embeddings=[query_vector],
-            n_results=limit
+            n_results=limit,
+            where=self._where(search_filter),
+            include=["metadatas", "distances"]
         )
-        return results
\ No newline at end of file
+        # Same shape as the other stores; cosine distance turned back into a similarity
+        return [
+            models.ScoredPoint(id=vector_id, version=0, score=1.0 - distance, payload=self._decode_payload(metadata))
+            for vector_id, distance, metadata in zip(results["ids"][0], results["distances"][0], results["metadatas"][0])
+        ]
+
+
+def _to_float(value: Any) -> float:
+    """A numeric payload value as a float column entry, NaN when unset or not a number."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+
+class NumpyVectorDB(VectorDB):
+    """
+    Embedded vector store for small knowledge bases, tests and benchmarks, with exact
+    search and no server to run.
+
+    Each collection is a directory holding:
+
+    - `vectors.f32`: the vectors as an append-only float32 matrix, memory-mapped for search;
+    - `points.jsonl`: an append-only log of upserted ids (with their row and payload) and
+      deleted ids, replayed to rebuild the id and payload maps.
+
+    The filterable payload fields are also kept in arrays aligned with the rows of the
+    matrix, so a search filter becomes a boolean mask next to the scores.
+
+    Writes only append, under an exclusive file lock, so several processes on the same
+    host (API and Celery workers) can share a directory. Each process picks up the writes
+    of the others by reading the log from where it stopped. Deleted and overwritten rows
+    stay in the matrix and are masked out of searches. A log that no longer starts with
+    the line it started with, or got shorter, belongs to a collection dropped and created
+    again since, and is replayed from the start.
+    """
+
+    def __init__(self, path: str, distance: str = DEFAULT_DISTANCE):
+        if distance not in (models.Distance.COSINE, models.Distance.DOT):
+            raise ValueError(f"NumpyVectorDB supports cosine and dot distances, not {distance}")
+        self.path = path
+        self.distance = distance
+        self.collections: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    # Numeric payload fields searches filter on, kept as float columns with NaN when unset
+    NUMERIC_FIELDS = ("document_id", "created_at", "start_time", "end_time")
+
+    def _collection_dir(self, collection_name: str) -> str:
+        return os.path.join(self.path, collection_name)
+
+    def create_collection(self, collection_name: str, config: Optional[CollectionConfig] = None):
+        if config is not None and config.quantization:
+            logging.warning(f"NumpyVectorDB does not support quantization, using plain vectors for {collection_name}")
+        os.makedirs(self._collection_dir(collection_name), exist_ok=True)
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return os.path.isdir(self._collection_dir(collection_name))
+
+    def _state(self, collection_name: str, reset: bool = False) -> Dict[str, Any]:
+        if reset or collection_name not in self.collections:
+            self.collections[collection_name] = {
+                "dimension": None, "rows": 0, "matrix": None, "alive": np.zeros(0, dtype=bool),
+                "columns": {**{field: np.zeros(0) for field in self.NUMERIC_FIELDS}, "file_type": np.zeros(0, dtype=object)},
+                "row_ids": [], "id_rows": {}, "payloads": {}, "log_offset": 0, "first_line": None
+            }
+        return self.collections[collection_name]
+
+    def _refresh(self, collection_name: str) -> Dict[str, Any]:
+        """Apply the log entries written since the last refresh, by this or any other process."""
+        state = self._state(collection_name)
+        log_path = os.path.join(self._collection_dir(collection_name), "points.jsonl")
+        if not os.path.exists(log_path):
+            # Dropped by another process
+            return self._state(collection_name, reset=bool(state["log_offset"]))
+
+        with open(log_path, "rb") as log:
+            # Every entry holds a unique id, so the first line identifies this incarnation of the log
+            first_line = log.readline()
+            first_line = first_line if first_line.endswith(b"\n") else None
+            replaced = state["first_line"] is not None and first_line != state["first_line"]
+            if replaced or os.fstat(log.fileno()).st_size < state["log_offset"]:
+                logging.info(f"Collection {collection_name} was replaced, reloading it")
+                state = self._state(collection_name, reset=True)
+            state["first_line"] = state["first_line"] or first_line
+            log.seek(state["log_offset"])
+            data = log.read()
+        # A line still being written by another process is read on the next refresh
+        complete = data[:data.rfind(b"\n") + 1]
+        state["log_offset"] += len(complete)
+
+        for line in complete.splitlines():
+            entry = json.loads(line)
+            if entry.get("dimension") is not None:
+                state["dimension"] = entry["dimension"]
+            old_row = state["id_rows"].pop(entry["id"], None)
+            if old_row is not None:
+                state["alive"][old_row] = False
+            state["payloads"].pop(entry["id"], None)
+            if entry["op"] == "upsert":
+                row = entry["row"]
+                if row >= len(state["alive"]):
+                    grow = max(row + 1 - len(state["alive"]), 1024)
+                    state["alive"] = np.concatenate([state["alive"], np.zeros(grow, dtype=bool)])
+                    state["columns"] = {
+                        field: np.concatenate([column, np.full(grow, None if column.dtype == object else np.nan, dtype=column.dtype)])
+                        for field, column in state["columns"].items()
+                    }
+                    state["row_ids"].extend([None] * (len(state["alive"]) - len(state["row_ids"])))
+                payload = entry["payload"] or {}
+                state["alive"][row] = True
+                for field in self.NUMERIC_FIELDS:
+                    state["columns"][field][row] = _to_float(payload.get(field))
+                state["columns"]["file_type"][row] = payload.get("file_type")
+                state["row_ids"][row] = entry["id"]
+                state["id_rows"][entry["id"]] = row
+                state["payloads"][entry["id"]] = entry["payload"]
+                state["rows"] = max(state["rows"], row + 1)
+        return state
+
+    def _matrix(self, collection_name: str, state: Dict[str, Any]) -> np.ndarray:
+        if state["dimension"] is None or state["rows"] == 0:
+            return np.zeros((0, state["dimension"] or 0), dtype=np.float32)
+        if state["matrix"] is None or len(state["matrix"]) < state["rows"]:
+            # Remapped only when other rows were appended since
+            state["matrix"] = np.memmap(
+                os.path.join(self._collection_dir(collection_name), "vectors.f32"),
+                dtype=np.float32, mode="r", shape=(state["rows"], state["dimension"])
+            )
+        return state["matrix"][:state["rows"]]
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        if self.distance != models.Distance.COSINE:
+            return vectors
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def add_vector(self, collection_name: str, vector_id: str, vector: List[float], payload: Dict[str, Any]):
+        self.add_vectors(collection_name, [vector_id], [vector], [payload])
+
+    def add_vectors(self, collection_name: str, vector_ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]],
+                    batch_size: int = DEFAULT_BATCH_SIZE, parallel: int = DEFAULT_PARALLEL, wait: bool = True):
+        # Writes are applied synchronously, so `parallel` and `wait` have no effect
+        if not vectors:
+            return
+        matrix = self._normalize(np.asarray(vectors, dtype=np.float32))
+        directory = self._collection_dir(collection_name)
+        os.makedirs(directory, exist_ok=True)
+
+        with self._lock, open(os.path.join(directory, "points.jsonl"), "ab") as log:
+            fcntl.flock(log, fcntl.LOCK_EX)
+            try:
+                state = self._refresh(collection_name)
+                if state["dimension"] is not None and state["dimension"] != matrix.shape[1]:
+                    raise ValueError(f"Collection {collection_name} holds vectors of size {state['dimension']}, not {matrix.shape[1]}")
+
+                vectors_path = os.path.join(directory, "vectors.f32")
+                # Rows past the last logged one belong to an interrupted write and are overwritten
+                with open(vectors_path, "ab") as vector_file:
+                    vector_file.truncate(state["rows"] * matrix.shape[1] * 4)
+                    vector_file.write(matrix.tobytes())
+                    vector_file.flush()
+                    os.fsync(vector_file.fileno())
+
+                start = state["rows"]
+                lines = [
+                    json.dumps({"op": "upsert", "id": str(vector_id), "row": start + i, "payload": payload,
+                                "dimension": matrix.shape[1] if start + i == 0 else None}) + "\n"
+                    for i, (vector_id, payload) in enumerate(zip(vector_ids, payloads))
+                ]
+                log.write("".join(lines).encode("utf-8"))
+                log.flush()
+                os.fsync(log.fileno())
+                self._refresh(collection_name)
+            finally:
+                fcntl.flock(log, fcntl.LOCK_UN)
+
+    def flush(self, collection_name: str):
+        pass
+
+    def get_vectors(self, collection_name: str, vector_ids: List[str]) -> List[Tuple[str, List[float], Dict[str, Any]]]:
+        with self._lock:
+            state = self._refresh(collection_name)
+            matrix = self._matrix(collection_name, state)
+            return [
+                (vector_id, matrix[state["id_rows"][vector_id]].tolist(), state["payloads"][vector_id])
+                for vector_id in map(str, vector_ids)
+                if vector_id in state["id_rows"]
+            ]
+
+    def delete_vectors(self, collection_name: str, vector_ids: List[str], batch_size: int = DEFAULT_BATCH_SIZE):
+        directory = self._collection_dir(collection_name)
+        if not vector_ids or not os.path.isdir(directory):
+            return
+        with self._lock, open(os.path.join(directory, "points.jsonl"), "ab") as log:
+            fcntl.flock(log, fcntl.LOCK_EX)
+            try:
+                log.write("".join(json.dumps({"op": "delete", "id": str(vector_id)}) + "\n" for vector_id in vector_ids).encode("utf-8"))
+                log.flush()
+                os.fsync(log.fileno())
+                self._refresh(collection_name)
+            finally:
+                fcntl.flock(log, fcntl.LOCK_UN)
+
+    def delete_document_vectors(self, collection_name: str, document_id: int):
+        if not self.collection_exists(collection_name):
+            return
+        with self._lock:
+            state = self._refresh(collection_name)
+            rows = np.flatnonzero(state["alive"] & (state["columns"]["document_id"] == document_id))
+            vector_ids = [state["row_ids"][row] for row in rows]
+        self.delete_vectors(collection_name, vector_ids)
+
+    @staticmethod
+    def _filter_mask(columns: Dict[str, np.ndarray], search_filter: SearchFilter) -> np.ndarray:
+        """The rows matching the filter, as SearchFilter.matches would select their payloads."""
+        def within(values, low=None, high=None):
+            # NaN (unset) compares false, as a missing value never matches a bound
+            mask = ~np.isnan(values)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+            return mask
+
+        with np.errstate(invalid="ignore"):
+            mask = np.ones(len(columns["document_id"]), dtype=bool)
+            if search_filter.document_ids is not None:
+                mask &= np.isin(columns["document_id"], np.asarray(search_filter.document_ids, dtype=float))
+            if search_filter.file_types is not None:
+                mask &= np.isin(columns["file_type"], np.asarray(search_filter.file_types, dtype=object))
+            if search_filter.start_time is not None:
+                mask &= within(columns["end_time"], low=search_filter.start_time)
+            if search_filter.end_time is not None:
+                mask &= within(columns["start_time"], high=search_filter.end_time)
+            if search_filter.created_after is not None or search_filter.created_before is not None:
+                mask &= within(columns["created_at"], search_filter.created_after, search_filter.created_before)
+        return mask
+
+    def drop_collection(self, collection_name: str):
+        with self._lock:
+            self.collections.pop(collection_name, None)
+            shutil.rmtree(self._collection_dir(collection_name), ignore_errors=True)
+
+    def search_vectors(self, collection_name: str, query_vector: List[float], limit: int, config: Optional[CollectionConfig] = None,
+                       search_filter: Optional[SearchFilter] = None):
+        if not self.collection_exists(collection_name):
+            raise ValueError(f"Collection {collection_name} has not been initialized.")
+
+        # Searched under the lock, so the state is read in place rather than copied
+        with self._lock:
+            state = self._refresh(collection_name)
+            matrix = self._matrix(collection_name, state)
+            rows = len(matrix)
+            alive = state["alive"][:rows]
+            if search_filter is not None:
+                alive = alive & self._filter_mask({field: column[:rows] for field, column in state["columns"].items()}, search_filter)
+            count = min(limit, int(alive.sum()))
+            if count == 0:
+                return []
+            scores = matrix @ self._normalize(np.asarray(query_vector, dtype=np.float32))
+            scores[~alive] = -np.inf
+            # Partial selection of the top `count` rows, then only those are sorted
+            top = np.argpartition(-scores, count - 1)[:count]
+            top = top[np.argsort(-scores[top])]
+            return [
+                models.ScoredPoint(id=state["row_ids"][row], version=0, score=float(scores[row]),
+                                   payload=state["payloads"][state["row_ids"][row]])
+                for row in top
+            ]
@@ -1,6 +1,8 @@
 from functools import lru_cache
 from fastapi import Depends
-from src.database.manager import DatabaseManager, QdrantVectorDB
+from src.database.manager import DatabaseManager
+from chromadb.config import Settings
+from src.database.vector_store import VectorDB, QdrantVectorDB, NumpyVectorDB, ChromaVectorDB
 from src.constants import GlobalConfig
 import logging
 
@@ -22,10 +24,18 @@ def initialize_database(db_manager: DatabaseManager):
         db_manager.create_knowledge_base(user_id, "Default", "Default knowledge base")
         logging.info("Default knowledge base created.")
 
+def get_vector_db() -> VectorDB:
+    if GlobalConfig.MODEL.VECTOR_STORE == "qdrant":
+        return QdrantVectorDB(GlobalConfig.MODEL.QDRANT_URL)
+    if GlobalConfig.MODEL.VECTOR_STORE == "numpy":
+        return NumpyVectorDB(GlobalConfig.MODEL.NUMPY_VECTOR_PATH)
+    if GlobalConfig.MODEL.VECTOR_STORE == "chroma":
+        return ChromaVectorDB(Settings(is_persistent=True, persist_directory=GlobalConfig.MODEL.CHROMA_PATH, anonymized_telemetry=False))
+    raise ValueError(f"Invalid vector store: {GlobalConfig.MODEL.VECTOR_STORE}")
+
 def get_database_manager() -> DatabaseManager:
-    # You could load these configurations from environment variables or a config file
-    vector_db = QdrantVectorDB("http://localhost:6333")
-    db_manager = DatabaseManager(GlobalConfig.DATABASE_PATH, vector_db)
+    vector_db = get_vector_db()
+    db_manager = DatabaseManager(GlobalConfig.DATABASE_PATH, vector_db, slim_payloads=GlobalConfig.SLIM_VECTOR_PAYLOADS)
     
     # Create a user
     initialize_database(db_manager)
@@ -1,12 +1,188 @@
-from llama_index.embeddings.openai import OpenAIEmbedding
-from src.constants import GlobalConfig
+import time
+import asyncio
+from typing import Any, Callable, List, Optional
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
 from src.constants import GlobalConfig
+from src.document_parser.embedding_cache import EmbeddingCache, get_embedding_cache
+from src.document_parser.embedding_providers import get_embedding_provider
+from src.utils.rate_limiter import RateLimiter, count_tokens, get_rate_limiter
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Wraps an embedding model and serves repeated texts from the persistent `EmbeddingCache`."""
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+    _service: str = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, cache: EmbeddingCache, service: str, model_name: Optional[str] = None, **kwargs: Any):
+        # `model_name` keys the cache entries, it must change whenever the vectors would
+        super().__init__(
+            model_name=model_name or embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs
+        )
+        self._embed_model = embed_model
+        self._cache = cache
+        self._service = service
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def _split_hits(self, texts: List[str], role: str = "text"):
+        cached = self._cache.get_many(self._service, self.model_name, texts, role)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        return cached, missing
+
+    def _merge(self, texts: List[str], cached: List[Optional[Embedding]], missing: List[int], vectors: List[Embedding],
+               role: str = "text") -> List[Embedding]:
+        self._cache.put_many(self._service, self.model_name, [texts[i] for i in missing], vectors, role)
+        for i, vector in zip(missing, vectors):
+            cached[i] = vector
+        return cached
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        cached, missing = self._split_hits(texts)
+        vectors = self._embed_model._get_text_embeddings([texts[i] for i in missing]) if missing else []
+        return self._merge(texts, cached, missing, vectors)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        cached, missing = self._split_hits(texts)
+        vectors = await self._embed_model._aget_text_embeddings([texts[i] for i in missing]) if missing else []
+        return self._merge(texts, cached, missing, vectors)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        # Asymmetric models embed a query differently from the same text as a document
+        cached, missing = self._split_hits([query], role="query")
+        vectors = [self._embed_model._get_query_embedding(query)] if missing else []
+        return self._merge([query], cached, missing, vectors, role="query")[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        cached, missing = self._split_hits([query], role="query")
+        vectors = [await self._embed_model._aget_query_embedding(query)] if missing else []
+        return self._merge([query], cached, missing, vectors, role="query")[0]
+
+
+class RateLimitedEmbedding(BaseEmbedding):
+    """Waits on the cluster-wide `RateLimiter` before each request to the wrapped embedding model."""
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _rate_limiter: RateLimiter = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, rate_limiter: RateLimiter, **kwargs: Any):
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs
+        )
+        self._embed_model = embed_model
+        self._rate_limiter = rate_limiter
 
+    @classmethod
+    def class_name(cls) -> str:
+        return "RateLimitedEmbedding"
 
-def get_embedding(chunk: str, service = GlobalConfig.MODEL.EMBEDDING_SERVICE, model_name = GlobalConfig.MODEL.EMBEDDING_MODEL_NAME):
-    if service == 'openai':
-        embed_model = OpenAIEmbedding(model=model_name, api_key=GlobalConfig.MODEL.OPENAI_API_KEY)
-    else:
-        raise ValueError(f"Invalid embedding service: {service}")
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        self._rate_limiter.acquire(count_tokens(texts))
+        return self._embed_model._get_text_embeddings(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        await self._rate_limiter.aacquire(count_tokens(texts))
+        return await self._embed_model._aget_text_embeddings(texts)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        self._rate_limiter.acquire(count_tokens([query]))
+        return self._embed_model._get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        await self._rate_limiter.aacquire(count_tokens([query]))
+        return await self._embed_model._aget_query_embedding(query)
+
+
+def get_embedding_model(service = GlobalConfig.MODEL.EMBEDDING_SERVICE, model_name = GlobalConfig.MODEL.EMBEDDING_MODEL_NAME,
+                        dimensions: Optional[int] = None) -> BaseEmbedding:
+    """
+    Build the embedding model of `service`, rate limited and cached as the provider requires.
+    `dimensions` asks models that support it (text-embedding-3) for shorter vectors.
+    """
+    provider = get_embedding_provider(service)
+    embed_model = provider.factory(model_name, dimensions)
     
-    return embed_model.get_text_embedding(chunk)
\ No newline at end of file
+    # Only requests that reach the provider count against the quota, so limit below the cache
+    rate_limiter = get_rate_limiter("embedding", service, model_name) if provider.rate_limited else None
+    if rate_limiter is not None:
+        embed_model = RateLimitedEmbedding(embed_model, rate_limiter)
+    
+    cache = get_embedding_cache() if provider.cached else None
+    if cache is not None:
+        cache_model_name = f"{model_name}@{dimensions}" if dimensions else model_name
+        return CachedEmbedding(embed_model, cache, service, model_name=cache_model_name)
+    return embed_model
+
+
+def get_embedding(chunk: str, service = GlobalConfig.MODEL.EMBEDDING_SERVICE, model_name = GlobalConfig.MODEL.EMBEDDING_MODEL_NAME,
+                  embed_model: Optional[BaseEmbedding] = None):
+    embed_model = embed_model or get_embedding_model(service, model_name)
+    return embed_model.get_text_embedding(chunk)
+
+
+async def aget_embeddings(
+    chunks: List[str],
+    service = GlobalConfig.MODEL.EMBEDDING_SERVICE,
+    model_name = GlobalConfig.MODEL.EMBEDDING_MODEL_NAME,
+    batch_size: int = GlobalConfig.EMBEDDING_BATCH_SIZE,
+    max_concurrency: int = GlobalConfig.EMBEDDING_MAX_CONCURRENCY,
+    on_batch_complete: Optional[Callable[[int, int, int, float], None]] = None,
+    embed_model: Optional[BaseEmbedding] = None,
+) -> List[List[float]]:
+    """
+    Embed chunks in batches, running up to `max_concurrency` batches at once.
+
+    Args:
+        chunks (List[str]): Texts to embed.
+        batch_size (int): Number of texts sent per provider request.
+        max_concurrency (int): Maximum number of batches in flight.
+        on_batch_complete (Callable, optional): Called as
+            (batch_index, num_batches, batch_length, elapsed_seconds) after each batch.
+        embed_model (BaseEmbedding, optional): An already built model to use instead of
+            `service` and `model_name`. Its async client is bound to the event loop of its
+            first call, so only reuse it on the same loop.
+
+    Returns:
+        List[List[float]]: One vector per chunk, in the same order as `chunks`.
+    """
+    embed_model = embed_model or get_embedding_model(service, model_name)
+    batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def embed_batch(batch_index: int, batch: List[str]) -> List[List[float]]:
+        async with semaphore:
+            start = time.perf_counter()
+            # aget_text_embedding_batch would split the batch again by embed_batch_size and send
+            # the pieces all at once, so call the model directly: one batch, one request
+            vectors = await embed_model._aget_text_embeddings(batch)
+            elapsed = time.perf_counter() - start
+        if on_batch_complete:
+            on_batch_complete(batch_index, len(batches), len(batch), elapsed)
+        return vectors
+
+    results = await asyncio.gather(*[embed_batch(i, batch) for i, batch in enumerate(batches)])
+    return [vector for batch_vectors in results for vector in batch_vectors]
+
+
+def get_embeddings(chunks: List[str], **kwargs) -> List[List[float]]:
+    return asyncio.run(aget_embeddings(chunks, **kwargs))
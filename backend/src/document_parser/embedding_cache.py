@@ -0,0 +1,180 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from array import array
+from functools import lru_cache
+from typing import Dict, List, Optional
+from src.constants import GlobalConfig
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding cache backed by SQLite.
+
+    Vectors are keyed by (service, model name, role, sha256 of the normalized text) and
+    stored as float32 blobs. The role ("text" or "query") keeps apart the two embeddings
+    of asymmetric models, which embed queries differently from documents. When the stored vectors exceed `max_bytes`, the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")]
+        if columns and "role" not in columns:
+            # Entries from before roles were recorded may hold query vectors under text keys, drop them
+            logging.info("Embedding cache predates embedding roles, clearing it")
+            self._conn.executescript(
+                """
+                DROP TABLE embeddings;
+                UPDATE cache_size SET total_bytes = 0 WHERE id = 0;
+                """
+            )
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                service TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                role TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (service, model_name, role, text_hash)
+            );
+            CREATE INDEX IF NOT EXISTS idx_embeddings_accessed_at ON embeddings (accessed_at);
+            CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), total_bytes INTEGER NOT NULL);
+            INSERT OR IGNORE INTO cache_size (id, total_bytes) VALUES (0, 0);
+            CREATE TRIGGER IF NOT EXISTS embeddings_size_insert AFTER INSERT ON embeddings BEGIN
+                UPDATE cache_size SET total_bytes = total_bytes + length(NEW.vector) WHERE id = 0;
+            END;
+            CREATE TRIGGER IF NOT EXISTS embeddings_size_delete AFTER DELETE ON embeddings BEGIN
+                UPDATE cache_size SET total_bytes = total_bytes - length(OLD.vector) WHERE id = 0;
+            END;
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+    @classmethod
+    def hash_text(cls, text: str) -> str:
+        return hashlib.sha256(cls.normalize_text(text).encode("utf-8")).hexdigest()
+
+    def get_many(self, service: str, model_name: str, texts: List[str], role: str = "text") -> List[Optional[List[float]]]:
+        hashes = [self.hash_text(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE service = ? AND model_name = ? AND role = ? AND text_hash IN ({placeholders})",
+                    [service, model_name, role, *batch],
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = array("f", blob).tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET accessed_at = ? WHERE service = ? AND model_name = ? AND role = ? AND text_hash = ?",
+                    [(now, service, model_name, role, text_hash) for text_hash in found],
+                )
+                self._conn.commit()
+
+            results = [found.get(text_hash) for text_hash in hashes]
+            hits = sum(1 for vector in results if vector is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, service: str, model_name: str, texts: List[str], vectors: List[List[float]], role: str = "text"):
+        if not texts:
+            return
+        now = time.time()
+        rows = [
+            (service, model_name, role, self.hash_text(text), array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (service, model_name, role, text_hash, vector, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            self._evict()
+
+    def _evict(self):
+        total_bytes = self._size()
+        if total_bytes <= self.max_bytes:
+            return
+
+        # Evict down to 90% of the budget so we don't evict on every write
+        target = int(self.max_bytes * 0.9)
+        while total_bytes > target:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if not entries:
+                break
+            # Estimate how many of the oldest rows cover the overshoot from the average row size
+            average_bytes = max(1, total_bytes // entries)
+            limit = max(1, -(-(total_bytes - target) // average_bytes))
+            deleted = self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY accessed_at LIMIT ?)",
+                (limit,)
+            ).rowcount
+            self._conn.commit()
+            self.evictions += deleted
+            total_bytes = self._size()
+        logging.info(f"Embedding cache evicted down to {total_bytes} bytes")
+
+    def _size(self) -> int:
+        return self._conn.execute("SELECT total_bytes FROM cache_size WHERE id = 0").fetchone()[0]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            total_bytes = self._size()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "total_bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+
+@lru_cache()
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    if not GlobalConfig.EMBEDDING_CACHE_ENABLED:
+        return None
+    return EmbeddingCache(GlobalConfig.EMBEDDING_CACHE_PATH, GlobalConfig.EMBEDDING_CACHE_MAX_BYTES)
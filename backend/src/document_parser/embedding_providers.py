@@ -0,0 +1,143 @@
+import re
+import unicodedata
+import numpy as np
+from typing import Callable, Dict, List, NamedTuple, Optional
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field
+from src.constants import GlobalConfig
+
+
+class EmbeddingProvider(NamedTuple):
+    # Builds the model from a model name and an optional reduced output dimension
+    factory: Callable[[str, Optional[int]], BaseEmbedding]
+    # Calls a metered remote API, so requests go through the cluster-wide rate limiter
+    rate_limited: bool
+    # Slow enough that looking vectors up in the embedding cache pays off
+    cached: bool
+
+
+EMBEDDING_PROVIDERS: Dict[str, EmbeddingProvider] = {}
+
+
+def register_embedding_provider(service: str, rate_limited: bool = False, cached: bool = True):
+    """
+    Register a factory building the embedding model of `service`. Factories raise
+    ValueError for a `dimensions` the model cannot produce.
+    """
+    def decorator(factory: Callable[[str, Optional[int]], BaseEmbedding]):
+        EMBEDDING_PROVIDERS[service] = EmbeddingProvider(factory, rate_limited, cached)
+        return factory
+    return decorator
+
+
+def get_embedding_provider(service: str) -> EmbeddingProvider:
+    if service not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Invalid embedding service: {service}. Available services: {', '.join(EMBEDDING_PROVIDERS)}")
+    return EMBEDDING_PROVIDERS[service]
+
+
+class HashingEmbedding(BaseEmbedding):
+    """
+    Deterministic embedding computed locally with NumPy, for load tests and benchmarks
+    that must not depend on the network.
+
+    The character n-grams of the normalized text are hashed into `dimension` signed
+    buckets (the hashing trick) and the result is L2-normalized, so texts sharing many
+    n-grams still end up close to each other. The vectors depend only on the text, the
+    n-gram range and the dimension, in every process and on every machine.
+    """
+
+    dimension: int = Field(default=384, description="Size of the vectors.")
+    min_ngram: int = Field(default=3, description="Shortest character n-gram.")
+    max_ngram: int = Field(default=5, description="Longest character n-gram.")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashingEmbedding"
+
+    def _embed(self, text: str) -> Embedding:
+        text = re.sub(r"\s+", " ", unicodedata.normalize("NFC", text).lower()).strip()
+        data = np.frombuffer(f" {text} ".encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+        vector = np.zeros(self.dimension, dtype=np.float64)
+
+        for n in range(self.min_ngram, self.max_ngram + 1):
+            count = len(data) - n + 1
+            if count <= 0:
+                break
+            # Polynomial hash of every n-gram at once; uint64 arithmetic wraps around
+            hashes = np.full(count, n, dtype=np.uint64)
+            for k in range(n):
+                hashes = hashes * np.uint64(1099511628211) + data[k:k + count]
+            # Mix the bits so that both the bucket and the sign depend on the whole n-gram
+            hashes ^= hashes >> np.uint64(33)
+            hashes *= np.uint64(0xff51afd7ed558ccd)
+            hashes ^= hashes >> np.uint64(33)
+
+            buckets = (hashes % np.uint64(self.dimension)).astype(np.intp)
+            signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+            vector += np.bincount(buckets, weights=signs, minlength=self.dimension)
+
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.astype(np.float32).tolist()
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return [self._embed(text) for text in texts]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._get_text_embeddings(texts)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed(text)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return self._embed(text)
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return self._embed(query)
+
+
+@register_embedding_provider("openai", rate_limited=True)
+def openai_embedding(model_name: str, dimensions: Optional[int] = None) -> BaseEmbedding:
+    from llama_index.embeddings.openai import OpenAIEmbedding
+
+    if dimensions is not None and not model_name.startswith("text-embedding-3"):
+        raise ValueError(f"{model_name} does not support reduced dimensions, only text-embedding-3 models do")
+    return OpenAIEmbedding(model=model_name, dimensions=dimensions, api_key=GlobalConfig.MODEL.OPENAI_API_KEY,
+                           embed_batch_size=GlobalConfig.EMBEDDING_BATCH_SIZE)
+
+
+@register_embedding_provider("ollama")
+def ollama_embedding(model_name: str, dimensions: Optional[int] = None) -> BaseEmbedding:
+    from llama_index.embeddings.ollama import OllamaEmbedding
+
+    if dimensions is not None:
+        raise ValueError("The ollama embedding service does not support reduced dimensions")
+
+    return OllamaEmbedding(model_name=model_name, base_url=GlobalConfig.MODEL.OLLAMA_BASE_URL)
+
+
+@register_embedding_provider("hf")
+def huggingface_embedding(model_name: str, dimensions: Optional[int] = None) -> BaseEmbedding:
+    if dimensions is not None:
+        raise ValueError("The hf embedding service does not support reduced dimensions")
+    try:
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+    except ImportError:
+        raise ImportError(
+            "llama-index-embeddings-huggingface is required for the hf embedding service: "
+            "`pip install llama-index-embeddings-huggingface`"
+        )
+    return HuggingFaceEmbedding(model_name=model_name)
+
+
+@register_embedding_provider("local", cached=False)
+def hashing_embedding(model_name: str, dimensions: Optional[int] = None) -> BaseEmbedding:
+    # The dimension can also be chosen through the model name, e.g. "hashing-768"
+    match = re.fullmatch(r"hashing-(\d+)", model_name or "")
+    dimension = dimensions or (int(match.group(1)) if match else GlobalConfig.LOCAL_EMBEDDING_DIMENSION)
+    return HashingEmbedding(model_name=f"hashing-{dimension}", dimension=dimension)
@@ -0,0 +1,81 @@
+import os
+import json
+import logging
+import itertools
+from typing import Iterator, Optional
+from llama_index.core.schema import Document
+from src.constants import GlobalConfig
+
+
+class ParseCache:
+    """
+    Keeps the chunks produced by a file processor as JSON lines on disk, so a retried
+    ingestion can reload them instead of parsing the file again (e.g. a video's
+    transcription and summary).
+
+    A cache entry only becomes visible once the processor has produced every chunk.
+    """
+
+    def __init__(self, cache_dir: str = GlobalConfig.PARSE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.jsonl")
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def load(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[Document]:
+        """Yield the cached chunks [start, end); lines before `start` are skipped without decoding."""
+        with open(self.path(key), "r", encoding="utf-8") as fp:
+            for line in itertools.islice(fp, start, end):
+                item = json.loads(line)
+                yield Document(text=item["text"], metadata=item["metadata"])
+
+    def count(self, key: str) -> int:
+        with open(self.path(key), "r", encoding="utf-8") as fp:
+            return sum(1 for _ in fp)
+
+    def ensure(self, key: str, processor, file_path: str) -> int:
+        """Parse `file_path` into the cache unless it is already there, and return the number of chunks."""
+        if not self.exists(key):
+            for _ in self.iter_chunks(key, processor, file_path):
+                pass
+        return self.count(key)
+
+    def iter_chunks(self, key: str, processor, file_path: str) -> Iterator[Document]:
+        """Yield the chunks of `file_path`, from the cache when complete, otherwise from `processor`."""
+        if self.exists(key):
+            logging.info(f"Loading parsed chunks of {file_path} from cache")
+            yield from self.load(key)
+            return
+
+        tmp_path = f"{self.path(key)}.{os.getpid()}.tmp"
+        chunks = processor.iter_chunks(file_path)
+        if not getattr(processor, "streaming", False):
+            # Parsing is all or nothing anyway, so persist it before the first chunk is consumed
+            chunks = list(chunks)
+            with open(tmp_path, "w", encoding="utf-8") as fp:
+                fp.writelines(self._dump(chunk) for chunk in chunks)
+            os.replace(tmp_path, self.path(key))
+            yield from chunks
+            return
+
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as fp:
+                for chunk in chunks:
+                    fp.write(self._dump(chunk))
+                    yield chunk
+            os.replace(tmp_path, self.path(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _dump(chunk: Document) -> str:
+        return json.dumps({"text": chunk.text, "metadata": chunk.metadata}) + "\n"
+
+    def remove(self, key: str):
+        if self.exists(key):
+            os.remove(self.path(key))
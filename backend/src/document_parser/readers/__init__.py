@@ -6,14 +6,14 @@ from llama_index.readers.file import (
     HTMLTagReader,
     IPYNBReader,
     MarkdownReader,
-    MboxReader,
     PptxReader,
-    CSVReader,
     XMLReader,
     RTFReader,
 )
 
 from .pdf_reader import PDFReader
+from .csv_reader import CSVReader
+from .mbox_reader import MboxReader
 from .video_reader import VideoReader
 
 __all__ = [
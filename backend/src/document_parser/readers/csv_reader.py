@@ -0,0 +1,48 @@
+import csv
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import Document
+
+ROWS_PER_DOCUMENT = 1000
+
+
+class CSVReader(BaseReader):
+    """CSV parser that reads the file row by row.
+
+    Args:
+        return_full_document (bool): Return the whole file as a single Document.
+        rows_per_document (int): Number of rows grouped in each Document yielded by
+            `lazy_load_data`, so memory stays bounded by this many rows.
+    """
+
+    def __init__(self, return_full_document: Optional[bool] = False, rows_per_document: int = ROWS_PER_DOCUMENT) -> None:
+        self.return_full_document = return_full_document
+        self.rows_per_document = rows_per_document
+
+    def load_data(self, file: Path, extra_info: Optional[Dict] = None) -> List[Document]:
+        """Parse file."""
+        docs = list(self.lazy_load_data(file, extra_info))
+        if self.return_full_document and docs:
+            return [Document(text="\n".join(doc.text for doc in docs), metadata=docs[0].metadata)]
+        return docs
+
+    def lazy_load_data(self, file: Path, extra_info: Optional[Dict] = None) -> Iterator[Document]:
+        """Parse file, yielding one Document per `rows_per_document` rows."""
+        if not isinstance(file, Path):
+            file = Path(file)
+
+        metadata = {"filename": file.name, "extension": file.suffix}
+        if extra_info:
+            metadata.update(extra_info)
+
+        rows = []
+        with open(file, newline="", encoding="utf-8", errors="replace") as fp:
+            for row in csv.reader(fp):
+                rows.append(", ".join(row))
+                if len(rows) >= self.rows_per_document:
+                    yield Document(text="\n".join(rows), metadata=dict(metadata))
+                    rows = []
+        if rows:
+            yield Document(text="\n".join(rows), metadata=dict(metadata))
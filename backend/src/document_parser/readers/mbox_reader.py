@@ -0,0 +1,99 @@
+import logging
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import Document
+
+logger = logging.getLogger(__name__)
+
+
+class MboxReader(BaseReader):
+    """Mbox parser that reads one message at a time.
+
+    Returns a string including the date, subject, sender, receiver and content of
+    each message. `mailbox` only indexes message offsets up front, so memory holds
+    a single message at once.
+
+    Args:
+        return_full_document (bool): Return the whole mailbox as a single Document.
+        max_count (int): Stop after this many messages, 0 for all of them.
+    """
+
+    DEFAULT_MESSAGE_FORMAT: str = (
+        "Date: {_date}\n"
+        "From: {_from}\n"
+        "To: {_to}\n"
+        "Subject: {_subject}\n"
+        "Content: {_content}"
+    )
+
+    def __init__(
+        self,
+        return_full_document: Optional[bool] = False,
+        max_count: int = 0,
+        message_format: str = DEFAULT_MESSAGE_FORMAT,
+    ) -> None:
+        try:
+            from bs4 import BeautifulSoup  # noqa
+        except ImportError:
+            raise ImportError(
+                "`beautifulsoup4` package not found: `pip install beautifulsoup4`"
+            )
+        self.return_full_document = return_full_document
+        self.max_count = max_count
+        self.message_format = message_format
+
+    def load_data(self, file: Path, extra_info: Optional[Dict] = None) -> List[Document]:
+        """Parse file."""
+        docs = list(self.lazy_load_data(file, extra_info))
+        if self.return_full_document and docs:
+            return [Document(text="\n\n".join(doc.text for doc in docs), metadata=docs[0].metadata)]
+        return docs
+
+    def _message_text(self, msg) -> str:
+        from bs4 import BeautifulSoup
+
+        content = b""
+        if msg.is_multipart():
+            for part in msg.walk():
+                if part.get_content_type() == "text/plain" and "attachment" not in str(part.get("Content-Disposition")):
+                    content = part.get_payload(decode=True)
+                    break
+        else:
+            content = msg.get_payload(decode=True)
+
+        # Strip HTML and collapse whitespace
+        stripped_content = " ".join(BeautifulSoup(content or b"", "html.parser").get_text().split())
+        return self.message_format.format(
+            _date=msg["date"],
+            _from=msg["from"],
+            _to=msg["to"],
+            _subject=msg["subject"],
+            _content=stripped_content,
+        )
+
+    def lazy_load_data(self, file: Path, extra_info: Optional[Dict] = None) -> Iterator[Document]:
+        """Parse file, yielding one Document per message."""
+        import mailbox
+        from email.parser import BytesParser
+        from email.policy import default
+
+        if not isinstance(file, Path):
+            file = Path(file)
+
+        metadata = {"file_name": file.name}
+        if extra_info:
+            metadata.update(extra_info)
+
+        mbox = mailbox.mbox(file, factory=BytesParser(policy=default).parse, create=False)
+        try:
+            for count, msg in enumerate(mbox.itervalues(), start=1):
+                try:
+                    yield Document(text=self._message_text(msg), metadata=dict(metadata))
+                except Exception as e:
+                    logger.warning(f"Failed to parse message {count} of {file.name}: {e}")
+                if self.max_count > 0 and count >= self.max_count:
+                    break
+        finally:
+            mbox.close()
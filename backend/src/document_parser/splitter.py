@@ -0,0 +1,48 @@
+from typing import Iterable, Iterator
+from llama_index.core.text_splitter import SentenceSplitter
+from src.constants import GlobalConfig
+
+
+class SlidingWindowSplitter:
+    """
+    Splits a stream of texts with a `SentenceSplitter` while holding at most
+    about `window_size` characters in memory.
+
+    Texts are joined with newlines, as if they had been concatenated up front. Each
+    time the buffer fills up it is split, every chunk but the last is emitted and the
+    last one is carried over, since it may continue in the next piece of text.
+    """
+
+    def __init__(self, splitter: SentenceSplitter = None, window_size: int = GlobalConfig.SPLITTER_WINDOW_SIZE):
+        self.splitter = splitter or SentenceSplitter()
+        self.window_size = window_size
+
+    def _pieces(self, texts: Iterable[str]) -> Iterator[str]:
+        for i, text in enumerate(texts):
+            prefix = "\n" if i else ""
+            start = 0
+            while True:
+                end = min(len(text), start + self.window_size)
+                if end < len(text):
+                    # Cut on whitespace so no word is split across windows
+                    cut = text.rfind(" ", start + 1, end)
+                    end = cut if cut > start else end
+                yield prefix + text[start:end]
+                prefix = ""
+                start = end
+                if start >= len(text):
+                    break
+
+    def split(self, texts: Iterable[str]) -> Iterator[str]:
+        buffer = ""
+        for piece in self._pieces(texts):
+            buffer += piece
+            if len(buffer) < self.window_size:
+                continue
+
+            chunks = self.splitter.split_text(buffer)
+            yield from chunks[:-1]
+            buffer = chunks[-1] if chunks else ""
+
+        if buffer:
+            yield from self.splitter.split_text(buffer)
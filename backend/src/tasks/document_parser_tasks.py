@@ -1,36 +1,70 @@
 import os
-import magic
 import asyncio
+import inspect
+import itertools
+from pathlib import Path
 from abc import ABC, abstractmethod
-from typing import Dict, List, Type, Union
+from typing import Dict, Iterable, Iterator, List, Optional, Type, Union
+from celery import chord
 from src.celery import celery
 from datetime import datetime
-from llama_index.core.text_splitter import SentenceSplitter
 from llama_index.core.schema import Document
+import redis
 import logging
 import src.document_parser.readers as readers
-from src.document_parser.embedding import get_embedding
+from src.document_parser.embedding import aget_embeddings
+from src.document_parser.splitter import SlidingWindowSplitter
+from src.document_parser.parse_cache import ParseCache
 from src.database.manager import DatabaseManager
 from src.database.models import DocumentStatus
-from src.dependencies import get_database_manager
+from src.tasks.worker_resources import worker_resources
+from src.tasks.progress import ProgressReporter, RangeProgressReporter
 from src.constants import GlobalConfig
+from src.utils.misc import batched, hash_text, with_file_name
 
 class FileProcessor(ABC):
+    # Whether iter_chunks yields chunks before the whole file has been parsed
+    streaming = False
+
     @abstractmethod
     def process(self, file_path: str) -> Dict:
         pass
 
+    def iter_chunks(self, file_path: str) -> Iterator[Document]:
+        yield from self.process(file_path)["documents"]
+
 class TextFileProcessor(FileProcessor):
+    streaming = True
+
     def __init__(self, reader_class):
         self.reader_class = reader_class
 
-    def process(self, file_path: str) -> Dict:
-        reader = self.reader_class(return_full_document=True)
-        docs: List[Document] = reader.load_data(file_path)
+    def iter_documents(self, file_path: str) -> Iterator[Document]:
+        # Only some readers can return a file as a single document, the others take no such option
+        if "return_full_document" in inspect.signature(self.reader_class.__init__).parameters:
+            reader = self.reader_class(return_full_document=True)
+        else:
+            reader = self.reader_class()
+        # llama-index file readers expect a Path. Readers that don't implement lazy loading
+        # still load the whole file at once
+        try:
+            yield from reader.lazy_load_data(Path(file_path))
+        except NotImplementedError:
+            yield from reader.load_data(Path(file_path))
+
+    def iter_chunks(self, file_path: str) -> Iterator[Document]:
+        docs = self.iter_documents(file_path)
+        first_doc = next(docs, None)
+        if first_doc is None:
+            return
         
-        splitter = SentenceSplitter()
-        chunks = splitter.split_text("\n".join([doc.text for doc in docs]))
-        chunks = [Document(text=chunk, metadata=docs[0].metadata) for chunk in chunks]
+        texts = itertools.chain([first_doc.text], (doc.text for doc in docs))
+        splitter = SlidingWindowSplitter(worker_resources.get("splitter"))
+        for chunk in splitter.split(texts):
+            yield Document(text=chunk, metadata=first_doc.metadata)
+
+    def process(self, file_path: str) -> Dict:
+        chunks = list(self.iter_chunks(file_path))
         
         return {
             "file_type": self.reader_class.__name__.replace('Reader', ''),
@@ -120,8 +154,7 @@ class FileProcessorFactory:
 
     @staticmethod
     def detect_mime_type(file_path: str) -> str:
-        mime = magic.Magic(mime=True)
-        return mime.from_file(file_path)
+        return worker_resources.get("mime_detector").from_file(file_path)
 
     @staticmethod
     def mime_to_file_type(mime_type: str) -> str:
@@ -147,33 +180,276 @@ class FileProcessorFactory:
         }
         return mime_to_type.get(mime_type, '.txt')  # Default to .txt for unstructured
 
-@celery.task(bind=True)
-def process_document(self, file_path: str, document_id: int, db_manager: DatabaseManager = get_database_manager()):
+def ingest_chunks(progress: ProgressReporter, db_manager: DatabaseManager, document_id: int, chunks: Iterable[Document],
+                  existing_chunks: Optional[Dict[str, List[int]]] = None, start_index: int = 0,
+                  total_chunks: Optional[int] = None, checkpoint: bool = True) -> Dict:
+    """
+    Embed and store chunks in bounded batches, so memory does not grow with the size of the file.
+
+    Args:
+        progress (ProgressReporter): Reports the progress of the document.
+        existing_chunks (Dict[str, List[int]], optional): Content hash -> ids of chunks already
+            stored for the document. Chunks whose content is found there are kept (only their
+            index is updated) and removed from the mapping, so what remains afterwards are the
+            chunks that vanished from the new version.
+        start_index (int): The chunk_index of the first chunk in `chunks`.
+        total_chunks (int, optional): Total number of chunks of the document, if known, for progress.
+        checkpoint (bool): Move the document checkpoint to the last stored chunk after every batch.
+            Only valid when chunks are stored in order by a single task.
+
+    Returns:
+        Dict: `total`, `embedded` and `reused` chunk counts.
+    """
+    existing_chunks = existing_chunks if existing_chunks is not None else {}
+    stats = {"total": start_index, "embedded": 0, "reused": 0}
+    knowledge_base = db_manager.get_document_knowledge_base(document_id)
+    embed_model = worker_resources.embedding_model(knowledge_base.embedding_dimensions if knowledge_base else None)
+    document = db_manager.get_document(document_id)
+    file_name = document.file_name if document else None
+    
+    def report_batch(batch_index: int, num_batches: int, batch_length: int, elapsed: float):
+        logging.info(f"Embedded batch {batch_index+1} of {num_batches} ({batch_length} chunks) in {elapsed:.2f}s")
+        progress.update(stats["total"], total_chunks, 'embedding',
+                        batch=batch_index + 1, num_batches=num_batches,
+                        batch_size=batch_length, batch_time=round(elapsed, 3))
+    
+    for batch in batched(chunks, GlobalConfig.INGESTION_BATCH_SIZE):
+        new_chunks = []
+        kept_indexes = {}
+        kept_metadata = {}
+        for i, chunk in enumerate(batch, start=stats["total"]):
+            matches = existing_chunks.get(hash_text(chunk.text))
+            if matches:
+                chunk_id = matches.pop(0)
+                kept_indexes[chunk_id] = i
+                # The file may have been renamed, or the reader may place the text elsewhere
+                kept_metadata[chunk_id] = with_file_name(chunk.metadata, file_name)
+            else:
+                new_chunks.append((i, chunk))
+        
+        db_manager.update_chunk_indexes(kept_indexes)
+        db_manager.update_chunk_metadata(document_id, kept_metadata, batch_size=GlobalConfig.VECTOR_UPSERT_BATCH_SIZE)
+        
+        vectors = worker_resources.run(aget_embeddings(
+            [chunk.text for _, chunk in new_chunks],
+            embed_model=embed_model,
+            on_batch_complete=report_batch
+        )) if new_chunks else []
+        
+        db_manager.add_document_chunks(
+            document_id=document_id,
+            chunks=[
+                {
+                    "chunk_index": i,
+                    "content": chunk.text,
+                    "vector": vector,
+                    "metadata": with_file_name(chunk.metadata, file_name)
+                }
+                for (i, chunk), vector in zip(new_chunks, vectors)
+            ],
+            batch_size=GlobalConfig.VECTOR_UPSERT_BATCH_SIZE,
+            parallel=GlobalConfig.VECTOR_UPSERT_PARALLEL,
+            # Accepted writes are already durable in the vector store's write-ahead log, so the
+            # checkpoint stays valid; the flush below makes them searchable before we report done
+            wait=False
+        )
+        stats["total"] += len(batch)
+        stats["embedded"] += len(new_chunks)
+        stats["reused"] += len(kept_indexes)
+        if checkpoint:
+            db_manager.set_document_checkpoint(document_id, stats["total"] - 1)
+        logging.info(f"Stored {stats['total']} chunks ({stats['embedded']} embedded, {stats['reused']} unchanged)")
+        
+        progress.update(stats["total"], total_chunks, 'storing')
+    
+    db_manager.flush_vectors(document_id)
+    return stats
+
+def get_progress_reporter(task, db_manager: DatabaseManager, document_id: int) -> ProgressReporter:
+    document = db_manager.get_document(document_id)
+    return ProgressReporter(task, document_id, document.knowledge_base_id if document else None)
+
+def fanout_key(cache_key: str, kind: str) -> str:
+    # Per parse cache entry, so ranges of a replaced file are never mistaken for the new one's
+    return f"fanout:{cache_key}:{kind}"
+
+def is_range_completed(cache_key: str, start: int, end: int) -> bool:
+    try:
+        return bool(worker_resources.get("redis").sismember(fanout_key(cache_key, "completed"), f"{start}-{end}"))
+    except redis.RedisError as e:
+        logging.warning(f"Could not read the completed ranges of {cache_key}: {e}")
+        return False
+
+def mark_range_completed(cache_key: str, start: int, end: int):
+    key = fanout_key(cache_key, "completed")
+    try:
+        client = worker_resources.get("redis")
+        client.sadd(key, f"{start}-{end}")
+        client.expire(key, GlobalConfig.FANOUT_STATE_TTL)
+    except redis.RedisError as e:
+        # Only costs embedding the range again if the document is processed again
+        logging.warning(f"Could not record the completed range [{start}, {end}) of {cache_key}: {e}")
+
+def fan_out_document(db_manager: DatabaseManager, document_id: int, cache_key: str, start_index: int, total_chunks: int) -> Dict:
+    """
+    Split the parsed chunks [start_index, total_chunks) into ranges embedded and stored by a
+    Celery chord; `finalize_document` marks the document processed once every range is done.
+    Ranges completed by an earlier chord over the same parse are skipped, so processing the
+    document again after a failed chord only redoes the missing ranges.
+    The parse cache directory must be shared by the workers.
+    """
+    db_manager.set_document_total_chunks(document_id, total_chunks)
+    
+    chunks_per_task = GlobalConfig.FANOUT_CHUNKS_PER_TASK
+    header = [
+        ingest_chunk_range.s(document_id, cache_key, start, min(start + chunks_per_task, total_chunks))
+        for start in range(start_index, total_chunks, chunks_per_task)
+    ]
+    body = finalize_document.s(document_id, cache_key, total_chunks).on_error(mark_document_failed.si(document_id))
+    result = chord(header)(body)
+    logging.info(f"Fanned out document {document_id} into {len(header)} sub-tasks")
+    
+    return {"status": "fanned_out", "message": "Document processing split across workers",
+            "total_chunks": total_chunks, "sub_tasks": len(header), "fanout_task_id": result.id}
+
+@celery.task(bind=True, autoretry_for=(Exception,), max_retries=GlobalConfig.INGESTION_MAX_RETRIES, retry_backoff=True)
+def ingest_chunk_range(self, document_id: int, cache_key: str, start: int, end: int):
+    db_manager = worker_resources.get("db_manager")
+    document = db_manager.get_document(document_id)
+    progress = RangeProgressReporter(self, document_id, document.knowledge_base_id if document else None,
+                                     fanout_key(cache_key, "progress"), start, document.total_chunks if document else None)
+    if is_range_completed(cache_key, start, end):
+        logging.info(f"Chunks [{start}, {end}) of document {document_id} were stored by an earlier attempt")
+        progress.update(end, stage='storing')
+        return end - start
+    
+    # A retried range starts over, so it never duplicates its own chunks
+    db_manager.delete_document_chunks_from(document_id, start, end)
+    chunks = ParseCache().load(cache_key, start, end)
+    stats = ingest_chunks(progress, db_manager, document_id, chunks, start_index=start, checkpoint=False)
+    mark_range_completed(cache_key, start, end)
+    return stats["total"] - start
+
+@celery.task
+def finalize_document(stored_counts: List[int], document_id: int, cache_key: str, total_chunks: int):
+    db_manager = worker_resources.get("db_manager")
+    db_manager.set_document_checkpoint(document_id, total_chunks - 1)
+    db_manager.update_document_status(document_id, DocumentStatus.PROCESSED)
+    ParseCache().remove(cache_key)
+    try:
+        worker_resources.get("redis").delete(fanout_key(cache_key, "progress"), fanout_key(cache_key, "completed"))
+    except redis.RedisError as e:
+        logging.warning(f"Could not remove the fan-out state of document {document_id}, it expires on its own: {e}")
+    get_progress_reporter(None, db_manager, document_id).finish(DocumentStatus.PROCESSED, total=total_chunks)
+    
+    return {"status": "success", "message": "Document processed successfully", "total_chunks": total_chunks,
+            "sub_tasks": len(stored_counts)}
+
+@celery.task
+def mark_document_failed(document_id: int):
+    db_manager = worker_resources.get("db_manager")
+    db_manager.update_document_status(document_id, DocumentStatus.FAILED)
+    get_progress_reporter(None, db_manager, document_id).finish(DocumentStatus.FAILED, error="A sub-task failed")
+
+@celery.task(bind=True, autoretry_for=(Exception,), max_retries=GlobalConfig.INGESTION_MAX_RETRIES, retry_backoff=True)
+def process_document(self, file_path: str, document_id: int):
+    db_manager = worker_resources.get("db_manager")
+    document = db_manager.get_document(document_id)
+    progress = ProgressReporter(self, document_id, document.knowledge_base_id if document else None)
     try:
         db_manager.update_document_status(document_id, DocumentStatus.PROCESSING)
         logging.info(f"Processing document {document_id} at {file_path}")
-        processor = FileProcessorFactory.get_processor(file_path)
-        result = processor.process(file_path)
-        
-        chunks : List[Document] = result.get('documents', [])
-        total_chunks = len(chunks)
-        
-        for i, chunk in enumerate(chunks):
-            logging.info(f"Processing chunk {i+1} of {total_chunks}")
-            db_manager.add_document_chunk(
-                document_id=document_id,
-                chunk_index=i,
-                content=chunk.text,
-                vector=get_embedding(chunk.text),
-                metadata=chunk.metadata
+        progress.update(0, stage='started')
+        
+        # Identical bytes already processed elsewhere: reuse their chunks and vectors
+        if document and document.content_hash:
+            knowledge_base = db_manager.get_document_knowledge_base(document_id)
+            source = db_manager.find_processed_document_by_hash(
+                document.content_hash, exclude_document_id=document_id,
+                embedding_dimensions=knowledge_base.embedding_dimensions if knowledge_base else None
             )
-            
-            self.update_state(state='PROGRESS',
-                              meta={'current': i + 1, 'total': total_chunks})
+            if source:
+                logging.info(f"Reusing chunks of document {source.id} for document {document_id}")
+                db_manager.delete_document_chunks_from(document_id, 0)
+                total_chunks = db_manager.copy_document_chunks(source.id, document_id)
+                db_manager.update_document_status(document_id, DocumentStatus.PROCESSED)
+                progress.finish(DocumentStatus.PROCESSED, total=total_chunks)
+                return {"status": "success", "message": "Document reused from an identical upload", "total_chunks": total_chunks}
+        
+        # Resume after the last chunk an earlier attempt stored durably
+        checkpoint = document.checkpoint_chunk_index if document else None
+        start_index = checkpoint + 1 if checkpoint is not None else 0
+        
+        parse_cache = ParseCache()
+        # Per document: identical files in other knowledge bases are parsed and removed independently
+        cache_key = f"{document.content_hash}_{document_id}" if document and document.content_hash else f"document_{document_id}"
+        processor = FileProcessorFactory.get_processor(file_path)
+        
+        # Large files are parsed once up front, then embedded and stored by sub-tasks across workers
+        total_chunks = None
+        if os.path.getsize(file_path) >= GlobalConfig.FANOUT_MIN_FILE_SIZE:
+            progress.update(start_index, stage='parsing')
+            total_chunks = parse_cache.ensure(cache_key, processor, file_path)
+            if total_chunks - start_index > GlobalConfig.FANOUT_CHUNKS_PER_TASK:
+                # Each range clears what an earlier attempt left in it, except completed ranges
+                return fan_out_document(db_manager, document_id, cache_key, start_index, total_chunks)
+        
+        # Drop whatever an earlier attempt left behind from an unfinished batch
+        removed = db_manager.delete_document_chunks_from(document_id, start_index)
+        if start_index or removed:
+            logging.info(f"Resuming document {document_id} at chunk {start_index} (removed {removed} partial chunks)")
+        
+        chunks = itertools.islice(parse_cache.iter_chunks(cache_key, processor, file_path), start_index, None)
+        stats = ingest_chunks(progress, db_manager, document_id, chunks, start_index=start_index, total_chunks=total_chunks)
+        
+        db_manager.update_document_status(document_id, DocumentStatus.PROCESSED)
+        parse_cache.remove(cache_key)
+        progress.finish(DocumentStatus.PROCESSED, total=stats["total"])
+        
+        return {"status": "success", "message": "Document processed successfully", "total_chunks": stats["total"]}
+    except Exception as e:
+        # While Celery still retries, the document stays in PROCESSING and the retry resumes from the checkpoint
+        if self.request.retries >= self.max_retries:
+            db_manager.update_document_status(document_id, DocumentStatus.FAILED)
+            progress.finish(DocumentStatus.FAILED, error=str(e))
+        else:
+            progress.publish(DocumentStatus.PROCESSING, stage='retrying', error=str(e), retry=self.request.retries + 1)
+        raise e
+
+@celery.task(bind=True, autoretry_for=(Exception,), max_retries=GlobalConfig.INGESTION_MAX_RETRIES, retry_backoff=True)
+def reingest_document(self, file_path: str, document_id: int):
+    """
+    Re-parse a replaced document, embedding only chunks whose content changed and deleting vanished ones.
+    A retry matches the chunks an earlier attempt stored by their content like any other, so it only
+    embeds what that attempt did not get to.
+    """
+    db_manager = worker_resources.get("db_manager")
+    progress = get_progress_reporter(self, db_manager, document_id)
+    try:
+        db_manager.update_document_status(document_id, DocumentStatus.PROCESSING)
+        logging.info(f"Re-ingesting document {document_id} at {file_path}")
+        
+        existing_chunks = db_manager.get_document_chunk_hashes(document_id)
+        processor = FileProcessorFactory.get_processor(file_path)
+        # No index checkpoint: chunks of the old version not yet matched keep their old indexes,
+        # so a retry walks the file again, matching stored chunks by content instead
+        stats = ingest_chunks(progress, db_manager, document_id, processor.iter_chunks(file_path), existing_chunks,
+                              checkpoint=False)
+        
+        vanished_chunk_ids = [chunk_id for chunk_ids in existing_chunks.values() for chunk_id in chunk_ids]
+        db_manager.delete_document_chunks(document_id, vanished_chunk_ids)
         
         db_manager.update_document_status(document_id, DocumentStatus.PROCESSED)
+        progress.finish(DocumentStatus.PROCESSED, total=stats["total"])
         
-        return {"status": "success", "message": "Document processed successfully", "total_chunks": total_chunks}
+        return {"status": "success", "message": "Document re-ingested successfully", "total_chunks": stats["total"],
+                "embedded_chunks": stats["embedded"], "unchanged_chunks": stats["reused"],
+                "deleted_chunks": len(vanished_chunk_ids)}
     except Exception as e:
-        db_manager.update_document_status(document_id, DocumentStatus.FAILED)
-        raise e
\ No newline at end of file
+        # While Celery still retries, the document stays in PROCESSING
+        if self.request.retries >= self.max_retries:
+            db_manager.update_document_status(document_id, DocumentStatus.FAILED)
+            progress.finish(DocumentStatus.FAILED, error=str(e))
+        else:
+            progress.publish(DocumentStatus.PROCESSING, stage='retrying', error=str(e), retry=self.request.retries + 1)
+        raise e
@@ -0,0 +1,90 @@
+import json
+import time
+import redis
+import logging
+from typing import Optional
+from src.constants import GlobalConfig
+from src.database.models import DocumentStatus
+from src.tasks.worker_resources import worker_resources
+
+
+def progress_channel(knowledge_base_id: int) -> str:
+    return f"kb_progress:{knowledge_base_id}"
+
+
+class ProgressReporter:
+    """
+    Reports the ingestion progress of a document in two ways:
+
+    - an event published on the Redis channel of its knowledge base at every step,
+      streamed to clients by the `/{knowledge_base_id}/progress` endpoints;
+    - the Celery task state read by `/document_status`, updated at most once per
+      `interval` seconds.
+
+    Publishing is best effort: a Redis hiccup never fails the ingestion itself.
+    """
+
+    def __init__(self, task, document_id: int, knowledge_base_id: int, interval: float = GlobalConfig.PROGRESS_UPDATE_INTERVAL):
+        self.task = task
+        # Captured here since steps may be reported from threads without the task context
+        self.task_id = task.request.id if task is not None else None
+        self.document_id = document_id
+        self.knowledge_base_id = knowledge_base_id
+        self.interval = interval
+        self._last_state_update = 0.0
+
+    def update(self, current: int, total: Optional[int] = None, stage: str = "processing", **extra):
+        meta = {"current": current, "total": total, "stage": stage, **extra}
+        self.publish(DocumentStatus.PROCESSING, **meta)
+
+        now = time.monotonic()
+        if self.task_id and now - self._last_state_update >= self.interval:
+            self.task.update_state(task_id=self.task_id, state="PROGRESS", meta=meta)
+            self._last_state_update = now
+
+    def finish(self, status: DocumentStatus, error: Optional[str] = None, **extra):
+        if error is not None:
+            extra["error"] = error
+        self.publish(status, **extra)
+
+    def publish(self, status: DocumentStatus, **fields):
+        if self.knowledge_base_id is None:
+            return
+        event = {
+            "document_id": self.document_id,
+            "knowledge_base_id": self.knowledge_base_id,
+            "status": status.value,
+            "timestamp": time.time(),
+            **fields
+        }
+        try:
+            worker_resources.get("redis").publish(progress_channel(self.knowledge_base_id), json.dumps(event))
+        except redis.RedisError as e:
+            logging.warning(f"Could not publish progress of document {self.document_id}: {e}")
+
+
+class RangeProgressReporter(ProgressReporter):
+    """
+    Reports the progress of one chunk range of a fanned-out document as progress of the
+    whole document. Each range records how many of its chunks it stored in a Redis hash
+    shared by the ranges, and every update carries the sum over all of them, so progress
+    only moves forward while ranges run in any order. A retried range overwrites its count.
+    """
+
+    def __init__(self, task, document_id: int, knowledge_base_id: int, counts_key: str, start: int, total: int,
+                 interval: float = GlobalConfig.PROGRESS_UPDATE_INTERVAL):
+        super().__init__(task, document_id, knowledge_base_id, interval)
+        self.counts_key = counts_key
+        self.start = start
+        self.total = total
+
+    def update(self, current: int, total: Optional[int] = None, stage: str = "processing", **extra):
+        try:
+            client = worker_resources.get("redis")
+            client.hset(self.counts_key, self.start, current - self.start)
+            client.expire(self.counts_key, GlobalConfig.FANOUT_STATE_TTL)
+            current = sum(int(count) for count in client.hvals(self.counts_key))
+        except redis.RedisError as e:
+            logging.warning(f"Could not count the progress of document {self.document_id}: {e}")
+            return
+        super().update(current, self.total, stage, **extra)
@@ -0,0 +1,36 @@
+import logging
+from typing import List, Optional
+from src.celery import celery
+from src.tasks.worker_resources import worker_resources
+from src.constants import GlobalConfig
+
+
+@celery.task(autoretry_for=(Exception,), max_retries=GlobalConfig.INGESTION_MAX_RETRIES, retry_backoff=True)
+def delete_document_vectors(knowledge_base_id: int, document_id: int, vector_ids: List[str]):
+    """Remove the vectors of a document whose rows were already deleted by the API."""
+    db_manager = worker_resources.get("db_manager")
+    db_manager.delete_vectors(knowledge_base_id, vector_ids, document_id)
+    logging.info(f"Deleted {len(vector_ids)} vectors of document {document_id} from knowledge base {knowledge_base_id}")
+    return {"deleted_vectors": len(vector_ids)}
+
+@celery.task(autoretry_for=(Exception,), max_retries=GlobalConfig.INGESTION_MAX_RETRIES, retry_backoff=True)
+def drop_knowledge_base_vectors(knowledge_base_id: int):
+    """Drop the vector collection of a deleted knowledge base."""
+    db_manager = worker_resources.get("db_manager")
+    db_manager.drop_knowledge_base_vectors(knowledge_base_id)
+    logging.info(f"Dropped the vector collection of knowledge base {knowledge_base_id}")
+
+@celery.task(autoretry_for=(Exception,), max_retries=GlobalConfig.INGESTION_MAX_RETRIES, retry_backoff=True)
+def upgrade_vector_payloads(knowledge_base_id: Optional[int] = None):
+    """
+    Rewrite the vector payloads of chunks ingested before payloads carried their document
+    fields, so that filtered searches find them, for one knowledge base or all of them.
+    Already upgraded points are skipped, so a retry only redoes the rest.
+    """
+    db_manager = worker_resources.get("db_manager")
+    knowledge_base_ids = [knowledge_base_id] if knowledge_base_id is not None else db_manager.get_knowledge_base_ids()
+    upgraded = {}
+    for kb_id in knowledge_base_ids:
+        upgraded[kb_id] = db_manager.upgrade_vector_payloads(kb_id)
+        logging.info(f"Upgraded {upgraded[kb_id]} vector payloads of knowledge base {kb_id}")
+    return {"upgraded_vectors": upgraded}
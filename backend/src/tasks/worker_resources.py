@@ -0,0 +1,134 @@
+import time
+import redis
+import magic
+import asyncio
+import logging
+import threading
+from functools import partial
+from typing import Any, Callable, Coroutine, Dict, Optional
+from celery.signals import worker_init, worker_process_init, task_prerun, task_postrun
+from celery.worker.control import inspect_command
+from llama_index.core.text_splitter import SentenceSplitter
+from src.document_parser.embedding import get_embedding_model
+from src.dependencies import get_database_manager
+from src.constants import GlobalConfig
+
+
+def start_event_loop() -> asyncio.AbstractEventLoop:
+    # A single long-lived loop lets async clients keep their connection pools across tasks,
+    # which a fresh asyncio.run() per call cannot do
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="worker-event-loop", daemon=True).start()
+    return loop
+
+
+class WorkerResources:
+    """
+    Registry of expensive objects (database manager, embedding model, Redis client, ...)
+    that are built once per worker process and shared by every task it runs.
+
+    Resources are built on `warm_up`, which runs when the worker process starts, or
+    lazily on first use otherwise. Tasks that had to build a resource themselves are
+    counted as cold, the others as warm, so the cost of a cold start stays visible.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._resources: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        # Bumped whenever a resource is built, to tell which tasks paid for it
+        self._generation = 0
+        self._running_tasks: Dict[str, tuple] = {}
+        self.init_timings: Dict[str, float] = {}
+        self.task_timings = {"cold": {"count": 0, "total_seconds": 0.0}, "warm": {"count": 0, "total_seconds": 0.0}}
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        if name in self._resources:
+            return self._resources[name]
+
+        with self._lock:
+            if name not in self._resources:
+                start = time.perf_counter()
+                self._resources[name] = self._factories[name]()
+                self.init_timings[name] = time.perf_counter() - start
+                self._generation += 1
+                logging.info(f"Initialized worker resource '{name}' in {self.init_timings[name]:.3f}s")
+            return self._resources[name]
+
+    def embedding_model(self, dimensions: Optional[int] = None):
+        """The default embedding model, or its variant producing `dimensions`-long vectors."""
+        if not dimensions:
+            return self.get("embedding_model")
+        name = f"embedding_model@{dimensions}"
+        if name not in self._factories:
+            self.register(name, partial(get_embedding_model, dimensions=dimensions))
+        return self.get(name)
+
+    def warm_up(self):
+        start = time.perf_counter()
+        for name in self._factories:
+            self.get(name)
+        logging.info(f"Worker resources ready in {time.perf_counter() - start:.3f}s")
+
+    def run(self, coroutine: Coroutine) -> Any:
+        """Run a coroutine on the process-wide event loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.get("event_loop")).result()
+
+    def task_started(self, task_id: str):
+        self._running_tasks[task_id] = (time.perf_counter(), self._generation)
+
+    def task_finished(self, task_id: str, task_name: str):
+        if task_id not in self._running_tasks:
+            return
+        start, generation = self._running_tasks.pop(task_id)
+        elapsed = time.perf_counter() - start
+        kind = "cold" if generation != self._generation else "warm"
+        self.task_timings[kind]["count"] += 1
+        self.task_timings[kind]["total_seconds"] += elapsed
+        logging.info(f"Task {task_name}[{task_id}] took {elapsed:.3f}s ({kind})")
+
+    def stats(self) -> Dict:
+        tasks = {
+            kind: {**timings, "average_seconds": timings["total_seconds"] / timings["count"] if timings["count"] else 0.0}
+            for kind, timings in self.task_timings.items()
+        }
+        return {"init_timings": dict(self.init_timings), "tasks": tasks}
+
+
+worker_resources = WorkerResources()
+worker_resources.register("db_manager", get_database_manager)
+worker_resources.register("embedding_model", get_embedding_model)
+worker_resources.register("splitter", SentenceSplitter)
+worker_resources.register("mime_detector", lambda: magic.Magic(mime=True))
+worker_resources.register("event_loop", start_event_loop)
+worker_resources.register("redis", lambda: redis.Redis.from_url(GlobalConfig.REDIS_URL))
+
+
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    # Child processes of the prefork pool
+    worker_resources.warm_up()
+
+@worker_init.connect
+def warm_up_worker(sender=None, **kwargs):
+    # Pools that run tasks in the main worker process (gevent, eventlet, threads, solo).
+    # The prefork parent must stay empty, its children would inherit open connections
+    pool = sender.pool_cls if isinstance(sender.pool_cls, str) else sender.pool_cls.__module__
+    if "prefork" not in pool:
+        worker_resources.warm_up()
+
+@task_prerun.connect
+def record_task_start(task_id=None, **kwargs):
+    worker_resources.task_started(task_id)
+
+@task_postrun.connect
+def record_task_end(task_id=None, task=None, **kwargs):
+    worker_resources.task_finished(task_id, task.name)
+
+@inspect_command()
+def resource_stats(state, **kwargs):
+    """Cold start and warm timings of the worker: `celery -A src inspect resource_stats`."""
+    return worker_resources.stats()
@@ -1,54 +1,232 @@
-import qdrant_client
-from llama_index.core import VectorStoreIndex
-from llama_index.vector_stores.qdrant import QdrantVectorStore
-from llama_index.core import StorageContext
-from llama_index.core.schema import MetadataMode
-from llama_index.embeddings.openai import OpenAIEmbedding
+import re
+from llama_index.core.schema import MetadataMode, NodeWithScore, TextNode
+from src.document_parser.embedding import get_embedding_model
 from llama_index.core.tools import FunctionTool
 from src.constants import GlobalConfig 
+from src.dependencies import get_cache_db_manager
+from src.database.vector_store import SearchFilter
+from src.tools.retrieval_cache import RetrievalCache, get_retrieval_cache
+from src.utils.misc import reciprocal_rank_fusion, time_to_seconds
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 import logging
 
+# Leaf work of a search (query embeddings, lexical queries), which never waits on other jobs
+retrieval_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+# One job per knowledge base of a federated search; these wait on leaf jobs, hence the separate pool
+knowledge_base_search_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="kb-search")
+
+def chunk_nodes(hits, lower_is_better: bool = False):
+    return [
+        NodeWithScore(node=TextNode(text=hit["content"], metadata={"document_chunk_id": hit["id"], "metadata": hit["metadata"]},
+                                    excluded_llm_metadata_keys=["document_chunk_id"]),
+                      score=-hit["score"] if lower_is_better else hit["score"])
+        for hit in hits
+    ]
+
+def lexical_nodes(knowledge_base_id: int, query_str: str, limit: int, search_filter: Optional[SearchFilter] = None):
+    hits = get_cache_db_manager().search_chunks_lexical(query_str, knowledge_base_id, limit=limit, search_filter=search_filter)
+    return chunk_nodes(hits, lower_is_better=True)  # bm25() is lower for better matches
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """Unix timestamp of an ISO date or datetime, read as UTC when it has no offset."""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+def build_search_filter(document_id: Optional[int] = None, file_type: Optional[str] = None,
+                        start_time: Optional[str] = None, end_time: Optional[str] = None,
+                        created_after: Optional[str] = None, created_before: Optional[str] = None) -> Optional[SearchFilter]:
+    """SearchFilter from the optional arguments of the search tool, None when none is set."""
+    if file_type:
+        # Documents store the lowercase file extension, e.g. ".pdf"
+        file_type = file_type.lower() if file_type.startswith(".") else f".{file_type.lower()}"
+    search_filter = SearchFilter(
+        document_ids=[int(document_id)] if document_id is not None else None,
+        file_types=[file_type] if file_type else None,
+        start_time=time_to_seconds(start_time),
+        end_time=time_to_seconds(end_time),
+        created_after=parse_timestamp(created_after),
+        created_before=parse_timestamp(created_before)
+    )
+    return search_filter if search_filter != SearchFilter() else None
+
+def fuse_nodes(rankings, top_k: int):
+    """Reciprocal rank fusion of node lists, keyed by chunk so a hit found by both retrievers counts once."""
+    nodes = {}
+    keys = []
+    for ranking in rankings:
+        ranking_keys = []
+        for n in ranking:
+            key = n.node.metadata.get("document_chunk_id", n.node.node_id)
+            nodes.setdefault(key, n)
+            ranking_keys.append(key)
+        keys.append(ranking_keys)
+    fused = reciprocal_rank_fusion(keys, k=GlobalConfig.RRF_K)[:top_k]
+    return [NodeWithScore(node=nodes[key].node, score=score) for key, score in fused]
+
+def merge_knowledge_base_results(results: List[List[NodeWithScore]], top_k: int, retrieval_mode: str) -> List[NodeWithScore]:
+    """
+    Merge the hits of several knowledge bases into one top-k, so that a knowledge base without a
+    good match does not push its best weak hit to the top. Dense hits are cosine similarities to
+    the same query embedding and compare as they are. Hybrid hits already carry the reciprocal
+    rank fusion of their knowledge base's rankings; chunks are distinct across knowledge bases,
+    so sorting them is the fusion over the rankings of all knowledge bases. BM25 scores depend
+    on the statistics of each knowledge base, so lexical hits are fused by rank.
+    """
+    if retrieval_mode == "lexical":
+        return fuse_nodes(results, top_k)
+    merged = [n for nodes in results for n in nodes]
+    return sorted(merged, key=lambda n: n.score or 0.0, reverse=True)[:top_k]
+
+class KnowledgeBaseRetriever:
+    """Searches one knowledge base in the retrieval mode of the assistant."""
+    
+    def __init__(self, knowledge_base: dict, retrieval_mode: str):
+        self.knowledge_base_id = knowledge_base.get("id")
+        self.embedding_dimensions = knowledge_base.get("embedding_dimensions")
+        self.retrieval_mode = retrieval_mode
+        if self.knowledge_base_id is None:
+            # Collections are named after their knowledge base
+            match = re.fullmatch(r"kb_(\d+)", knowledge_base.get("collection_name") or "")
+            if not match:
+                raise ValueError("A knowledge base id or kb_<id> collection name is required")
+            self.knowledge_base_id = int(match.group(1))
+    
+    @property
+    def needs_embedding(self) -> bool:
+        return self.retrieval_mode != "lexical"
+    
+    def dense_nodes(self, query_str: str, query_embedding: List[float], limit: int, search_filter: Optional[SearchFilter] = None):
+        # Searched through the database manager's vector store, which applies the filter during the
+        # search and reads texts from SQLite, so slim payloads without text work as well
+        return chunk_nodes(get_cache_db_manager().search_similar_chunks(
+            query_embedding, self.knowledge_base_id, limit=limit, search_filter=search_filter
+        ))
+    
+    def retrieve(self, query_str: str, query_embedding: Optional[Future], top_k: int,
+                 search_filter: Optional[SearchFilter] = None) -> List[NodeWithScore]:
+        if self.retrieval_mode == "lexical":
+            return lexical_nodes(self.knowledge_base_id, query_str, top_k, search_filter)
+        if self.retrieval_mode == "hybrid":
+            # Both retrievers run concurrently, so the latency is that of the slower one
+            candidates = top_k * GlobalConfig.HYBRID_CANDIDATE_FACTOR
+            lexical = retrieval_executor.submit(lexical_nodes, self.knowledge_base_id, query_str, candidates, search_filter)
+            dense = self.dense_nodes(query_str, query_embedding.result(), candidates, search_filter)
+            return fuse_nodes([dense, lexical.result()], top_k)
+        return self.dense_nodes(query_str, query_embedding.result(), top_k, search_filter)
+
 def load_knowledge_base_search_tool(config: dict):
-    embedding_service = config.get("embedding_service", "openai")
+    retrieval_mode = config.get("retrieval_mode") or GlobalConfig.RETRIEVAL_MODE
+    if retrieval_mode not in GlobalConfig.RETRIEVAL_MODES:
+        raise ValueError(f"Invalid retrieval mode: {retrieval_mode}")
+    top_k = GlobalConfig.RETRIEVAL_TOP_K
     
-    if embedding_service == "openai":
-        embed_model = OpenAIEmbedding(
-            model=config.get("embedding_model_name", "text-embedding-3-small"), 
-            api_key=GlobalConfig.MODEL.OPENAI_API_KEY
+    # An empty list is an assistant whose knowledge bases were all deleted: searches find nothing
+    knowledge_bases = config.get("knowledge_bases")
+    if knowledge_bases is None:
+        knowledge_bases = [{
+            "id": config.get("knowledge_base_id"),
+            "collection_name": config.get("collection_name", "kb_1"),
+            "embedding_dimensions": config.get("embedding_dimensions")
+        }]
+    # Knowledge bases with the same vector size share the embedding of the query
+    embed_models = {
+        dimensions: get_embedding_model(
+            service=config.get("embedding_service", GlobalConfig.MODEL.EMBEDDING_SERVICE),
+            model_name=config.get("embedding_model_name", GlobalConfig.MODEL.EMBEDDING_MODEL_NAME),
+            dimensions=dimensions
         )
-    else:
-        raise NotImplementedError()   
+        for dimensions in {kb.get("embedding_dimensions") for kb in knowledge_bases}
+    }
+    retrievers = [KnowledgeBaseRetriever(kb, retrieval_mode) for kb in knowledge_bases]
+    cache = get_retrieval_cache()
     
-    if GlobalConfig.MODEL.VECTOR_STORE == "qdrant":
-        client = qdrant_client.QdrantClient(host="localhost", port=6333)
-        vector_store = QdrantVectorStore(client=client, collection_name=config.get("collection_name", "kb_1"))
-    else:
-        raise NotImplementedError()
+    def cache_key(query_str: str, search_filter: Optional[SearchFilter]) -> Optional[str]:
+        if cache is None:
+            return None
+        knowledge_base_ids = [r.knowledge_base_id for r in retrievers]
+        # Read before searching, so results racing with an ingestion are filed under the older version
+        versions = get_cache_db_manager().get_ingestion_versions(knowledge_base_ids)
+        if len(versions) < len(set(knowledge_base_ids)):
+            return None  # A knowledge base was deleted
+        return cache.make_key(
+            knowledge_bases=[[knowledge_base_id, versions[knowledge_base_id]] for knowledge_base_id in knowledge_base_ids],
+            query=RetrievalCache.normalize_query(query_str),
+            top_k=top_k,
+            retrieval_mode=retrieval_mode,
+            embedding=[config.get("embedding_service", GlobalConfig.MODEL.EMBEDDING_SERVICE),
+                       config.get("embedding_model_name", GlobalConfig.MODEL.EMBEDDING_MODEL_NAME)],
+            filter=asdict(search_filter) if search_filter else None
+        )
     
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
-    index = VectorStoreIndex.from_vector_store(vector_store, storage_context=storage_context, embed_model=embed_model)
+    def search(query_str: str, search_filter: Optional[SearchFilter] = None) -> Tuple[List[NodeWithScore], bool]:
+        """The top hits across the knowledge bases, and whether every knowledge base answered."""
+        embeddings = {
+            dimensions: retrieval_executor.submit(embed_model.get_query_embedding, query_str)
+            for dimensions, embed_model in embed_models.items()
+            if any(r.needs_embedding and r.embedding_dimensions == dimensions for r in retrievers)
+        }
+        if len(retrievers) == 1:
+            return retrievers[0].retrieve(query_str, embeddings.get(retrievers[0].embedding_dimensions), top_k, search_filter), True
+        
+        # Fan out to every knowledge base under one deadline, so the latency is that of the
+        # slowest knowledge base (or the deadline) rather than the sum
+        futures = [
+            knowledge_base_search_executor.submit(r.retrieve, query_str, embeddings.get(r.embedding_dimensions), top_k, search_filter)
+            for r in retrievers
+        ]
+        done, _ = wait(futures, timeout=GlobalConfig.FEDERATED_SEARCH_TIMEOUT)
+        results = []
+        for r, future in zip(retrievers, futures):
+            if future not in done:
+                future.cancel()
+                logging.warning(f"Search of knowledge base {r.knowledge_base_id} missed the {GlobalConfig.FEDERATED_SEARCH_TIMEOUT}s deadline")
+            elif future.exception() is not None:
+                logging.warning(f"Search of knowledge base {r.knowledge_base_id} failed: {future.exception()}")
+            else:
+                results.append(future.result())
+        return merge_knowledge_base_results(results, top_k, retrieval_mode), len(results) == len(retrievers)
     
-    def retrieve_knowledge_base(query_str: str):
+    def retrieve_knowledge_base(query_str: str, document_id: Optional[int] = None, file_type: Optional[str] = None,
+                                start_time: Optional[str] = None, end_time: Optional[str] = None,
+                                created_after: Optional[str] = None, created_before: Optional[str] = None):
         
         """
-        Useful for answering questions about papers, research. Add paper year if needed.  
-        Retrieves papers based on the given query string and optional year.
+        Useful for answering questions about the documents of the knowledge base.
+        Retrieves the passages most relevant to the query, optionally restricted with filters.
 
         Args:
-            query_str (str): The query string used to search for papers.
-            start_date (str, optional): The start range of retrieve papers. Defaults to "None".
-            end_date (str, optional): The end range of retrieve papers. Defaults to today.
+            query_str (str): The query string used to search the documents.
+            document_id (int, optional): Only search this document.
+            file_type (str, optional): Only search documents of this file extension, e.g. "pdf" or "mp4".
+            start_time (str, optional): Only search video sections ending after this time, e.g. "01:30".
+            end_time (str, optional): Only search video sections starting before this time, e.g. "05:00".
+            created_after (str, optional): Only search documents uploaded after this ISO date, e.g. "2024-01-31".
+            created_before (str, optional): Only search documents uploaded before this ISO date.
             
         Returns:
-            list: A list of retrieved papers, each containing the paper link and content.
+            list: The retrieved passages with their metadata.
         """
-        retriever = index.as_retriever(
-            similarity_top_k=5,
-        )
-        
+        search_filter = build_search_filter(document_id, file_type, start_time, end_time, created_after, created_before)
+        key = cache_key(query_str, search_filter)
+        results = cache.get(key) if key else None
+        if results is None:
+            retriever_response, complete = search(query_str, search_filter)
+            results = [
+                {"id": n.node.metadata.get("document_chunk_id"), "text": n.node.get_content(metadata_mode=MetadataMode.LLM), "score": n.score}
+                for n in retriever_response
+            ]
+            # Partial results of a search that missed its deadline are not worth keeping
+            if key and complete:
+                cache.put(key, results)
         
-        retriever_response = retriever.retrieve(query_str)
-        logging.info("Retrieval Content: ", [n.node.get_content(metadata_mode=MetadataMode.LLM) for n in retriever_response])
-        return [n.node.get_content(metadata_mode=MetadataMode.LLM) for n in retriever_response]
+        logging.info(f"Retrieval Content: {[result['text'] for result in results]}")
+        return [result["text"] for result in results]
     
-    return FunctionTool.from_defaults(retrieve_knowledge_base)
\ No newline at end of file
+    return FunctionTool.from_defaults(retrieve_knowledge_base)
@@ -0,0 +1,127 @@
+import json
+import time
+import redis
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from src.constants import GlobalConfig
+from src.document_parser.embedding_cache import EmbeddingCache
+
+
+class RetrievalCache:
+    """
+    Cache of search results, keyed by everything that determines them: the collections
+    searched with their ingestion versions, the normalized query, top-k, retrieval mode,
+    embedding model and filters. Ingestion and deletes bump the version of a knowledge base,
+    so results computed before are never looked up again and simply age out.
+
+    Entries live in an in-process LRU bounded by `max_entries`, and also in Redis when a
+    client is given, so a result computed by one API process serves the others. Both tiers
+    expire entries after `ttl` seconds. Redis is best effort: when unreachable, the cache
+    falls back to memory only.
+    """
+
+    def __init__(self, max_entries: int, ttl: int, redis_client: Optional[redis.Redis] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis = redis_client
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return EmbeddingCache.normalize_text(query).casefold()
+
+    @staticmethod
+    def make_key(**parts) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, results = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return results
+                del self._entries[key]
+                self.expirations += 1
+
+        results = self._redis_get(key)
+        with self._lock:
+            if results is None:
+                self.misses += 1
+                return None
+            self.redis_hits += 1
+        # Redis keeps its own expiry, the local copy gets a fresh one
+        self._store(key, results)
+        return results
+
+    def put(self, key: str, results: List[Dict[str, Any]]):
+        self._store(key, results)
+        if self.redis is not None:
+            try:
+                self.redis.set(f"retrieval_cache:{key}", json.dumps(results), ex=self.ttl)
+            except redis.RedisError as e:
+                logging.warning(f"Could not store retrieval results in Redis: {e}")
+
+    def _store(self, key: str, results: List[Dict[str, Any]]):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _redis_get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        if self.redis is None:
+            return None
+        try:
+            value = self.redis.get(f"retrieval_cache:{key}")
+        except redis.RedisError as e:
+            logging.warning(f"Could not read retrieval results from Redis: {e}")
+            return None
+        return json.loads(value) if value is not None else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = len(self._entries)
+        hits = self.memory_hits + self.redis_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "redis": self.redis is not None,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+@lru_cache()
+def get_retrieval_cache() -> Optional[RetrievalCache]:
+    if not GlobalConfig.RETRIEVAL_CACHE_ENABLED:
+        return None
+    redis_client = None
+    if GlobalConfig.RETRIEVAL_CACHE_REDIS:
+        # Short timeouts: a slow Redis must not cost more than the search it saves
+        redis_client = redis.Redis.from_url(GlobalConfig.REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+    return RetrievalCache(GlobalConfig.RETRIEVAL_CACHE_MAX_ENTRIES, GlobalConfig.RETRIEVAL_CACHE_TTL, redis_client)
@@ -0,0 +1,60 @@
+import hashlib
+from itertools import islice
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def batched(iterable: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    """Yield lists of up to `batch_size` items from `iterable` without materializing it."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def with_file_name(metadata: Optional[Dict[str, Any]], file_name: Optional[str]) -> Dict[str, Any]:
+    """
+    Chunk metadata naming the file as it was uploaded: stored files are named by their
+    hash, which readers would otherwise put in the metadata the LLM and citations see.
+    """
+    metadata = dict(metadata or {})
+    if file_name:
+        if "filename" in metadata:
+            metadata["filename"] = file_name
+        metadata["file_name"] = file_name
+    return metadata
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """
+    Merge ranked lists of ids by reciprocal rank fusion: each id scores the sum of
+    1 / (k + rank) over the lists it appears in. Only ranks matter, so lists scored on
+    different scales (BM25, cosine similarity) can be fused without normalization.
+
+    Returns:
+        List[Tuple]: (id, fused score) pairs, best first.
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def time_to_seconds(value: Any) -> Optional[float]:
+    """Seconds from a number or an "SS", "MM:SS" or "HH:MM:SS" string; None if it is neither."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    try:
+        seconds = 0.0
+        for part in value.strip().split(":")[-3:]:
+            seconds = seconds * 60 + float(part)
+        return seconds
+    except ValueError:
+        return None
@@ -0,0 +1,103 @@
+import time
+import redis
+import random
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Iterable, Optional
+from llama_index.core.utils import get_tokenizer
+from src.constants import GlobalConfig
+
+# Refills both buckets of a limiter and takes the requested amounts from them, only if
+# both have enough left. Returns "0" when granted, otherwise the seconds to wait.
+TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local wait = 0
+local levels = {}
+for i = 1, 2 do
+    local capacity = tonumber(ARGV[i])
+    local rate = capacity / 60
+    local amount = math.min(tonumber(ARGV[i + 2]), capacity)
+    local bucket = redis.call('HMGET', KEYS[i], 'level', 'updated')
+    local level = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    level = math.min(capacity, level + math.max(0, now - updated) * rate)
+    levels[i] = level - amount
+    if level < amount then
+        wait = math.max(wait, (amount - level) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i = 1, 2 do
+    redis.call('HSET', KEYS[i], 'level', tostring(levels[i]), 'updated', tostring(now))
+    redis.call('EXPIRE', KEYS[i], 120)
+end
+return '0'
+"""
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter shared by every API and worker process through Redis, with one
+    bucket for requests per minute and one for tokens per minute.
+
+    Callers `acquire` before each provider request and wait until both buckets can cover
+    it, so the cluster as a whole stays under the provider quota instead of running into
+    429s. If Redis is unreachable the limiter lets calls through.
+    """
+
+    def __init__(self, name: str, requests_per_minute: int, tokens_per_minute: int, redis_url: str = GlobalConfig.REDIS_URL):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._keys = [f"rate_limit:{name}:requests", f"rate_limit:{name}:tokens"]
+        self._redis = redis.Redis.from_url(redis_url)
+        self._script = self._redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Take one request and `tokens` tokens if available; returns the seconds to wait otherwise."""
+        try:
+            wait = self._script(keys=self._keys, args=[self.requests_per_minute, self.tokens_per_minute, 1, tokens])
+        except redis.RedisError as e:
+            logging.warning(f"Rate limiter {self.name} unavailable, not limiting: {e}")
+            return 0.0
+        return float(wait)
+
+    def _backoff(self, wait: float) -> float:
+        # Jitter keeps waiting callers from all retrying at the same instant
+        return wait + random.uniform(0, min(1.0, wait * 0.1) + 0.01)
+
+    def acquire(self, tokens: int = 0):
+        while wait := self._try_acquire(tokens):
+            logging.debug(f"Rate limiter {self.name}: waiting {wait:.2f}s for {tokens} tokens")
+            time.sleep(self._backoff(wait))
+
+    async def aacquire(self, tokens: int = 0):
+        while wait := await asyncio.to_thread(self._try_acquire, tokens):
+            logging.debug(f"Rate limiter {self.name}: waiting {wait:.2f}s for {tokens} tokens")
+            await asyncio.sleep(self._backoff(wait))
+
+
+def count_tokens(texts: Iterable[str]) -> int:
+    tokenizer = get_tokenizer()
+    return sum(len(tokenizer(text)) for text in texts)
+
+
+@lru_cache()
+def get_rate_limiter(kind: str, service: str, model_name: str) -> Optional[RateLimiter]:
+    """
+    Limiter for the calls of `kind` ('embedding' or 'llm') to a model, shared with every
+    other process using the same model.
+    """
+    if not GlobalConfig.RATE_LIMIT_ENABLED:
+        return None
+    if kind == "embedding":
+        limits = GlobalConfig.EMBEDDING_REQUESTS_PER_MINUTE, GlobalConfig.EMBEDDING_TOKENS_PER_MINUTE
+    elif kind == "llm":
+        limits = GlobalConfig.LLM_REQUESTS_PER_MINUTE, GlobalConfig.LLM_TOKENS_PER_MINUTE
+    else:
+        raise ValueError(f"Invalid rate limiter kind: {kind}")
+    return RateLimiter(f"{kind}:{service}:{model_name}", *limits)
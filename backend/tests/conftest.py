@@ -0,0 +1,53 @@
+import os
+import sys
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# GlobalConfig reads config/config.yaml relative to the working directory
+os.chdir(BACKEND_DIR)
+
+from src.database.manager import DatabaseManager
+from src.database.models import DocumentStatus
+from src.database.vector_store import QdrantVectorDB
+from src.document_parser.embedding_providers import HashingEmbedding
+
+EMBEDDING_DIMENSION = 64
+
+
+@pytest.fixture
+def embed_model():
+    return HashingEmbedding(model_name=f"hashing-{EMBEDDING_DIMENSION}", dimension=EMBEDDING_DIMENSION)
+
+
+@pytest.fixture
+def make_db_manager(tmp_path):
+    """Build DatabaseManagers on a temporary SQLite file, with an in-memory Qdrant by default."""
+    def make(vector_db=None, slim_payloads=False, name="knowledge_base.db"):
+        return DatabaseManager(str(tmp_path / name), vector_db or QdrantVectorDB(":memory:"), slim_payloads=slim_payloads)
+    return make
+
+
+@pytest.fixture
+def db_manager(make_db_manager):
+    return make_db_manager()
+
+
+@pytest.fixture
+def user_id(db_manager):
+    return db_manager.create_user("user", "user@example.com", "hash")
+
+
+@pytest.fixture
+def make_knowledge_base(db_manager, user_id, embed_model):
+    """Create a knowledge base holding one processed document with one chunk per text."""
+    def make(texts, name="kb", file_name="doc.txt"):
+        knowledge_base_id = db_manager.create_knowledge_base(user_id, name, "")
+        document_id = db_manager.add_document(knowledge_base_id, file_name, os.path.splitext(file_name)[1], f"/tmp/{file_name}")[0]
+        db_manager.add_document_chunks(document_id, [
+            {"chunk_index": i, "content": text, "vector": embed_model.get_text_embedding(text)}
+            for i, text in enumerate(texts)
+        ])
+        db_manager.update_document_status(document_id, DocumentStatus.PROCESSED)
+        return knowledge_base_id, document_id
+    return make
@@ -0,0 +1,38 @@
+from api.models.assistant import AssistantCreate
+from api.services.assistant import AssistantService
+from src.database.models import Assistant
+from src.tools import kb_search_tool
+
+
+def load_assistant(db_manager, assistant_id):
+    with db_manager.Session() as session:
+        assistant = session.query(Assistant).filter_by(id=assistant_id).first()
+        return assistant, AssistantService._assistant_config(assistant, conversation_id=1)
+
+
+def test_deleting_the_primary_knowledge_base_keeps_the_assistant_usable(db_manager, user_id, make_knowledge_base, monkeypatch):
+    primary_id, _ = make_knowledge_base(["The AB-1234 valve controls the coolant flow."], name="primary")
+    extra_id, _ = make_knowledge_base(["Quarterly revenue grew by ten percent."], name="extra")
+    assistant = AssistantService(db_manager).create_assistant(user_id, AssistantCreate(
+        name="assistant", knowledge_base_id=primary_id, knowledge_base_ids=[extra_id],
+        configuration={"model": "gpt-4o", "service": "openai", "temperature": "0.1"}
+    ))
+
+    db_manager.remove_knowledge_base_rows(primary_id, user_id)
+    stored, config = load_assistant(db_manager, assistant.id)
+    assert stored.knowledge_base_id == extra_id
+    assert stored.knowledge_base_ids == [extra_id]
+    assert config["knowledge_base_id"] == extra_id
+    assert [kb["id"] for kb in config["knowledge_bases"]] == [extra_id]
+
+    db_manager.remove_knowledge_base_rows(extra_id, user_id)
+    stored, config = load_assistant(db_manager, assistant.id)
+    assert stored.knowledge_base_id is None
+    assert config["knowledge_bases"] == []
+    assert AssistantService(db_manager).get_assistant(assistant.id, user_id).knowledge_base_id is None
+
+    # With no knowledge base left, searches find nothing instead of failing
+    monkeypatch.setattr(kb_search_tool, "get_cache_db_manager", lambda: db_manager)
+    monkeypatch.setattr(kb_search_tool, "get_retrieval_cache", lambda: None)
+    config.update(embedding_service="local", embedding_model_name="hashing-64")
+    assert kb_search_tool.load_knowledge_base_search_tool(config).fn("AB-1234 valve") == []
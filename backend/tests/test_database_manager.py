@@ -0,0 +1,69 @@
+from src.database.models import DocumentChunk, DocumentStatus
+from src.database.vector_store import SearchFilter
+
+
+def test_ingestion_version_changes_with_searchable_content(db_manager, make_knowledge_base):
+    knowledge_base_id, document_id = make_knowledge_base(["The AB-1234 valve controls the coolant flow."])
+    versions = [db_manager.get_ingestion_versions([knowledge_base_id])[knowledge_base_id]]
+
+    db_manager.update_document_status(document_id, DocumentStatus.PROCESSING)
+    assert db_manager.get_ingestion_versions([knowledge_base_id])[knowledge_base_id] == versions[-1]
+
+    db_manager.update_document_status(document_id, DocumentStatus.PROCESSED)
+    versions.append(db_manager.get_ingestion_versions([knowledge_base_id])[knowledge_base_id])
+    db_manager.delete_vectors(knowledge_base_id, [], document_id)
+    versions.append(db_manager.get_ingestion_versions([knowledge_base_id])[knowledge_base_id])
+    db_manager.delete_document(document_id)
+    versions.append(db_manager.get_ingestion_versions([knowledge_base_id])[knowledge_base_id])
+    assert len(set(versions)) == len(versions)
+
+
+def test_ingestion_versions_leave_out_deleted_knowledge_bases(db_manager, user_id, make_knowledge_base):
+    kept_id, _ = make_knowledge_base(["kept"], name="kept")
+    deleted_id, _ = make_knowledge_base(["deleted"], name="deleted")
+    db_manager.remove_knowledge_base_rows(deleted_id, user_id)
+    assert set(db_manager.get_ingestion_versions([kept_id, deleted_id])) == {kept_id}
+
+
+def test_copy_document_chunks_names_the_target_file(db_manager, make_knowledge_base, embed_model):
+    texts = ["The AB-1234 valve controls the coolant flow.", "Quarterly revenue grew by ten percent."]
+    _, source_id = make_knowledge_base(texts, name="source", file_name="report.txt")
+    target_kb_id, _ = make_knowledge_base([], name="target", file_name="other.txt")
+    target_id = db_manager.add_document(target_kb_id, "report (copy).txt", ".txt", "/tmp/report.txt")[0]
+
+    assert db_manager.copy_document_chunks(source_id, target_id) == len(texts)
+    hits = db_manager.search_similar_chunks(embed_model.get_query_embedding(texts[0]), target_kb_id, limit=len(texts))
+    assert sorted(hit["content"] for hit in hits) == sorted(texts)
+    assert {hit["metadata"]["file_name"] for hit in hits} == {"report (copy).txt"}
+    assert [hit["content"] for hit in db_manager.search_chunks_lexical("coolant", target_kb_id)] == texts[:1]
+    assert db_manager.count_document_chunks(source_id) == db_manager.count_document_chunks(target_id)
+
+
+def test_upgrade_vector_payloads_of_legacy_chunks(db_manager, make_knowledge_base, embed_model):
+    texts = ["The AB-1234 valve controls the coolant flow.", "Quarterly revenue grew by ten percent."]
+    knowledge_base_id, document_id = make_knowledge_base(texts)
+    collection_name = f"kb_{knowledge_base_id}"
+    # Chunks as stored before this series: metadata only in a payload without document fields
+    with db_manager.Session() as session:
+        chunks = session.query(DocumentChunk).filter_by(document_id=document_id).order_by(DocumentChunk.id).all()
+        for chunk in chunks:
+            chunk.chunk_metadata = None
+        vector_ids = [chunk.vector_id for chunk in chunks]
+        legacy_payloads = [{"document_chunk_id": chunk.id, "text": chunk.content, "metadata": {"file_name": "legacy.txt"}}
+                           for chunk in chunks]
+        session.commit()
+    vectors = {vector_id: vector for vector_id, vector, _ in db_manager.vector_db.get_vectors(collection_name, vector_ids)}
+    db_manager.vector_db.add_vectors(collection_name, vector_ids, [vectors[vector_id] for vector_id in vector_ids], legacy_payloads)
+
+    query_vector = embed_model.get_query_embedding(texts[0])
+    hits = db_manager.search_similar_chunks(query_vector, knowledge_base_id)
+    assert {hit["metadata"]["file_name"] for hit in hits} == {"legacy.txt"}
+    by_document = SearchFilter(document_ids=[document_id])
+    assert db_manager.search_similar_chunks(query_vector, knowledge_base_id, search_filter=by_document) == []
+
+    assert db_manager.upgrade_vector_payloads(knowledge_base_id) == len(texts)
+    hits = db_manager.search_similar_chunks(query_vector, knowledge_base_id, search_filter=by_document)
+    assert [hit["content"] for hit in hits][0] == texts[0]
+    assert len(hits) == len(texts)
+    assert db_manager.search_chunks_lexical("coolant", knowledge_base_id)[0]["metadata"] == {"file_name": "legacy.txt"}
+    assert db_manager.upgrade_vector_payloads(knowledge_base_id) == 0
@@ -0,0 +1,35 @@
+import asyncio
+from llama_index.core.bridge.pydantic import PrivateAttr
+from src.document_parser.embedding import aget_embeddings
+from src.document_parser.embedding_providers import HashingEmbedding
+
+
+class CountingEmbedding(HashingEmbedding):
+    """Records every provider request and how many run at once."""
+
+    _requests: list = PrivateAttr(default_factory=list)
+    _in_flight: int = PrivateAttr(default=0)
+    _peak: int = PrivateAttr(default=0)
+
+    async def _aget_text_embeddings(self, texts):
+        self._requests.append(len(texts))
+        self._in_flight += 1
+        self._peak = max(self._peak, self._in_flight)
+        await asyncio.sleep(0.01)
+        self._in_flight -= 1
+        return self._get_text_embeddings(texts)
+
+
+def test_aget_embeddings_sends_one_request_per_batch(embed_model):
+    # embed_batch_size smaller than the batch: the batch must still go out as a single request
+    model = CountingEmbedding(model_name="hashing-64", dimension=64, embed_batch_size=4)
+    texts = [f"text {i}" for i in range(50)]
+    completed = []
+
+    vectors = asyncio.run(aget_embeddings(texts, batch_size=16, max_concurrency=2, embed_model=model,
+                                          on_batch_complete=lambda index, *_: completed.append(index)))
+
+    assert model._requests == [16, 16, 16, 2]
+    assert model._peak == 2
+    assert sorted(completed) == [0, 1, 2, 3]
+    assert vectors == embed_model.get_text_embedding_batch(texts)
@@ -0,0 +1,51 @@
+import sqlite3
+from src.document_parser.embedding import CachedEmbedding
+from src.document_parser.embedding_cache import EmbeddingCache
+from src.document_parser.embedding_providers import HashingEmbedding
+
+
+class InstructedEmbedding(HashingEmbedding):
+    """Embeds queries with an instruction prefix, like asymmetric retrieval models."""
+
+    def _get_query_embedding(self, query):
+        return self._get_text_embedding(f"Represent this question for retrieval: {query}")
+
+    async def _aget_query_embedding(self, query):
+        return self._get_query_embedding(query)
+
+
+def test_query_and_text_embeddings_are_cached_apart(tmp_path):
+    model = InstructedEmbedding(model_name="instructed-64", dimension=64)
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"), max_bytes=1024 ** 2)
+    cached = CachedEmbedding(model, cache, "local")
+    text = "How is the coolant flow controlled?"
+
+    assert cached.get_query_embedding(text) == model.get_query_embedding(text)
+    assert cached.get_text_embedding(text) == model.get_text_embedding(text)
+    # Served from the cache now, each under its own role
+    assert cached.get_query_embedding(text) == model.get_query_embedding(text)
+    assert cached.get_text_embedding(text) == model.get_text_embedding(text)
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["entries"] == 2
+
+
+def test_cache_without_roles_is_cleared(tmp_path):
+    db_path = str(tmp_path / "embeddings.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        """
+        CREATE TABLE embeddings (service TEXT NOT NULL, model_name TEXT NOT NULL, text_hash TEXT NOT NULL,
+                                 vector BLOB NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (service, model_name, text_hash));
+        CREATE TABLE cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), total_bytes INTEGER NOT NULL);
+        INSERT INTO embeddings VALUES ('local', 'hashing-64', 'hash', x'00000000', 0);
+        INSERT INTO cache_size VALUES (0, 4);
+        """
+    )
+    conn.close()
+
+    cache = EmbeddingCache(db_path, max_bytes=1024 ** 2)
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["total_bytes"] == 0
+    cache.put_many("local", "hashing-64", ["text"], [[1.0, 2.0]], role="query")
+    assert cache.get_many("local", "hashing-64", ["text"], role="query") == [[1.0, 2.0]]
+    assert cache.get_many("local", "hashing-64", ["text"]) == [None]
@@ -0,0 +1,256 @@
+import json
+import pytest
+from llama_index.core.text_splitter import SentenceSplitter
+from src.constants import GlobalConfig
+from src.database.models import DocumentChunk, DocumentStatus
+from src.document_parser.embedding import aget_embeddings
+from src.document_parser.parse_cache import ParseCache
+from src.tasks import document_parser_tasks
+from src.tasks.document_parser_tasks import finalize_document, ingest_chunk_range, process_document, reingest_document
+from src.tasks.worker_resources import worker_resources
+
+SENTENCES = [f"Sentence number {i} describes part {i} of the pump maintenance procedure." for i in range(40)]
+
+
+class RecordingRedis:
+    """Stands in for the Redis client of the worker, keeping the progress events it publishes."""
+
+    def __init__(self):
+        self.events = []
+        self.data = {}
+
+    def publish(self, channel, message):
+        self.events.append(json.loads(message))
+
+    def hset(self, key, field, value):
+        self.data.setdefault(key, {})[str(field)] = str(value)
+
+    def hvals(self, key):
+        return list(self.data.get(key, {}).values())
+
+    def sadd(self, key, member):
+        self.data.setdefault(key, set()).add(member)
+
+    def sismember(self, key, member):
+        return member in self.data.get(key, set())
+
+    def expire(self, key, seconds):
+        pass
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+@pytest.fixture
+def worker(monkeypatch, tmp_path, db_manager, embed_model):
+    """Point the worker resources at the test database, with small chunks and ingestion batches."""
+    resources = {
+        "db_manager": db_manager,
+        "embedding_model": embed_model,
+        "splitter": SentenceSplitter(chunk_size=32, chunk_overlap=0),
+        "redis": RecordingRedis(),
+    }
+    for name, resource in resources.items():
+        monkeypatch.setitem(worker_resources._resources, name, resource)
+    monkeypatch.setattr(ParseCache.__init__, "__defaults__", (str(tmp_path / "parse_cache"),))
+    monkeypatch.setattr(GlobalConfig, "INGESTION_BATCH_SIZE", 4)
+    return worker_resources
+
+
+@pytest.fixture
+def embedded_texts(monkeypatch):
+    """Record the texts sent for embedding; `fail_on_call` makes that call to the provider fail."""
+    calls = []
+    failures = {"fail_on_call": None}
+
+    async def recording_aget_embeddings(texts, **kwargs):
+        calls.append(texts)
+        if len(calls) == failures["fail_on_call"]:
+            raise RuntimeError("Embedding provider unavailable")
+        return await aget_embeddings(texts, **kwargs)
+
+    monkeypatch.setattr(document_parser_tasks, "aget_embeddings", recording_aget_embeddings)
+    return calls, failures
+
+
+def write_text(path, sentences):
+    path.write_text(" ".join(sentences), encoding="utf-8")
+    return str(path)
+
+
+def stored_chunks(db_manager, document_id):
+    with db_manager.Session() as session:
+        return session.query(DocumentChunk.chunk_index, DocumentChunk.content, DocumentChunk.vector_id) \
+            .filter_by(document_id=document_id) \
+            .order_by(DocumentChunk.chunk_index) \
+            .all()
+
+
+def expected_chunks(worker, file_path):
+    return [chunk.text for chunk in document_parser_tasks.FileProcessorFactory.get_processor(file_path).iter_chunks(file_path)]
+
+
+def test_process_document_resumes_after_the_checkpoint(worker, db_manager, user_id, tmp_path, embedded_texts):
+    calls, failures = embedded_texts
+    file_path = write_text(tmp_path / "pump.txt", SENTENCES)
+    knowledge_base_id = db_manager.create_knowledge_base(user_id, "kb", "")
+    document_id = db_manager.add_document(knowledge_base_id, "pump.txt", ".txt", file_path)[0]
+    expected = expected_chunks(worker, file_path)
+    assert len(expected) > 2 * GlobalConfig.INGESTION_BATCH_SIZE
+
+    failures["fail_on_call"] = 2
+    with pytest.raises(RuntimeError):
+        process_document.run(file_path, document_id)
+    assert db_manager.get_document_checkpoint(document_id) == GlobalConfig.INGESTION_BATCH_SIZE - 1
+    assert db_manager.count_document_chunks(document_id) == GlobalConfig.INGESTION_BATCH_SIZE
+    assert db_manager.get_document(document_id).status == DocumentStatus.PROCESSING
+
+    calls.clear()
+    failures["fail_on_call"] = None
+    result = process_document.run(file_path, document_id)
+
+    # Only the chunks after the checkpoint are embedded again
+    assert [text for texts in calls for text in texts] == expected[GlobalConfig.INGESTION_BATCH_SIZE:]
+    assert result["total_chunks"] == len(expected)
+    assert [(index, content) for index, content, _ in stored_chunks(db_manager, document_id)] == list(enumerate(expected))
+    assert db_manager.get_document(document_id).status == DocumentStatus.PROCESSED
+
+
+def test_replacing_the_file_drops_the_checkpoint(worker, db_manager, user_id, tmp_path, embedded_texts):
+    calls, _ = embedded_texts
+    knowledge_base_id = db_manager.create_knowledge_base(user_id, "kb", "")
+    document_id = db_manager.add_document(knowledge_base_id, "pump.txt", ".txt", str(tmp_path / "pump.txt"))[0]
+    db_manager.set_document_checkpoint(document_id, 7)
+    db_manager.set_document_total_chunks(document_id, 20)
+
+    file_path = write_text(tmp_path / "pump_v2.txt", SENTENCES[:12])
+    db_manager.update_document_file(document_id, "pump_v2.txt", ".txt", file_path, "hash")
+    document = db_manager.get_document(document_id)
+    assert document.checkpoint_chunk_index is None
+    assert document.total_chunks is None
+
+    # The new file is ingested from its first chunk
+    process_document.run(file_path, document_id)
+    expected = expected_chunks(worker, file_path)
+    assert [text for texts in calls for text in texts] == expected
+    assert db_manager.count_document_chunks(document_id) == len(expected)
+
+
+def test_reingest_embeds_only_changed_chunks(worker, db_manager, user_id, tmp_path, embedded_texts):
+    calls, _ = embedded_texts
+    file_path = write_text(tmp_path / "pump.txt", SENTENCES)
+    knowledge_base_id = db_manager.create_knowledge_base(user_id, "kb", "")
+    document_id = db_manager.add_document(knowledge_base_id, "pump.txt", ".txt", file_path)[0]
+    process_document.run(file_path, document_id)
+    before = {content: vector_id for _, content, vector_id in stored_chunks(db_manager, document_id)}
+
+    # One sentence rewritten, the last ten gone
+    sentences = list(SENTENCES[:30])
+    sentences[10] = "Sentence number 10 now explains how to replace the pump seal."
+    write_text(tmp_path / "pump.txt", sentences)
+    expected = expected_chunks(worker, file_path)
+    calls.clear()
+    result = reingest_document.run(file_path, document_id)
+
+    changed = [text for text in expected if text not in before]
+    assert changed and len(changed) < len(expected)
+    assert [text for texts in calls for text in texts] == changed
+    assert result["unchanged_chunks"] == len(expected) - len(changed)
+    assert result["deleted_chunks"] == len(before) - result["unchanged_chunks"]
+
+    chunks = stored_chunks(db_manager, document_id)
+    assert [(index, content) for index, content, _ in chunks] == list(enumerate(expected))
+    # Unchanged chunks keep their vectors, vanished ones are deleted from the collection too
+    assert all(vector_id == before[content] for _, content, vector_id in chunks if content in before)
+    assert db_manager.vector_db.client.count(f"kb_{knowledge_base_id}").count == len(expected)
+
+
+def test_ingestion_publishes_progress(worker, db_manager, user_id, tmp_path, embedded_texts):
+    file_path = write_text(tmp_path / "pump.txt", SENTENCES[:12])
+    knowledge_base_id = db_manager.create_knowledge_base(user_id, "kb", "")
+    document_id = db_manager.add_document(knowledge_base_id, "pump.txt", ".txt", file_path)[0]
+    process_document.run(file_path, document_id)
+
+    events = worker.get("redis").events
+    assert {event["document_id"] for event in events} == {document_id}
+    assert events[-1]["status"] == DocumentStatus.PROCESSED.value
+    assert events[-1]["total"] == db_manager.count_document_chunks(document_id)
+
+
+def test_reingest_renames_kept_chunks(worker, db_manager, user_id, tmp_path, embedded_texts):
+    calls, _ = embedded_texts
+    file_path = write_text(tmp_path / "pump.txt", SENTENCES)
+    knowledge_base_id = db_manager.create_knowledge_base(user_id, "kb", "")
+    document_id = db_manager.add_document(knowledge_base_id, "pump.txt", ".txt", file_path)[0]
+    process_document.run(file_path, document_id)
+
+    db_manager.update_document_file(document_id, "pump-2024.txt", ".txt", file_path, "hash")
+    calls.clear()
+    result = reingest_document.run(file_path, document_id)
+
+    assert calls == []
+    assert result["unchanged_chunks"] == result["total_chunks"]
+    vector_ids = [vector_id for _, _, vector_id in stored_chunks(db_manager, document_id)]
+    payloads = [payload for _, _, payload in db_manager.vector_db.get_vectors(f"kb_{knowledge_base_id}", vector_ids)]
+    assert {payload["metadata"]["file_name"] for payload in payloads} == {"pump-2024.txt"}
+    hits = db_manager.search_chunks_lexical("pump", knowledge_base_id)
+    assert {hit["metadata"]["file_name"] for hit in hits} == {"pump-2024.txt"}
+
+
+def test_reingest_retry_only_embeds_what_the_failed_attempt_did_not(worker, db_manager, user_id, tmp_path, embedded_texts):
+    calls, failures = embedded_texts
+    file_path = write_text(tmp_path / "pump.txt", SENTENCES)
+    knowledge_base_id = db_manager.create_knowledge_base(user_id, "kb", "")
+    document_id = db_manager.add_document(knowledge_base_id, "pump.txt", ".txt", file_path)[0]
+    process_document.run(file_path, document_id)
+
+    # Changes spread over the file, so that they are embedded in several batches
+    sentences = [f"Sentence number {i} was revised for the new pump model." if i % 10 == 0 else sentence
+                 for i, sentence in enumerate(SENTENCES)]
+    write_text(tmp_path / "pump.txt", sentences)
+    expected = expected_chunks(worker, file_path)
+    calls.clear()
+    failures["fail_on_call"] = 2
+    with pytest.raises(RuntimeError):
+        reingest_document.run(file_path, document_id)
+    assert db_manager.get_document(document_id).status == DocumentStatus.PROCESSING
+    first_attempt = calls[0]
+
+    calls.clear()
+    failures["fail_on_call"] = None
+    reingest_document.run(file_path, document_id)
+
+    retried = [text for texts in calls for text in texts]
+    assert retried and not set(retried) & set(first_attempt)
+    assert [(index, content) for index, content, _ in stored_chunks(db_manager, document_id)] == list(enumerate(expected))
+    assert db_manager.vector_db.client.count(f"kb_{knowledge_base_id}").count == len(expected)
+    assert db_manager.get_document(document_id).status == DocumentStatus.PROCESSED
+
+
+def test_fanned_out_ranges_report_document_progress_and_skip_completed_ranges(worker, db_manager, user_id, tmp_path, embedded_texts):
+    calls, _ = embedded_texts
+    file_path = write_text(tmp_path / "pump.txt", SENTENCES)
+    knowledge_base_id = db_manager.create_knowledge_base(user_id, "kb", "")
+    document_id = db_manager.add_document(knowledge_base_id, "pump.txt", ".txt", file_path)[0]
+    cache_key = f"document_{document_id}"
+    total = ParseCache().ensure(cache_key, document_parser_tasks.FileProcessorFactory.get_processor(file_path), file_path)
+    db_manager.set_document_total_chunks(document_id, total)
+    ranges = [(8, total), (0, 8)]
+
+    for start, end in ranges:
+        ingest_chunk_range.run(document_id, cache_key, start, end)
+    progress = [(event["current"], event["total"]) for event in worker.get("redis").events if event.get("stage") == "storing"]
+    assert [current for current, _ in progress] == sorted(current for current, _ in progress)
+    assert progress[-1] == (total, total)
+
+    # A chord queued again after a failure skips the ranges already stored
+    calls.clear()
+    for start, end in ranges:
+        assert ingest_chunk_range.run(document_id, cache_key, start, end) == end - start
+    assert calls == []
+    assert db_manager.count_document_chunks(document_id) == total
+
+    finalize_document.run([total - 8, 8], document_id, cache_key, total)
+    assert worker.get("redis").data == {}
+    assert db_manager.get_document(document_id).status == DocumentStatus.PROCESSED
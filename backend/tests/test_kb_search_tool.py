@@ -0,0 +1,75 @@
+import pytest
+from src.tools import kb_search_tool
+from src.tools.kb_search_tool import load_knowledge_base_search_tool
+from src.database.models import DocumentStatus
+from src.tools.retrieval_cache import RetrievalCache
+from tests.conftest import EMBEDDING_DIMENSION
+
+
+@pytest.fixture
+def search_tool(monkeypatch):
+    """Build search tools that read from the test database, with a fresh retrieval cache."""
+    def load(db_manager, knowledge_base_ids, retrieval_mode="dense", cache=None):
+        monkeypatch.setattr(kb_search_tool, "get_cache_db_manager", lambda: db_manager)
+        monkeypatch.setattr(kb_search_tool, "get_retrieval_cache", lambda: cache)
+        return load_knowledge_base_search_tool({
+            "knowledge_base_id": knowledge_base_ids[0],
+            "knowledge_bases": [{"id": kb_id, "collection_name": f"kb_{kb_id}"} for kb_id in knowledge_base_ids],
+            "embedding_service": "local",
+            "embedding_model_name": f"hashing-{EMBEDDING_DIMENSION}",
+            "retrieval_mode": retrieval_mode,
+        }).fn
+    return load
+
+
+@pytest.mark.parametrize("retrieval_mode", ["dense", "hybrid"])
+def test_search_with_slim_payloads(make_db_manager, embed_model, search_tool, retrieval_mode):
+    db_manager = make_db_manager(slim_payloads=True)
+    user_id = db_manager.create_user("user", "user@example.com", "hash")
+    knowledge_base_id = db_manager.create_knowledge_base(user_id, "kb", "")
+    document_id = db_manager.add_document(knowledge_base_id, "manual.txt", ".txt", "/tmp/manual.txt")[0]
+    texts = ["The AB-1234 valve controls the coolant flow.", "Quarterly revenue grew by ten percent."]
+    db_manager.add_document_chunks(document_id, [
+        {"chunk_index": i, "content": text, "vector": embed_model.get_text_embedding(text)}
+        for i, text in enumerate(texts)
+    ])
+
+    # Slim payloads carry no text, the results are read back from SQLite
+    point = db_manager.vector_db.client.scroll(f"kb_{knowledge_base_id}", limit=1, with_payload=True)[0][0]
+    assert "text" not in point.payload
+
+    results = search_tool(db_manager, [knowledge_base_id], retrieval_mode)("AB-1234 valve coolant")
+    assert "AB-1234 valve" in results[0]
+
+
+@pytest.mark.parametrize("retrieval_mode", ["dense", "lexical", "hybrid"])
+def test_federated_search_ranks_the_relevant_knowledge_base_first(db_manager, make_knowledge_base, search_tool, retrieval_mode):
+    # Listed first, so a merge that tops every knowledge base's best hit would rank it first
+    irrelevant_id, _ = make_knowledge_base(["The sky is blue.", "Birds sing in the morning."], name="weather")
+    relevant_id, _ = make_knowledge_base(["The AB-1234 valve controls the coolant flow.", "Quarterly revenue grew by ten percent."],
+                                         name="manuals")
+
+    results = search_tool(db_manager, [irrelevant_id, relevant_id], retrieval_mode)("AB-1234 valve coolant")
+    assert "AB-1234 valve" in results[0]
+
+
+def test_retrieval_cache_misses_after_the_knowledge_base_changes(db_manager, make_knowledge_base, embed_model, search_tool):
+    cache = RetrievalCache(max_entries=16, ttl=60)
+    knowledge_base_id, _ = make_knowledge_base(["Quarterly revenue grew by ten percent."])
+    search = search_tool(db_manager, [knowledge_base_id], "hybrid", cache)
+
+    first = search("AB-1234 valve coolant")
+    assert search("  ab-1234 VALVE coolant ") == first
+    assert cache.stats()["hits"] == 1
+
+    # A newly processed document bumps the version, so the next search sees it
+    new_document_id = db_manager.add_document(knowledge_base_id, "manual.txt", ".txt", "/tmp/manual.txt")[0]
+    text = "The AB-1234 valve controls the coolant flow."
+    db_manager.add_document_chunks(new_document_id, [{"chunk_index": 0, "content": text, "vector": embed_model.get_text_embedding(text)}])
+    db_manager.update_document_status(new_document_id, DocumentStatus.PROCESSED)
+    assert "AB-1234 valve" in search("AB-1234 valve coolant")[0]
+    assert cache.stats()["misses"] == 2
+
+    db_manager.delete_document(new_document_id)
+    assert not any("AB-1234 valve" in result for result in search("AB-1234 valve coolant"))
+    assert cache.stats()["misses"] == 3
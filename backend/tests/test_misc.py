@@ -0,0 +1,35 @@
+import pytest
+from src.utils.misc import batched, reciprocal_rank_fusion, time_to_seconds, with_file_name
+
+
+def test_batched_keeps_order_and_remainder():
+    assert list(batched(iter(range(7)), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(batched([], 3)) == []
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    assert [key for key, _ in fused] == ["b", "a", "d", "c"]
+    assert dict(fused)["b"] == pytest.approx(1 / 62 + 1 / 61)
+
+
+@pytest.mark.parametrize("value, seconds", [
+    (90, 90.0),
+    (1.5, 1.5),
+    ("45", 45.0),
+    ("01:30", 90.0),
+    ("1:02:03.5", 3723.5),
+    ("soon", None),
+    (None, None),
+    (True, None),
+])
+def test_time_to_seconds(value, seconds):
+    assert time_to_seconds(value) == seconds
+
+
+def test_with_file_name_replaces_the_stored_name():
+    metadata = {"filename": "3f2a9c.pdf", "page": 2}
+    assert with_file_name(metadata, "report.pdf") == {"filename": "report.pdf", "file_name": "report.pdf", "page": 2}
+    assert metadata["filename"] == "3f2a9c.pdf"
+    assert with_file_name(None, "report.pdf") == {"file_name": "report.pdf"}
+    assert with_file_name({"page": 2}, None) == {"page": 2}
@@ -0,0 +1,38 @@
+import mailbox
+from email.message import EmailMessage
+from src.document_parser.readers import CSVReader, MboxReader
+
+
+def test_csv_reader_groups_rows(tmp_path):
+    path = tmp_path / "parts.csv"
+    path.write_text("part,stock\n" + "".join(f"valve-{i},{i}\n" for i in range(5)), encoding="utf-8")
+
+    docs = list(CSVReader(rows_per_document=2).lazy_load_data(path))
+    assert [doc.text for doc in docs] == ["part, stock\nvalve-0, 0", "valve-1, 1\nvalve-2, 2", "valve-3, 3\nvalve-4, 4"]
+    assert docs[0].metadata == {"filename": "parts.csv", "extension": ".csv"}
+
+    full = CSVReader(return_full_document=True, rows_per_document=2).load_data(path)
+    assert len(full) == 1
+    assert full[0].text == "\n".join(doc.text for doc in docs)
+
+
+def test_mbox_reader_yields_one_document_per_message(tmp_path):
+    path = tmp_path / "inbox.mbox"
+    mbox = mailbox.mbox(path)
+    for i in range(3):
+        message = EmailMessage()
+        message["From"] = "ops@example.com"
+        message["To"] = "team@example.com"
+        message["Subject"] = f"Valve report {i}"
+        message.set_content(f"<p>Valve {i} was replaced.</p>")
+        mbox.add(message)
+    mbox.close()
+
+    docs = list(MboxReader().lazy_load_data(str(path)))
+    assert len(docs) == 3
+    assert "Subject: Valve report 1" in docs[1].text
+    assert "Content: Valve 1 was replaced." in docs[1].text
+    assert docs[0].metadata == {"file_name": "inbox.mbox"}
+
+    assert len(MboxReader(max_count=2).load_data(path)) == 2
+    assert len(MboxReader(return_full_document=True).load_data(path)) == 1
@@ -0,0 +1,15 @@
+import pytest
+from llama_index.core.text_splitter import SentenceSplitter
+from src.document_parser.splitter import SlidingWindowSplitter
+
+PARAGRAPHS = [
+    " ".join(f"Paragraph {p} sentence {s} covers the maintenance of pump {p * s}." for s in range(12))
+    for p in range(8)
+]
+
+
+@pytest.mark.parametrize("window_size", [200, 1000, 100_000])
+def test_sliding_window_matches_splitting_the_whole_text(window_size):
+    splitter = SentenceSplitter(chunk_size=64, chunk_overlap=0)
+    expected = splitter.split_text("\n".join(PARAGRAPHS))
+    assert list(SlidingWindowSplitter(splitter, window_size=window_size).split(iter(PARAGRAPHS))) == expected
@@ -0,0 +1,137 @@
+import numpy as np
+import pytest
+from chromadb.config import Settings
+from src.database.vector_store import ChromaVectorDB, NumpyVectorDB, QdrantVectorDB, SearchFilter
+
+
+def vector_store(kind, tmp_path):
+    if kind == "qdrant":
+        return QdrantVectorDB(":memory:")
+    if kind == "numpy":
+        return NumpyVectorDB(str(tmp_path / "vectors"))
+    return ChromaVectorDB(Settings(is_persistent=True, persist_directory=str(tmp_path / "chroma"), anonymized_telemetry=False))
+
+
+def random_vectors(count, dimension=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dimension)).tolist()
+
+
+def test_numpy_store_reloads_a_collection_dropped_by_another_process(tmp_path):
+    writer = NumpyVectorDB(str(tmp_path))
+    reader = NumpyVectorDB(str(tmp_path))
+    vectors = random_vectors(10)
+    writer.add_vectors("kb_1", [f"old-{i}" for i in range(10)], vectors, [{"document_id": 1}] * 10)
+    assert len(reader.search_vectors("kb_1", vectors[0], limit=20)) == 10
+
+    # Dropped and created again under the same name, e.g. when SQLite reuses the knowledge base id
+    writer.drop_collection("kb_1")
+    writer.add_vectors("kb_1", ["new-0", "new-1"], random_vectors(2, seed=1), [{"document_id": 2}] * 2)
+
+    hits = reader.search_vectors("kb_1", vectors[0], limit=20)
+    assert sorted(hit.id for hit in hits) == ["new-0", "new-1"]
+
+
+def test_numpy_store_forgets_a_dropped_collection(tmp_path):
+    writer = NumpyVectorDB(str(tmp_path))
+    reader = NumpyVectorDB(str(tmp_path))
+    vectors = random_vectors(3)
+    writer.add_vectors("kb_1", ["a", "b", "c"], vectors, [{}] * 3)
+    assert len(reader.get_vectors("kb_1", ["a", "b", "c"])) == 3
+
+    writer.drop_collection("kb_1")
+    assert reader.get_vectors("kb_1", ["a", "b", "c"]) == []
+
+
+@pytest.mark.parametrize("kind", ["qdrant", "numpy", "chroma"])
+def test_search_returns_scored_points_with_payloads(kind, tmp_path):
+    store = vector_store(kind, tmp_path)
+    vectors = random_vectors(4)
+    payloads = [{"document_chunk_id": i, "document_id": 1, "metadata": {"page": i}} for i in range(4)]
+    store.create_collection("kb_1")
+    store.add_vectors("kb_1", [f"00000000-0000-0000-0000-00000000000{i}" for i in range(4)], vectors, payloads)
+
+    hits = store.search_vectors("kb_1", vectors[2], limit=2)
+    assert hits[0].payload == payloads[2]
+    assert hits[0].score == pytest.approx(1.0, abs=1e-4)
+    assert hits[0].score >= hits[1].score
+
+
+@pytest.mark.parametrize("kind", ["qdrant", "numpy", "chroma"])
+def test_filtered_search_matches_lexical_search(kind, tmp_path, make_db_manager, embed_model):
+    db_manager = make_db_manager(vector_store(kind, tmp_path), name=f"{kind}.db")
+    user_id = db_manager.create_user("user", "user@example.com", "hash")
+    knowledge_base_id = db_manager.create_knowledge_base(user_id, "kb", "")
+    pdf_id = db_manager.add_document(knowledge_base_id, "a.pdf", ".pdf", "/tmp/a.pdf")[0]
+    video_id = db_manager.add_document(knowledge_base_id, "v.mp4", ".mp4", "/tmp/v.mp4")[0]
+    db_manager.add_document_chunks(pdf_id, [
+        {"chunk_index": i, "content": f"pdf page {i} alpha", "vector": embed_model.get_text_embedding(f"pdf page {i} alpha"),
+         "metadata": {"page": i}}
+        for i in range(3)
+    ])
+    db_manager.add_document_chunks(video_id, [
+        {"chunk_index": i, "content": f"video part {i} alpha", "vector": embed_model.get_text_embedding(f"video part {i} alpha"),
+         "metadata": {"start_time": f"0{i}:00", "end_time": f"0{i + 1}:00"}}
+        for i in range(3)
+    ])
+    query_vector = embed_model.get_query_embedding("alpha")
+
+    def dense(search_filter):
+        return sorted(hit["id"] for hit in db_manager.search_similar_chunks(query_vector, knowledge_base_id, 10, search_filter))
+
+    def lexical(search_filter):
+        return sorted(hit["id"] for hit in db_manager.search_chunks_lexical("alpha", knowledge_base_id, 10, search_filter))
+
+    for search_filter, expected in [
+        (None, 6),
+        (SearchFilter(file_types=[".mp4"]), 3),
+        (SearchFilter(document_ids=[pdf_id]), 3),
+        # Sections overlapping 01:30-02:10 are 01:00-02:00 and 02:00-03:00
+        (SearchFilter(start_time=90, end_time=130), 2),
+        (SearchFilter(created_after=0), 6),
+        (SearchFilter(created_before=0), 0),
+    ]:
+        assert len(dense(search_filter)) == expected
+        assert dense(search_filter) == lexical(search_filter)
+
+
+def test_numpy_store_filters_like_search_filter_matches(tmp_path):
+    store = NumpyVectorDB(str(tmp_path))
+    store.create_collection("kb_1")
+    payloads = [
+        {"document_id": i % 3, "file_type": [".pdf", ".mp4", None][i % 3], "created_at": float(i),
+         **({"start_time": 10.0 * i, "end_time": 10.0 * i + 10} if i % 3 == 1 else {})}
+        for i in range(12)
+    ] + [{}]
+    ids = [f"00000000-0000-0000-0000-0000000000{i:02d}" for i in range(len(payloads))]
+    store.add_vectors("kb_1", ids, random_vectors(len(payloads)), payloads)
+    # Overwritten and deleted points no longer match under their old payloads
+    store.add_vectors("kb_1", ids[:1], random_vectors(1), [{"document_id": 2, "file_type": ".txt", "created_at": 0.0}])
+    payloads[0] = {"document_id": 2, "file_type": ".txt", "created_at": 0.0}
+    store.delete_vectors("kb_1", ids[1:2])
+    alive = dict(zip(ids[:1] + ids[2:], payloads[:1] + payloads[2:]))
+
+    for search_filter in [
+        SearchFilter(document_ids=[1, 2]),
+        SearchFilter(file_types=[".mp4", ".txt"]),
+        SearchFilter(start_time=35, end_time=75),
+        SearchFilter(created_after=2, created_before=9),
+        SearchFilter(document_ids=[0], created_before=6),
+    ]:
+        hits = store.search_vectors("kb_1", random_vectors(1)[0], limit=len(ids), search_filter=search_filter)
+        assert sorted(hit.id for hit in hits) == sorted(i for i, payload in alive.items() if search_filter.matches(payload))
+
+    store.delete_document_vectors("kb_1", 2)
+    assert sorted(vector_id for vector_id, _, _ in store.get_vectors("kb_1", ids)) == sorted(
+        i for i, payload in alive.items() if payload.get("document_id") != 2)
+
+
+@pytest.mark.parametrize("kind", ["qdrant", "numpy", "chroma"])
+def test_deleting_from_a_missing_collection_is_a_no_op(kind, tmp_path):
+    store = vector_store(kind, tmp_path)
+    store.delete_vectors("kb_404", ["00000000-0000-0000-0000-000000000001"])
+    store.delete_document_vectors("kb_404", 1)
+
+    store.add_vectors("kb_1", ["00000000-0000-0000-0000-000000000001"], random_vectors(1), [{"document_id": 1}])
+    store.drop_collection("kb_1")
+    store.delete_vectors("kb_1", ["00000000-0000-0000-0000-000000000001"])
+    store.delete_document_vectors("kb_1", 1)
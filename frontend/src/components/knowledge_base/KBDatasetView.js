@@ -350,7 +350,7 @@ const DatasetView = ({ knowledgeBaseID }) => {
                     </td>
                     <td className="p-2">
                       {doc.status === "processing" && doc.progress ? (
-                        `Processing (${doc.progress.current}/${doc.progress.total})`
+                        `Processing (${doc.progress.current}/${doc.progress.total ?? "?"})`
                       ) : doc.status === "processed" ? (
                         <span className="flex items-center">
                           <Check className="text-green-500 mr-1" size={16} />